@@ -2,11 +2,13 @@
 
 Subcommands:
   export  - generate an extended audit report and write to JSON/CSV/HTML
+  integrity - build/verify/export the Merkle integrity manifest of an evidence folder
 
 Usage examples:
   python -m case_agent.cli export --db ./epstein.db --out ./epstein_report.json --format json
   python -m case_agent.cli export --db ./epstein.db --out ./epstein_report.csv --format csv
   python -m case_agent.cli export --db ./epstein.db --out ./epstein_report.html --format html
+  python -m case_agent.cli integrity verify --evidence ./evidence --db ./epstein.db --sample 0.05
 """
 
 import argparse
@@ -204,6 +206,23 @@ def main(argv=None):
         default=5.0,
         help="Frame sampling interval (s) for videos",
     )
+    p_face.add_argument(
+        "--max-side",
+        type=int,
+        default=None,
+        help="Downscale video frames so the longest side is at most this many pixels",
+    )
+    p_face.add_argument(
+        "--keyframes-only",
+        action="store_true",
+        help="Sample only video keyframes (requires ffmpeg; ignores --interval)",
+    )
+    p_face.add_argument(
+        "--adaptive",
+        action="store_true",
+        default=None,
+        help="Run video face detection only on scene changes (see VIDEO_SCENE_* config)",
+    )
     p_face.add_argument(
         "--persist-db", help="Path to SQLite DB to persist matches into (optional)"
     )
@@ -213,6 +232,57 @@ def main(argv=None):
         ).cli_run(args)
     )
 
+    p_rematch = sub.add_parser(
+        "face-rematch",
+        help="Re-match stored probe face embeddings against labeled gallery changes",
+    )
+    p_rematch.add_argument(
+        "--gallery", required=True, help="Labeled gallery (subfolders = subjects)"
+    )
+    p_rematch.add_argument("--db", help="Path to SQLite DB (defaults to project DB)")
+    p_rematch.add_argument(
+        "--threshold",
+        type=float,
+        default=0.6,
+        help="Distance threshold for face match (lower is stricter)",
+    )
+    p_rematch.add_argument(
+        "--full",
+        action="store_true",
+        help="Re-score every subject instead of only added/changed ones",
+    )
+    p_rematch.set_defaults(
+        func=lambda args: __import__(
+            "case_agent.pipelines.face_rematch", fromlist=["cli_run"]
+        ).cli_run(args)
+    )
+
+    p_integrity = sub.add_parser(
+        "integrity",
+        help="Build, verify or export the Merkle integrity manifest of an evidence folder",
+    )
+    p_integrity.add_argument("action", choices=["build", "verify", "export"])
+    p_integrity.add_argument("--evidence", required=True, help="Evidence folder")
+    p_integrity.add_argument("--db", help="Path to SQLite DB (defaults to project DB)")
+    p_integrity.add_argument("--out", help="Root hash JSON to write (export)")
+    p_integrity.add_argument(
+        "--signed-off-by", help="Examiner attesting the root hash (export; defaults to the OS user)"
+    )
+    p_integrity.add_argument(
+        "--sample",
+        type=float,
+        default=0.0,
+        help="Fraction of unchanged directories to spot-check by re-hashing (verify)",
+    )
+    p_integrity.add_argument(
+        "--full", action="store_true", help="Re-hash every file (verify)"
+    )
+    p_integrity.set_defaults(
+        func=lambda args: __import__(
+            "case_agent.pipelines.merkle", fromlist=["cli_run"]
+        ).cli_run(args)
+    )
+
     p_serve = sub.add_parser(
         "serve", help="Run a lightweight HTTP API exposing the agent and reports"
     )
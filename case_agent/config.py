@@ -13,6 +13,17 @@ DEFAULT_DB_PATH = Path.cwd() / "file_analyzer.db"
 
 # Limits and options
 CHUNK_SIZE = 8192
+# Inventory hashing (see hash_engine): worker threads (None = min(8, cores)),
+# read block size, files of at least HASH_MMAP_THRESHOLD bytes are memory-mapped
+# (0 disables), and the digests computed per file in one pass (sha256 is always
+# included; add "md5"/"sha1" for exchange with other forensic tools).
+HASH_WORKERS = None
+HASH_BLOCK_SIZE = 4 * 1024 * 1024
+HASH_MMAP_THRESHOLD = 256 * 1024 * 1024
+HASH_ALGORITHMS = ("sha256",)
+# Threads listing directories (os.scandir) / stat-ing manifest entries during
+# inventory (see file_walker); None = 8. Network shares benefit from more.
+SCAN_WORKERS = None
 
 # FFmpeg and OCR config
 # Use explicit paths for determinism when installers are available
@@ -28,6 +39,84 @@ THUMB_RENDER_CONCURRENCY = 4
 # GUI option: whether to show the top subjects panel
 SHOW_TOP_SUBJECTS = True
 
+# Face matching: approximate nearest-neighbour index for very large galleries.
+# Unlabeled galleries with at least FACE_ANN_MIN_GALLERY rows get an ANN index
+# (0 disables); labeled galleries are matched exactly via their prototypes.
+FACE_ANN_MIN_GALLERY = 50000
+FACE_ANN_BACKEND = "auto"  # auto | ivf | hnswlib | faiss
+# Recall/latency knob: IVF lists probed per query, or HNSW ef as a multiple of k
+FACE_ANN_EFFORT = 8
+# Labeled galleries are compacted to at most FACE_PROTOTYPES_PER_SUBJECT diverse
+# prototypes per subject (farthest-point sampling); probes are scored against
+# them first and only shortlisted subjects are expanded to every image (0 =
+# score every image). Images farther than FACE_GALLERY_OUTLIER_DISTANCE (and
+# well outside their subject's spread) from the rest are flagged as outliers.
+FACE_PROTOTYPES_PER_SUBJECT = 8
+FACE_GALLERY_OUTLIER_DISTANCE = 0.9
+
+# Face embedding model: "dlib" (face_recognition, 128-d), "facenet-vggface2"
+# (facenet-pytorch, 512-d) or "auto" (dlib when installed, else FaceNet).
+# Gallery stores and stored probes are kept per model and never mixed.
+FACE_EMBEDDING_MODEL = "auto"
+
+# torch intra-op threads for FaceNet embedding (None = torch default). Set to
+# cores / worker processes when running several embedding workers.
+TORCH_NUM_THREADS = None
+# Crops per FaceNet forward pass
+FACE_EMBED_BATCH_SIZE = 32
+# Parallel face matching (face_parallel): worker processes (None = all cores)
+# and crops/images sent to a worker per task
+FACE_SCAN_WORKERS = None
+FACE_SCAN_CHUNK_SIZE = 64
+# Detection worker processes for video samples and rendered PDF pages; frames
+# reach them through shared-memory buffers (frame_ring). 1 = detect inline.
+FRAME_WORKERS = 1
+# Background threads writing face crops queued by face_search.detect_and_embed
+FACE_CROP_WRITER_THREADS = 2
+# Face detection: "full" runs the detector at full resolution; "downscale" finds
+# candidates on a copy whose longest side is FACE_DETECT_MAX_SIDE and re-detects
+# only in padded full-resolution regions; "haar" uses a Haar cascade pre-screen
+# for the candidates. See scripts/bench_face_detect.py for speed/recall.
+FACE_DETECT_MODE = "full"
+FACE_DETECT_MAX_SIDE = 1024
+FACE_DETECT_REGION_PAD = 0.5
+# Face quality pre-filter (see face_quality): skip detections whose shorter side
+# is below FACE_QUALITY_MIN_SIZE pixels, whose Laplacian variance is below
+# FACE_QUALITY_MIN_SHARPNESS, whose mean brightness is outside
+# [FACE_QUALITY_MIN_BRIGHTNESS, FACE_QUALITY_MAX_BRIGHTNESS] or whose landmark
+# yaw (nose offset / eye distance) exceeds FACE_QUALITY_MAX_YAW, before they
+# are embedded. None disables a single check.
+FACE_QUALITY_FILTER = False
+FACE_QUALITY_MIN_SIZE = 40
+FACE_QUALITY_MIN_SHARPNESS = 15.0
+FACE_QUALITY_MIN_BRIGHTNESS = 25.0
+FACE_QUALITY_MAX_BRIGHTNESS = 235.0
+FACE_QUALITY_MAX_YAW = 0.5
+# Crop deduplication (see crop_dedup): a face crop whose dHash is within
+# CROP_DEDUP_MAX_DISTANCE bits of an already processed crop reuses that crop's
+# embedding and match instead of being written, embedded and matched again.
+CROP_DEDUP = False
+CROP_DEDUP_MAX_DISTANCE = 4
+# Video frame sampling: "auto" (cv2 when installed, else ffmpeg), "cv2" or "ffmpeg"
+VIDEO_FRAME_BACKEND = "auto"
+# Scene-change-aware sampling: examine a frame every VIDEO_SCENE_PROBE_INTERVAL
+# seconds and run face detection only when its dHash differs from the last
+# detected frame by more than VIDEO_SCENE_THRESHOLD bits (of 64), then every
+# VIDEO_SCENE_DENSE_INTERVAL seconds for VIDEO_SCENE_DENSE_DURATION seconds.
+VIDEO_ADAPTIVE_SAMPLING = False
+VIDEO_SCENE_PROBE_INTERVAL = 0.5
+VIDEO_SCENE_THRESHOLD = 10
+VIDEO_SCENE_DENSE_INTERVAL = 1.0
+VIDEO_SCENE_DENSE_DURATION = 3.0
+# Video face tracking: link detections in consecutive samples when the embedding
+# distance is <= FACE_TRACK_MAX_DISTANCE and boxes overlap by FACE_TRACK_IOU, or
+# the distance alone is <= FACE_TRACK_REID_DISTANCE. Tracks close after
+# FACE_TRACK_MAX_GAP_SECONDS (at least two sampling intervals) without a match.
+FACE_TRACK_IOU = 0.3
+FACE_TRACK_MAX_DISTANCE = 0.6
+FACE_TRACK_REID_DISTANCE = 0.45
+FACE_TRACK_MAX_GAP_SECONDS = 10.0
+
 # Local LLM (Ollama) settings (not used by core pipelines)
 OLLAMA_HOST = "http://localhost:11434"  # only used if local Ollama is configured
 
@@ -1,6 +1,6 @@
 """Initialize the SQLite database for the case agent."""
 import logging
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, inspect, text
 from sqlalchemy.orm import sessionmaker
 from pathlib import Path
 from .models import Base
@@ -10,6 +10,8 @@ logger = logging.getLogger("case_agent.db")
 
 _engine = None
 _Session = None
+# URLs whose tables were already checked for missing columns in this process
+_migrated = set()
 
 
 def init_db(db_path: str | Path = DEFAULT_DB_PATH):
@@ -19,10 +21,38 @@ def init_db(db_path: str | Path = DEFAULT_DB_PATH):
     logger.info("Initializing DB at %s", db_path)
     _engine = create_engine(db_url, echo=False, future=True)
     Base.metadata.create_all(_engine)
+    if db_url not in _migrated:
+        _add_missing_columns(_engine)
+        _migrated.add(db_url)
     _Session = sessionmaker(bind=_engine)
     return _engine
 
 
+def _add_missing_columns(engine):
+    """Add nullable model columns missing from existing tables.
+
+    ``create_all`` only creates missing tables; columns added to a model later
+    are appended with ``ALTER TABLE ... ADD COLUMN`` so older databases keep
+    working (see also scripts/db_migrate.py).
+    """
+    insp = inspect(engine)
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            if not insp.has_table(table.name):
+                continue
+            existing = {c["name"] for c in insp.get_columns(table.name)}
+            for col in table.columns:
+                if col.name in existing or col.primary_key or not col.nullable:
+                    continue
+                logger.info("Adding column %s.%s", table.name, col.name)
+                conn.execute(
+                    text(
+                        f"ALTER TABLE {table.name} ADD COLUMN {col.name} "
+                        f"{col.type.compile(engine.dialect)}"
+                    )
+                )
+
+
 def get_session():
     if _Session is None:
         raise RuntimeError("Database not initialized. Call init_db() first.")
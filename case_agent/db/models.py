@@ -12,10 +12,56 @@ class EvidenceFile(Base):
     path = Column(String, unique=True, nullable=False)
     size = Column(Integer)
     mtime = Column(DateTime)
+    # exact stat identity used by incremental inventory runs to skip re-hashing
+    mtime_ns = Column(Integer, nullable=True)
+    inode = Column(Integer, nullable=True)
     sha256 = Column(String, index=True, unique=True, nullable=False)
     processed = Column(Boolean, default=False)
     file_metadata = Column(JSON, default={})  # renamed from 'metadata' to avoid SQLAlchemy reserved name
 
+class FileLocation(Base):
+    """A path at which an evidence file's content was found.
+
+    `evidence_files` holds one row per unique content (sha256); every path
+    with that content, including duplicate copies, has a location row with
+    the stat identity (size, mtime_ns, inode) used by incremental inventory.
+    """
+    __tablename__ = "file_locations"
+    id = Column(Integer, primary_key=True)
+    file_id = Column(Integer, ForeignKey("evidence_files.id"), index=True, nullable=False)
+    path = Column(String, unique=True, nullable=False)
+    size = Column(Integer)
+    mtime_ns = Column(Integer, nullable=True)
+    inode = Column(Integer, nullable=True)
+    created_at = Column(DateTime, default=datetime.datetime.utcnow)
+    file = relationship("EvidenceFile")
+
+class MerkleNode(Base):
+    """Node of an evidence integrity Merkle tree (see pipelines.merkle).
+
+    One row per file and directory under an inventoried evidence root; `path`
+    and `parent` are relative to `root` with '/' separators ('' is the root).
+
+    - `hash` is the content hash (files: from the file sha256; directories:
+      over their children's names and hashes)
+    - `meta_hash` covers only names, sizes and mtimes, so a re-verification
+      can skip subtrees whose metadata did not change without reading them
+    - `size` / `file_count` total the subtree (`file_count` is 1 for files)
+    """
+    __tablename__ = "merkle_nodes"
+    id = Column(Integer, primary_key=True)
+    root = Column(String, index=True, nullable=False)
+    path = Column(String, nullable=False)
+    parent = Column(String, nullable=True)
+    kind = Column(String)  # 'file' | 'dir'
+    hash = Column(String)
+    meta_hash = Column(String)
+    sha256 = Column(String, nullable=True)
+    size = Column(Integer)
+    mtime_ns = Column(Integer, nullable=True)
+    file_count = Column(Integer)
+    built_at = Column(DateTime, default=datetime.datetime.utcnow)
+
 class ExtractedText(Base):
     __tablename__ = "extracted_text"
     id = Column(Integer, primary_key=True)
@@ -59,6 +105,8 @@ class FaceMatch(Base):
     - `subject` is the labeled subject name when using labeled gallery
     - `gallery_path` is the matching gallery image path
     - `distance` is numeric distance between embeddings (Euclidean)
+    - `track_start` / `track_end` are the first/last timestamps (seconds) of a
+      video face track and `num_detections` its length (NULL for single probes)
     - `created_at` timestamp of insertion
     """
     __tablename__ = 'face_matches'
@@ -68,6 +116,61 @@ class FaceMatch(Base):
     subject = Column(String, nullable=True)
     gallery_path = Column(String, nullable=True)
     distance = Column(Float)
+    track_start = Column(Float, nullable=True)
+    track_end = Column(Float, nullable=True)
+    num_detections = Column(Integer, nullable=True)
+    created_at = Column(DateTime, default=datetime.datetime.utcnow)
+
+
+class FaceEmbedding(Base):
+    """Probe face embedding detected in an evidence file.
+
+    Faces are detected and embedded once per evidence file; later matching
+    (new gallery subjects, retuned thresholds) runs from these vectors.
+
+    - `vector` is the L2-normalized embedding as little-endian float32 bytes
+    - `model` / `dim` identify the embedding space (e.g. 'dlib', 128)
+    - `file_id` links to the inventoried evidence file (NULL if not inventoried)
+    - `source` is the evidence file path
+    - `page` (PDFs) or `timestamp` (videos, seconds) locate the face
+    - `bbox` is JSON of the face box and `crop_path` the written crop, if any
+    - `duplicate_of` is set when the crop duplicates one seen earlier (see
+      pipelines.crop_dedup); `crop_path` then names that canonical crop
+    """
+    __tablename__ = 'face_embeddings'
+    id = Column(Integer, primary_key=True)
+    file_id = Column(Integer, ForeignKey("evidence_files.id"), index=True, nullable=True)
+    source = Column(String, index=True)
+    page = Column(Integer, nullable=True)
+    timestamp = Column(Float, nullable=True)
+    bbox = Column(JSON, nullable=True)
+    crop_path = Column(String, nullable=True)
+    model = Column(String, index=True)
+    dim = Column(Integer)
+    vector = Column(LargeBinary, nullable=False)
+    duplicate_of = Column(String, nullable=True)
+    created_at = Column(DateTime, default=datetime.datetime.utcnow)
+
+
+class CropHash(Base):
+    """Perceptual hash of a face crop and where that face appeared.
+
+    One row per detected face: `duplicate` is False for the first (canonical)
+    appearance, whose crop was written, embedded and matched, and True for
+    later near-identical appearances, which only record provenance and point
+    at the canonical crop through `crop_path`.
+
+    - `hash` is the 64-bit dHash stored as a signed integer
+    - `source` / `page` / `bbox` locate this appearance in the evidence file
+    """
+    __tablename__ = 'crop_hashes'
+    id = Column(Integer, primary_key=True)
+    hash = Column(Integer, index=True, nullable=False)
+    crop_path = Column(String, index=True)
+    source = Column(String, index=True)
+    page = Column(Integer, nullable=True)
+    bbox = Column(JSON, nullable=True)
+    duplicate = Column(Boolean, default=False)
     created_at = Column(DateTime, default=datetime.datetime.utcnow)
 
 # Relationships can be added as needed; left minimal for auditability
@@ -4,6 +4,7 @@ import argparse
 import logging
 from pathlib import Path
 from .db.init_db import init_db
+from .pipelines.file_walker import manifest_files
 from .pipelines.hash_inventory import walk_and_hash
 from .pipelines.text_extract import extract_for_file
 from .pipelines.entity_extract import extract_entities_for_file
@@ -21,14 +22,18 @@ def main():
     parser.add_argument("--db", default=None)
     parser.add_argument("--report", default=None, help="Write extended audit report to this path (JSON)")
     parser.add_argument("--report-csv", default=None, help="Write CSV summary to this path")
+    parser.add_argument("--verify", action="store_true", help="Re-hash every evidence file instead of skipping unchanged ones")
+    parser.add_argument("--manifest", default=None, help="Inventory the files listed in this manifest ('-' = stdin) instead of walking evidence_dir")
     args = parser.parse_args()
     evidence_dir = Path(args.evidence_dir) if args.evidence_dir else None
     if evidence_dir is None:
         from .config import DEFAULT_EVIDENCE_DIR
         evidence_dir = Path(DEFAULT_EVIDENCE_DIR)
     init_db(args.db)
-    files = walk_and_hash(evidence_dir, db_path=args.db)
-    for f in files:
+    manifest = manifest_files(args.manifest, root=evidence_dir) if args.manifest else None
+    files = walk_and_hash(evidence_dir, db_path=args.db, verify=args.verify, files=manifest)
+    # duplicate copies share their content's extraction results
+    for f in files.unique():
         p = Path(f["path"])
         extract_for_file(p, db_path=args.db)
         extract_entities_for_file(p, db_path=args.db)
@@ -0,0 +1,205 @@
+"""Perceptual deduplication of face crops before gallery matching.
+
+The same photo is often reproduced in many PDFs (exhibits, re-filings, email
+attachments), and every appearance used to be cropped, embedded and matched
+against the gallery again. :class:`CropDedup` keeps the 64-bit dHash of every
+processed crop; a new crop within ``max_distance`` bits of a known one is not
+written, embedded or matched again but reuses the earlier (canonical) crop,
+and only a provenance row (``CropHash`` with ``duplicate=True``) is recorded.
+
+Lookups use multi-index hashing: the hash is split into ``max_distance + 1``
+bands and, by the pigeonhole principle, two hashes within ``max_distance``
+bits agree exactly on at least one band, so only crops sharing a band are
+compared.
+"""
+
+import logging
+import threading
+from pathlib import Path
+
+import numpy as np
+
+from .. import config
+from ..db.models import CropHash, FaceEmbedding
+from ..utils.image_buffer import ImageBuffer
+from .video_frames import dhash, hamming
+
+logger = logging.getLogger("case_agent.crop_dedup")
+
+HASH_BITS = 64
+
+
+def crop_hash(crop) -> int:
+    """64-bit dHash of a crop (ImageBuffer, PIL image, path or RGB/gray array)."""
+    return dhash(ImageBuffer.wrap(crop).gray())
+
+
+def _to_signed(h: int) -> int:
+    """SQLite integers are signed 64-bit."""
+    return h - (1 << HASH_BITS) if h >= 1 << (HASH_BITS - 1) else h
+
+
+def _to_unsigned(h: int) -> int:
+    return h + (1 << HASH_BITS) if h < 0 else h
+
+
+class HashIndex:
+    """Nearest known hash within `max_distance` bits (multi-index hashing)."""
+
+    def __init__(self, max_distance: int = 4):
+        self.max_distance = max(0, int(max_distance))
+        edges = np.linspace(0, HASH_BITS, min(self.max_distance + 1, HASH_BITS) + 1).astype(int)
+        self._bands = [(int(lo), (1 << int(hi - lo)) - 1) for lo, hi in zip(edges[:-1], edges[1:])]
+        self._tables = [{} for _ in self._bands]
+        self._keys = {}
+
+    def __len__(self):
+        return len(self._keys)
+
+    def add(self, h: int, key):
+        if h in self._keys:
+            return
+        self._keys[h] = key
+        for table, (shift, mask) in zip(self._tables, self._bands):
+            table.setdefault((h >> shift) & mask, []).append(h)
+
+    def find(self, h: int):
+        """Return ``(key, distance)`` of the closest known hash, or None."""
+        if h in self._keys:
+            return self._keys[h], 0
+        best, best_dist = None, self.max_distance + 1
+        seen = set()
+        for table, (shift, mask) in zip(self._tables, self._bands):
+            for cand in table.get((h >> shift) & mask, ()):
+                if cand in seen:
+                    continue
+                seen.add(cand)
+                dist = hamming(h, cand)
+                if dist < best_dist:
+                    best, best_dist = cand, dist
+        return None if best is None else (self._keys[best], best_dist)
+
+
+class CropDedup:
+    """Crop hash index with provenance rows and counters.
+
+    With `db_path` the canonical crops of earlier runs are loaded from
+    ``crop_hashes`` and :meth:`flush` writes the rows recorded since; without
+    it the index lives for this process only.
+    """
+
+    def __init__(self, db_path=None, max_distance: int | None = None):
+        if max_distance is None:
+            max_distance = config.CROP_DEDUP_MAX_DISTANCE
+        self.db_path = db_path
+        self.index = HashIndex(max_distance)
+        self.checked = 0
+        self.deduplicated = 0
+        self._pending = []
+        self._lock = threading.Lock()
+        if db_path is not None:
+            self._load()
+
+    def _session(self):
+        from .face_probes import _session
+
+        return _session(self.db_path)
+
+    def _load(self):
+        session = self._session()
+        try:
+            rows = session.query(CropHash.hash, CropHash.crop_path).filter_by(duplicate=False)
+            for h, crop_path in rows:
+                self.index.add(_to_unsigned(h), crop_path)
+        finally:
+            session.close()
+        logger.info("Loaded %d known crop hashes", len(self.index))
+
+    def check(self, crop, source, crop_path, page=None, bbox=None, h: int | None = None) -> str | None:
+        """Look up a crop about to be written to `crop_path`.
+
+        Returns the canonical crop path when a near-identical crop was already
+        processed (the caller then skips writing, embedding and matching it);
+        otherwise registers `crop_path` as canonical and returns None. Pass
+        `h` when the hash was computed elsewhere (e.g. in a worker process).
+        """
+        h = crop_hash(crop) if h is None else h
+        crop_path = str(crop_path)
+        with self._lock:
+            self.checked += 1
+            hit = self.index.find(h)
+            if hit is None:
+                self.index.add(h, crop_path)
+            else:
+                self.deduplicated += 1
+            canonical = None if hit is None else hit[0]
+            self._pending.append(
+                {
+                    "hash": _to_signed(h),
+                    "crop_path": canonical or crop_path,
+                    "source": str(source),
+                    "page": page,
+                    "bbox": bbox,
+                    "duplicate": canonical is not None,
+                }
+            )
+        return canonical
+
+    def embedding(self, crop_path, model: str):
+        """Stored probe embedding of a canonical crop, or None."""
+        if self.db_path is None:
+            return None
+        from .face_probes import decode_vector
+
+        session = self._session()
+        try:
+            row = (
+                session.query(FaceEmbedding.vector)
+                .filter_by(crop_path=str(crop_path), model=model)
+                .first()
+            )
+        finally:
+            session.close()
+        return None if row is None else decode_vector(row[0])
+
+    def flush(self) -> int:
+        """Write the provenance rows recorded since the last flush."""
+        with self._lock:
+            pending, self._pending = self._pending, []
+        if self.db_path is None or not pending:
+            return 0
+        session = self._session()
+        try:
+            session.bulk_insert_mappings(CropHash, pending)
+            session.commit()
+        except Exception:
+            session.rollback()
+            logger.exception("Failed to store %d crop hashes", len(pending))
+            return 0
+        finally:
+            session.close()
+        return len(pending)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "checked": self.checked,
+                "unique": self.checked - self.deduplicated,
+                "deduplicated": self.deduplicated,
+            }
+
+
+_shared = {}
+_shared_lock = threading.Lock()
+
+
+def shared_dedup(db_path=None) -> CropDedup | None:
+    """Process-wide :class:`CropDedup` for `db_path` (default
+    ``config.DEFAULT_DB_PATH``), or None when ``config.CROP_DEDUP`` is off."""
+    if not config.CROP_DEDUP:
+        return None
+    key = str(Path(db_path or config.DEFAULT_DB_PATH))
+    with _shared_lock:
+        if key not in _shared:
+            _shared[key] = CropDedup(db_path or config.DEFAULT_DB_PATH)
+        return _shared[key]
@@ -0,0 +1,92 @@
+"""Find files with identical content while reading as little as possible.
+
+Files can only be identical if their sizes are equal, so files are first
+bucketed by size (free: it comes from the directory walk). Within a bucket a
+partial hash of the first and last ``partial_bytes`` splits most remaining
+candidates apart, and only files whose partial hashes still collide are fully
+hashed (sha256). Files no larger than two partial blocks are confirmed by the
+partial hash alone, since it covers their whole content.
+"""
+
+import hashlib
+import logging
+import os
+from collections import defaultdict
+from pathlib import Path
+
+from .hash_engine import HashEngine
+
+logger = logging.getLogger("case_agent.duplicates")
+
+PARTIAL_BYTES = 64 * 1024
+
+
+def partial_hash(path: Path, partial_bytes: int = PARTIAL_BYTES) -> str:
+    """blake2b of the size, first and last `partial_bytes` of `path`."""
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        h.update(size.to_bytes(8, "little"))
+        h.update(f.read(partial_bytes))
+        if size > partial_bytes:
+            f.seek(max(partial_bytes, size - partial_bytes))
+            h.update(f.read(partial_bytes))
+    return h.hexdigest()
+
+
+def find_duplicates(files, engine: HashEngine | None = None, partial_bytes: int = PARTIAL_BYTES):
+    """Group identical files.
+
+    `files` yields paths or ``(path, size)`` pairs. Returns ``(groups, stats)``
+    where `groups` is a list of lists of paths (two or more per group, in input
+    order) and `stats` counts files, size/partial/full candidates and bytes
+    read.
+    """
+    by_size = defaultdict(list)
+    count = 0
+    for item in files:
+        path, size = item if isinstance(item, tuple) else (item, None)
+        if size is None:
+            try:
+                size = os.stat(path).st_size
+            except OSError as e:
+                logger.warning("Skipping %s: %s", path, e)
+                continue
+        by_size[size].append(path)
+        count += 1
+    stats = {"files": count, "size_candidates": 0, "partial_candidates": 0, "fully_hashed": 0, "bytes_read": 0}
+
+    full_needed = []
+    groups = []
+    for size, paths in by_size.items():
+        if len(paths) < 2:
+            continue
+        stats["size_candidates"] += len(paths)
+        by_partial = defaultdict(list)
+        for path in paths:
+            try:
+                by_partial[partial_hash(path, partial_bytes)].append(path)
+            except OSError as e:
+                logger.warning("Could not read %s: %s", path, e)
+                continue
+            stats["bytes_read"] += min(size, 2 * partial_bytes)
+        for same in by_partial.values():
+            if len(same) < 2:
+                continue
+            stats["partial_candidates"] += len(same)
+            if size <= 2 * partial_bytes:
+                groups.append(same)
+            else:
+                full_needed.append((size, same))
+
+    engine = engine or HashEngine()
+    for size, paths in full_needed:
+        by_sha = defaultdict(list)
+        for path, digests in engine.map(paths):
+            if digests is None:
+                continue
+            stats["fully_hashed"] += 1
+            stats["bytes_read"] += size
+            by_sha[digests["sha256"]].append(path)
+        groups.extend(same for same in by_sha.values() if len(same) > 1)
+    return groups, stats
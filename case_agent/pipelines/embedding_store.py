@@ -0,0 +1,226 @@
+"""Versioned on-disk store for gallery face embeddings.
+
+A store is two files in the gallery directory:
+
+- ``.<name>.<generation>.npy`` — raw float32 matrix of L2-normalized
+  embeddings, one row per image, opened with ``np.load(mmap_mode='r')`` so
+  worker processes share pages through the OS cache instead of each holding a
+  private copy.
+- ``.<name>.json`` — compact manifest: store version, generation, model tag,
+  dimension, row paths, optional row subjects and per-file fingerprints.
+
+Each write goes to a new generation file and the manifest is replaced last and
+atomically, so readers never see a half-written store and a matrix that is
+still memory-mapped elsewhere is never overwritten in place. Legacy pickle
+caches are migrated by the loaders in ``face_search``.
+"""
+
+import json
+import logging
+import os
+from collections.abc import Mapping
+from pathlib import Path
+
+import numpy as np
+
+from .face_index import l2_normalize
+from .hash_inventory import sha256_file
+
+logger = logging.getLogger("case_agent.embedding_store")
+
+STORE_VERSION = 1
+
+
+def _manifest_path(directory: Path, name: str) -> Path:
+    return Path(directory) / f".{name}.json"
+
+
+def _read_manifest(manifest_path: Path) -> dict | None:
+    try:
+        return json.loads(manifest_path.read_text(encoding="utf-8"))
+    except Exception:
+        return None
+
+
+def file_fingerprint(path: Path) -> list:
+    """Return the fingerprint ``[size, mtime_ns, sha256]`` of a file."""
+    st = Path(path).stat()
+    return [st.st_size, st.st_mtime_ns, sha256_file(Path(path))]
+
+
+class EmbeddingStore(Mapping):
+    """Read-only mapping of gallery path -> embedding row backed by a matrix.
+
+    Attributes
+    ----------
+    matrix : np.ndarray
+        (n, dim) float32 L2-normalized embeddings (memory-mapped when opened
+        from disk).
+    paths : list[str]
+        Path of each row.
+    subjects : list[str] | None
+        Subject of each row for labeled galleries (rows grouped by subject).
+    model : str | None
+        Tag of the embedding model that produced the rows.
+    fingerprints : dict
+        {path: [size, mtime_ns, sha256]} for every scanned gallery image,
+        including images that produced no embedding.
+    """
+
+    def __init__(
+        self,
+        matrix,
+        paths,
+        subjects=None,
+        model=None,
+        fingerprints=None,
+        version=0,
+        generation=0,
+    ):
+        self.matrix = matrix
+        self.paths = list(paths)
+        self.subjects = list(subjects) if subjects is not None else None
+        self.model = model
+        self.fingerprints = dict(fingerprints or {})
+        self.version = version
+        self.generation = generation
+        self._rows = {p: i for i, p in enumerate(self.paths)}
+
+    # Mapping interface (unlabeled gallery compatibility)
+    def __getitem__(self, path):
+        return self.matrix[self._rows[path]]
+
+    def __iter__(self):
+        return iter(self.paths)
+
+    def __len__(self):
+        return len(self.paths)
+
+    @property
+    def dim(self) -> int:
+        return int(self.matrix.shape[1]) if self.matrix.ndim == 2 else 0
+
+    def as_labeled(self) -> dict:
+        """Return the labeled-gallery dict {subject: [{'path', 'embedding'}]}."""
+        out = {}
+        for i, (path, subject) in enumerate(zip(self.paths, self.subjects or [])):
+            out.setdefault(subject, []).append(
+                {"path": path, "embedding": self.matrix[i]}
+            )
+        return out
+
+    @classmethod
+    def open(cls, directory: Path, name: str) -> "EmbeddingStore | None":
+        """Open a store from `directory`; return None if missing or invalid."""
+        manifest_path = _manifest_path(directory, name)
+        if not manifest_path.exists():
+            return None
+        manifest = _read_manifest(manifest_path)
+        if manifest is None:
+            logger.warning("Unreadable embedding store manifest %s", manifest_path)
+            return None
+        if manifest.get("version") != STORE_VERSION:
+            logger.info(
+                "Embedding store %s has version %s (expected %s); will rebuild",
+                manifest_path,
+                manifest.get("version"),
+                STORE_VERSION,
+            )
+            return None
+        try:
+            count = int(manifest.get("count", 0))
+            if count:
+                npy_path = Path(directory) / manifest["matrix"]
+                matrix = np.load(npy_path, mmap_mode="r")
+            else:
+                matrix = np.zeros((0, int(manifest.get("dim", 0))), dtype=np.float32)
+            if matrix.dtype != np.float32 or matrix.shape[0] != count:
+                logger.warning(
+                    "Embedding store %s is inconsistent; will rebuild", manifest_path
+                )
+                return None
+            return cls(
+                matrix,
+                manifest.get("paths", []),
+                subjects=manifest.get("subjects"),
+                model=manifest.get("model"),
+                fingerprints=manifest.get("fingerprints"),
+                version=manifest.get("version"),
+                generation=int(manifest.get("generation", 0)),
+            )
+        except Exception:
+            logger.exception("Failed to open embedding store %s", manifest_path)
+            return None
+
+    @classmethod
+    def write(
+        cls,
+        directory: Path,
+        name: str,
+        matrix,
+        paths,
+        subjects=None,
+        model=None,
+        fingerprints=None,
+    ) -> "EmbeddingStore":
+        """Normalize and persist a store, then reopen it memory-mapped.
+
+        If the directory is not writable the in-memory store is returned.
+        """
+        paths = list(paths)
+        matrix = l2_normalize(matrix) if paths else np.zeros((0, 0), dtype=np.float32)
+        manifest_path = _manifest_path(directory, name)
+        previous = _read_manifest(manifest_path) or {}
+        generation = int(previous.get("generation", 0)) + 1
+        store = cls(
+            matrix,
+            paths,
+            subjects=subjects,
+            model=model,
+            fingerprints=fingerprints,
+            version=STORE_VERSION,
+            generation=generation,
+        )
+        npy_name = f".{name}.{generation}.npy"
+        manifest = {
+            "version": STORE_VERSION,
+            "generation": generation,
+            "matrix": npy_name,
+            "model": model,
+            "dim": store.dim,
+            "count": len(paths),
+            "paths": paths,
+            "subjects": store.subjects,
+            "fingerprints": store.fingerprints,
+        }
+        try:
+            Path(directory).mkdir(parents=True, exist_ok=True)
+            with (Path(directory) / npy_name).open("wb") as fh:
+                np.save(fh, matrix)
+            tmp_manifest = manifest_path.with_name(manifest_path.name + ".tmp")
+            tmp_manifest.write_text(json.dumps(manifest), encoding="utf-8")
+            os.replace(tmp_manifest, manifest_path)
+        except Exception:
+            logger.exception("Failed to write embedding store %s", manifest_path)
+            return store
+        _remove_stale_matrices(Path(directory), name, generation)
+        return cls.open(directory, name) or store
+
+
+def _remove_stale_matrices(directory: Path, name: str, generation: int):
+    """Best-effort removal of old generation files.
+
+    The previous generation is kept so a reader that loaded the old manifest
+    can still open its matrix; removal may fail while a file is still mapped.
+    """
+    for old in directory.glob(f".{name}.*.npy"):
+        try:
+            old_generation = int(old.name[len(name) + 2 : -len(".npy")])
+        except ValueError:
+            continue
+        if old_generation >= generation - 1:
+            continue
+        try:
+            old.unlink()
+        except OSError:
+            logger.debug("Could not remove stale embedding matrix %s", old)
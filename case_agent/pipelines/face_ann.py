@@ -0,0 +1,286 @@
+"""Approximate nearest-neighbour indexes for very large face galleries.
+
+Exhaustive matching (``face_index.GalleryIndex``) scores every gallery row.
+For galleries with hundreds of thousands of faces an ANN index narrows each
+query to a small candidate set that is then scored exactly.
+
+Backends:
+- ``ivf`` — pure NumPy inverted-file index (spherical k-means coarse
+  quantizer); always available.
+- ``hnswlib`` / ``faiss`` — HNSW graphs, used when the library is installed.
+
+All backends take one recall/latency knob, ``effort``: the number of IVF lists
+probed per query, or the HNSW ``ef`` as a multiple of ``k``. Indexes are
+persisted next to the gallery embedding store and rebuilt when the store
+generation changes. :func:`benchmark_recall` measures recall against exact
+search so settings can be picked per case.
+"""
+
+import json
+import logging
+import time
+from pathlib import Path
+
+import numpy as np
+
+from .face_index import l2_normalize, select_top_k, unit_distances
+
+logger = logging.getLogger("case_agent.face_ann")
+
+try:
+    import hnswlib
+except Exception:
+    hnswlib = None
+
+try:
+    import faiss
+except Exception:
+    faiss = None
+
+
+def _to_distances(sims):
+    """Convert inner products of unit vectors into Euclidean distances."""
+    return np.sqrt(np.clip(2.0 - 2.0 * np.asarray(sims, dtype=np.float32), 0.0, None))
+
+
+class IVFIndex:
+    """Inverted-file index over an L2-normalized float32 matrix.
+
+    Rows are clustered by spherical k-means into `nlist` lists; a query scores
+    the centroids, then exactly scores the rows of the `effort` closest lists.
+    """
+
+    backend = "ivf"
+
+    def __init__(self, matrix, centroids, list_offsets, list_rows):
+        self.matrix = matrix
+        self.centroids = np.asarray(centroids, dtype=np.float32)
+        self.list_offsets = np.asarray(list_offsets, dtype=np.int64)
+        self.list_rows = np.asarray(list_rows, dtype=np.int64)
+
+    @classmethod
+    def build(cls, matrix, nlist=None, iterations=10, sample_size=100000, seed=0):
+        n = matrix.shape[0]
+        if n == 0:
+            raise ValueError("cannot build an IVF index over an empty gallery")
+        if nlist is None:
+            nlist = max(1, int(4 * np.sqrt(n)))
+        nlist = min(nlist, n)
+        rng = np.random.default_rng(seed)
+        sample_idx = rng.choice(n, size=min(n, sample_size), replace=False)
+        sample = np.asarray(matrix[np.sort(sample_idx)])
+        centroids = sample[rng.choice(sample.shape[0], size=nlist, replace=False)]
+        for _ in range(iterations):
+            assign = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assign, sample)
+            empty = np.bincount(assign, minlength=nlist) == 0
+            # Re-seed empty lists from random sample rows
+            sums[empty] = sample[rng.choice(sample.shape[0], size=int(empty.sum()))]
+            centroids = l2_normalize(sums)
+        # Assign every row in blocks so memory-mapped matrices are streamed
+        assign = np.concatenate(
+            [
+                np.argmax(np.asarray(matrix[i : i + 65536]) @ centroids.T, axis=1)
+                for i in range(0, n, 65536)
+            ]
+        )
+        list_rows = np.argsort(assign, kind="stable")
+        counts = np.bincount(assign, minlength=nlist)
+        list_offsets = np.concatenate([[0], np.cumsum(counts)])
+        return cls(matrix, centroids, list_offsets, list_rows)
+
+    def query(self, probes, k, effort=8) -> list:
+        """Return one ``[(row, distance), ...]`` list (best first) per probe."""
+        q = l2_normalize(probes)
+        nprobe = max(1, min(int(effort), self.centroids.shape[0]))
+        centroid_sims = q @ self.centroids.T
+        out = []
+        for qi in range(q.shape[0]):
+            lists = np.argpartition(-centroid_sims[qi], nprobe - 1)[:nprobe]
+            cand = np.concatenate(
+                [
+                    self.list_rows[self.list_offsets[li] : self.list_offsets[li + 1]]
+                    for li in lists
+                ]
+            )
+            cand.sort()
+            dists = unit_distances(q[qi], self.matrix[cand])[0]
+            out.append([(int(cand[r]), d) for r, d in select_top_k(dists, top_k=k)])
+        return out
+
+    def save(self, path: Path):
+        with Path(path).open("wb") as fh:
+            np.savez(
+                fh,
+                centroids=self.centroids,
+                list_offsets=self.list_offsets,
+                list_rows=self.list_rows,
+            )
+
+    @classmethod
+    def load(cls, path: Path, matrix):
+        with np.load(path) as data:
+            return cls(
+                matrix, data["centroids"], data["list_offsets"], data["list_rows"]
+            )
+
+
+class HNSWIndex:
+    """HNSW graph from hnswlib or faiss over an L2-normalized matrix."""
+
+    def __init__(self, backend, impl, k_cap):
+        self.backend = backend
+        self.impl = impl
+        self.k_cap = k_cap
+
+    @classmethod
+    def build(cls, matrix, backend="hnswlib", m=32, ef_construction=200):
+        data = np.ascontiguousarray(matrix, dtype=np.float32)
+        n, dim = data.shape
+        if backend == "hnswlib":
+            impl = hnswlib.Index(space="ip", dim=dim)
+            impl.init_index(max_elements=n, M=m, ef_construction=ef_construction)
+            impl.add_items(data, np.arange(n))
+        else:
+            impl = faiss.IndexHNSWFlat(dim, m, faiss.METRIC_INNER_PRODUCT)
+            impl.hnsw.efConstruction = ef_construction
+            impl.add(data)
+        return cls(backend, impl, n)
+
+    def query(self, probes, k, effort=8) -> list:
+        q = np.ascontiguousarray(l2_normalize(probes))
+        k = min(k, self.k_cap)
+        ef = max(k, int(effort) * k)
+        if self.backend == "hnswlib":
+            self.impl.set_ef(ef)
+            labels, ip_dist = self.impl.knn_query(q, k=k)
+            sims = 1.0 - ip_dist
+        else:
+            self.impl.hnsw.efSearch = ef
+            sims, labels = self.impl.search(q, k)
+        dists = _to_distances(sims)
+        return [
+            [(int(r), float(d)) for r, d in zip(row_l, row_d) if r >= 0]
+            for row_l, row_d in zip(labels, dists)
+        ]
+
+    def save(self, path: Path):
+        if self.backend == "hnswlib":
+            self.impl.save_index(str(path))
+        else:
+            faiss.write_index(self.impl, str(path))
+
+    @classmethod
+    def load(cls, path: Path, backend, count, dim):
+        if backend == "hnswlib":
+            impl = hnswlib.Index(space="ip", dim=dim)
+            impl.load_index(str(path), max_elements=count)
+        else:
+            impl = faiss.read_index(str(path))
+        return cls(backend, impl, count)
+
+
+def available_backends() -> list:
+    out = ["ivf"]
+    if hnswlib is not None:
+        out.append("hnswlib")
+    if faiss is not None:
+        out.append("faiss")
+    return out
+
+
+def _resolve_backend(backend: str) -> str:
+    if backend == "auto":
+        return "hnswlib" if hnswlib is not None else "faiss" if faiss is not None else "ivf"
+    if backend not in available_backends():
+        logger.warning("ANN backend %s not installed; using ivf", backend)
+        return "ivf"
+    return backend
+
+
+def build_ann_index(matrix, backend: str = "auto"):
+    """Build an ANN index over an L2-normalized matrix."""
+    backend = _resolve_backend(backend)
+    if backend == "ivf":
+        return IVFIndex.build(matrix)
+    return HNSWIndex.build(matrix, backend=backend)
+
+
+def load_or_build_ann(directory: Path, name: str, generation: int, matrix, backend="auto"):
+    """Load the ANN index persisted next to store `name`, rebuilding if stale.
+
+    The index is tied to the store generation and row count; any store rewrite
+    invalidates it.
+    """
+    backend = _resolve_backend(backend)
+    directory = Path(directory)
+    meta_path = directory / f".{name}.ann.json"
+    index_path = directory / f".{name}.ann-{backend}.bin"
+    count, dim = int(matrix.shape[0]), int(matrix.shape[1])
+    try:
+        meta = json.loads(meta_path.read_text(encoding="utf-8"))
+    except Exception:
+        meta = None
+    if (
+        meta
+        and meta.get("backend") == backend
+        and meta.get("generation") == generation
+        and meta.get("count") == count
+        and index_path.exists()
+    ):
+        try:
+            if backend == "ivf":
+                return IVFIndex.load(index_path, matrix)
+            return HNSWIndex.load(index_path, backend, count, dim)
+        except Exception:
+            logger.exception("Failed to load ANN index %s; will rebuild", index_path)
+    logger.info("Building %s ANN index for %d gallery rows in %s", backend, count, directory)
+    ann = build_ann_index(matrix, backend=backend)
+    try:
+        ann.save(index_path)
+        meta_path.write_text(
+            json.dumps(
+                {"backend": backend, "generation": generation, "count": count, "dim": dim}
+            ),
+            encoding="utf-8",
+        )
+    except Exception:
+        logger.exception("Failed to persist ANN index %s", index_path)
+    return ann
+
+
+def benchmark_recall(ann, matrix, queries, k: int = 10, efforts=(1, 2, 4, 8, 16, 32)):
+    """Measure recall@k and latency of `ann` against exact search on `matrix`.
+
+    Returns a list of dicts ``{'effort', 'recall', 'ms_per_query'}``, preceded by
+    an ``{'effort': 'exact', ...}`` baseline entry.
+    """
+    queries = l2_normalize(queries)
+    n = queries.shape[0]
+    start = time.perf_counter()
+    exact = [
+        {r for r, _ in select_top_k(row, top_k=k)}
+        for row in unit_distances(queries, matrix)
+    ]
+    results = [
+        {
+            "effort": "exact",
+            "recall": 1.0,
+            "ms_per_query": (time.perf_counter() - start) * 1000.0 / max(n, 1),
+        }
+    ]
+    for effort in efforts:
+        start = time.perf_counter()
+        approx = ann.query(queries, k, effort=effort)
+        elapsed = time.perf_counter() - start
+        hits = sum(len(truth & {r for r, _ in got}) for truth, got in zip(exact, approx))
+        total = sum(len(truth) for truth in exact)
+        results.append(
+            {
+                "effort": effort,
+                "recall": hits / total if total else 1.0,
+                "ms_per_query": elapsed * 1000.0 / max(n, 1),
+            }
+        )
+    return results
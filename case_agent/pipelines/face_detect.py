@@ -0,0 +1,188 @@
+"""Multi-resolution face detection helpers.
+
+Scanned exhibits and rendered PDF pages are often 4000+ px wide and most
+contain no faces. Running HOG or Haar at full resolution on every page is the
+dominant cost of a scan, so detection can instead:
+
+1. run a cheap pass on a copy downscaled to ``max_side`` pixels (the same
+   detector, or a Haar cascade as pre-screen), and
+2. re-run the expensive detector only on padded candidate regions cut from the
+   full-resolution image.
+
+Detectors are plain callables ``detector(image) -> [(top, right, bottom,
+left), ...]`` so the same logic serves dlib HOG, Haar and test doubles. All
+returned boxes are in original image coordinates.
+"""
+
+import logging
+
+import numpy as np
+
+logger = logging.getLogger("case_agent.face_detect")
+
+try:
+    import cv2
+except Exception:
+    cv2 = None
+
+DETECT_MODES = ("full", "downscale", "haar")
+
+
+def downscale(image: np.ndarray, max_side: int):
+    """Return ``(small, scale)`` with the longest side at most `max_side`.
+
+    `scale` maps small coordinates back to the original (``orig = small *
+    scale``); images already small enough are returned as-is with scale 1.
+    """
+    h, w = image.shape[:2]
+    longest = max(h, w)
+    if not max_side or longest <= max_side:
+        return image, 1.0
+    scale = longest / float(max_side)
+    size = (max(1, int(round(w / scale))), max(1, int(round(h / scale))))
+    if cv2 is not None:
+        small = cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+    else:
+        from PIL import Image
+
+        small = np.asarray(Image.fromarray(image).resize(size, Image.BILINEAR))
+    return small, scale
+
+
+def scale_boxes(boxes, scale: float, shape) -> list:
+    """Scale (top, right, bottom, left) boxes by `scale`, clipped to `shape`."""
+    h, w = shape[:2]
+    out = []
+    for top, right, bottom, left in boxes:
+        out.append(
+            (
+                max(0, int(round(top * scale))),
+                min(w, int(round(right * scale))),
+                min(h, int(round(bottom * scale))),
+                max(0, int(round(left * scale))),
+            )
+        )
+    return out
+
+
+def _overlaps(a, b) -> bool:
+    return a[3] < b[1] and b[3] < a[1] and a[0] < b[2] and b[0] < a[2]
+
+
+def candidate_regions(boxes, shape, pad: float = 0.5) -> list:
+    """Pad boxes by `pad` x their size, clip to `shape` and merge overlaps."""
+    h, w = shape[:2]
+    regions = []
+    for top, right, bottom, left in boxes:
+        ph = int((bottom - top) * pad)
+        pw = int((right - left) * pad)
+        regions.append(
+            [max(0, top - ph), min(w, right + pw), min(h, bottom + ph), max(0, left - pw)]
+        )
+    merged = True
+    while merged:
+        merged = False
+        for i in range(len(regions)):
+            for j in range(i + 1, len(regions)):
+                a, b = regions[i], regions[j]
+                if _overlaps(a, b):
+                    regions[i] = [
+                        min(a[0], b[0]),
+                        max(a[1], b[1]),
+                        max(a[2], b[2]),
+                        min(a[3], b[3]),
+                    ]
+                    del regions[j]
+                    merged = True
+                    break
+            if merged:
+                break
+    return [tuple(r) for r in regions]
+
+
+def box_iou(a, b) -> float:
+    """Intersection over union of two (top, right, bottom, left) boxes."""
+    ih = min(a[2], b[2]) - max(a[0], b[0])
+    iw = min(a[1], b[1]) - max(a[3], b[3])
+    if ih <= 0 or iw <= 0:
+        return 0.0
+    inter = ih * iw
+    area_a = (a[2] - a[0]) * (a[1] - a[3])
+    area_b = (b[2] - b[0]) * (b[1] - b[3])
+    return inter / float(area_a + area_b - inter)
+
+
+def _dedupe(boxes, iou: float = 0.5) -> list:
+    out = []
+    for box in boxes:
+        if all(box_iou(box, kept) < iou for kept in out):
+            out.append(box)
+    return out
+
+
+def detect_multires(
+    image: np.ndarray,
+    detector,
+    max_side: int = 1024,
+    pad: float = 0.5,
+    prescreen=None,
+) -> list:
+    """Detect faces coarse-to-fine.
+
+    `prescreen` (default: `detector`) runs on the downscaled image to propose
+    candidates; `detector` then re-runs on each padded full-resolution region.
+    A candidate whose region yields nothing keeps its upscaled coarse box, so
+    refinement never loses a face the coarse pass found. Returns boxes in
+    original coordinates.
+    """
+    small, scale = downscale(image, max_side)
+    coarse = (prescreen or detector)(np.ascontiguousarray(small))
+    if not coarse:
+        return []
+    coarse = scale_boxes(coarse, scale, image.shape)
+    if scale == 1.0 and prescreen is None:
+        return _dedupe(coarse)
+    found = []
+    for top, right, bottom, left in candidate_regions(coarse, image.shape, pad=pad):
+        region = np.ascontiguousarray(image[top:bottom, left:right])
+        refined = [
+            (t + top, r + left, b + top, l + left) for t, r, b, l in detector(region)
+        ]
+        if refined:
+            found.extend(refined)
+        else:
+            found.extend(
+                c
+                for c in coarse
+                if top <= c[0] and c[2] <= bottom and left <= c[3] and c[1] <= right
+            )
+    return _dedupe(found)
+
+
+def detect_boxes(
+    image: np.ndarray,
+    detector,
+    mode: str = "full",
+    max_side: int = 1024,
+    pad: float = 0.5,
+    haar=None,
+) -> list:
+    """Run `detector` on `image` using one of :data:`DETECT_MODES`.
+
+    ``full`` runs the detector once at full resolution; ``downscale`` uses the
+    detector itself as coarse pass; ``haar`` uses the `haar` callable as
+    pre-screen (falling back to ``downscale`` when it is None).
+    """
+    if mode == "full":
+        return list(detector(image))
+    if mode == "haar" and haar is not None:
+        return detect_multires(image, detector, max_side=max_side, pad=pad, prescreen=haar)
+    if mode not in DETECT_MODES:
+        logger.warning("Unknown face detection mode %s; using downscale", mode)
+    return detect_multires(image, detector, max_side=max_side, pad=pad)
+
+
+def match_recall(reference, found, iou: float = 0.5) -> tuple:
+    """Return ``(matched, total)`` reference boxes found with IoU >= `iou`."""
+    matched = sum(1 for ref in reference if any(box_iou(ref, f) >= iou for f in found))
+    return matched, len(reference)
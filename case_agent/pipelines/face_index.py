@@ -0,0 +1,399 @@
+"""Vectorized gallery matching engine for face_search.
+
+The gallery is held as one contiguous float32 matrix of L2-normalized
+embeddings with a row -> path/subject index. Probes (one or a batch) are scored
+against it with a single matrix product and the top-k rows are selected with
+``np.argpartition`` instead of a full sort.
+
+Distances are Euclidean distances between unit vectors, i.e.
+``sqrt(2 - 2 * cos_sim)``, so the existing thresholds keep their meaning for
+embeddings that are (close to) unit length.
+"""
+
+import logging
+
+import numpy as np
+
+logger = logging.getLogger("case_agent.face_index")
+
+
+def _as_matrix(embeddings) -> np.ndarray:
+    """Stack one or more embeddings into a 2-D float32 matrix."""
+    mat = np.asarray(embeddings, dtype=np.float32)
+    if mat.ndim == 1:
+        mat = mat[np.newaxis, :]
+    return mat
+
+
+def l2_normalize(matrix: np.ndarray) -> np.ndarray:
+    """Return a float32 copy of `matrix` with every row scaled to unit length.
+
+    Zero rows are left as zeros.
+    """
+    mat = _as_matrix(matrix)
+    norms = np.linalg.norm(mat, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (mat / norms).astype(np.float32, copy=False)
+
+
+def select_top_k(distances: np.ndarray, top_k=None, threshold=None) -> list:
+    """Pick the best rows from a 1-D distance vector.
+
+    Returns a list of ``(row, distance)`` tuples sorted by distance (ties broken
+    by row order). `top_k=None` keeps every row passing `threshold`.
+    """
+    dists = np.asarray(distances)
+    if threshold is not None:
+        candidates = np.flatnonzero(dists <= threshold)
+    else:
+        candidates = np.arange(dists.shape[0])
+    if top_k is not None and 0 <= top_k < candidates.shape[0]:
+        if top_k == 0:
+            return []
+        part = np.argpartition(dists[candidates], top_k - 1)[:top_k]
+        candidates = np.sort(candidates[part])
+    order = np.argsort(dists[candidates], kind="stable")
+    rows = candidates[order]
+    return [(int(r), float(dists[r])) for r in rows]
+
+
+def unit_distances(probes, matrix: np.ndarray) -> np.ndarray:
+    """Euclidean distances between normalized `probes` and rows of `matrix`.
+
+    `matrix` must already be L2-normalized. Returns (n_probes, n_rows).
+    """
+    q = l2_normalize(probes)
+    if matrix.shape[0] == 0:
+        return np.zeros((q.shape[0], 0), dtype=np.float32)
+    if q.shape[1] != matrix.shape[1]:
+        raise ValueError(
+            "probe embedding dimension %d does not match gallery dimension %d"
+            % (q.shape[1], matrix.shape[1])
+        )
+    sims = q @ matrix.T
+    return np.sqrt(np.clip(2.0 - 2.0 * sims, 0.0, None))
+
+
+def farthest_point_sample(matrix: np.ndarray, k: int):
+    """Pick up to `k` diverse rows of an L2-normalized matrix.
+
+    Starts from the row closest to the mean direction and repeatedly adds the
+    row farthest from every row chosen so far. Returns ``(rows, radius)``:
+    every row of `matrix` is within `radius` of one of the chosen rows.
+    """
+    n = matrix.shape[0]
+    if n == 0 or k <= 0:
+        return np.zeros(0, dtype=np.intp), 0.0
+    chosen = [int(np.argmax(matrix @ matrix.mean(axis=0)))]
+    nearest = unit_distances(matrix[chosen[0]], matrix)[0]
+    while len(chosen) < min(k, n):
+        row = int(np.argmax(nearest))
+        if nearest[row] <= 0.0:
+            break
+        chosen.append(row)
+        nearest = np.minimum(nearest, unit_distances(matrix[row], matrix)[0])
+    return np.asarray(chosen, dtype=np.intp), float(nearest.max())
+
+
+def find_outliers(matrix: np.ndarray, min_distance: float, min_rows: int = 4) -> np.ndarray:
+    """Rows unusually far from the mean direction of an L2-normalized matrix.
+
+    A row is an outlier when its distance exceeds both `min_distance` and the
+    median distance plus three robust standard deviations (1.4826 * MAD).
+    Sets with fewer than `min_rows` rows have no outliers.
+    """
+    if matrix.shape[0] < min_rows:
+        return np.zeros(0, dtype=np.intp)
+    dists = unit_distances(matrix.mean(axis=0), matrix)[0]
+    median = float(np.median(dists))
+    mad = float(np.median(np.abs(dists - median)))
+    return np.flatnonzero(dists > max(min_distance, median + 3.0 * 1.4826 * mad))
+
+
+class EmbeddingSpaceError(ValueError):
+    """A probe and a gallery come from different embedding models."""
+
+
+class GalleryIndex:
+    """In-memory matrix of L2-normalized gallery embeddings.
+
+    Parameters
+    ----------
+    matrix : array-like, shape (n, dim)
+        Gallery embeddings, one per row.
+    paths : list[str]
+        Gallery image path for each row.
+    subjects : list[str] | None
+        Subject label for each row (labeled galleries). Rows of the same subject
+        must be contiguous when `subjects` is given.
+    normalized : bool
+        Set when `matrix` is already L2-normalized float32 so it is used as-is
+        (no copy).
+    model : str | None
+        Tag of the embedding model that produced the rows (see
+        :meth:`check_space`).
+
+    When an ANN index is attached (``index.ann``), top-k searches use it to
+    pick candidates unless ``exact=True`` is passed.
+    """
+
+    def __init__(self, matrix, paths, subjects=None, normalized=False, model=None):
+        if normalized:
+            self.matrix = np.asarray(matrix, dtype=np.float32)
+        else:
+            self.matrix = l2_normalize(matrix)
+        if self.matrix.ndim != 2:
+            self.matrix = self.matrix.reshape(len(paths), -1)
+        self.paths = list(paths)
+        self.subjects = list(subjects) if subjects is not None else None
+        self.model = model
+        if self.matrix.shape[0] != len(self.paths):
+            raise ValueError(
+                "gallery matrix has %d rows but %d paths"
+                % (self.matrix.shape[0], len(self.paths))
+            )
+        self._subject_slices = None
+        # Optional approximate index (see face_ann) used for top-k queries
+        self.ann = None
+        self.ann_effort = 8
+
+    @classmethod
+    def from_store(cls, store) -> "GalleryIndex":
+        """Wrap an EmbeddingStore without copying its (memory-mapped) matrix."""
+        return cls(
+            store.matrix,
+            store.paths,
+            subjects=store.subjects,
+            normalized=True,
+            model=store.model,
+        )
+
+    @classmethod
+    def from_embeddings(cls, embeddings: dict) -> "GalleryIndex":
+        """Build an index from an unlabeled gallery dict {path: embedding}.
+
+        An EmbeddingStore is wrapped directly (see :meth:`from_store`).
+        """
+        from .embedding_store import EmbeddingStore
+
+        if isinstance(embeddings, EmbeddingStore):
+            return cls.from_store(embeddings)
+        paths = []
+        rows = []
+        for path, emb in embeddings.items():
+            if emb is None:
+                continue
+            paths.append(path)
+            rows.append(np.asarray(emb, dtype=np.float32))
+        if not rows:
+            return cls(np.zeros((0, 0), dtype=np.float32), [], normalized=True)
+        return cls(np.stack(rows), paths)
+
+    @classmethod
+    def from_labeled(cls, labeled: dict) -> "GalleryIndex":
+        """Build an index from a labeled gallery dict {subject: [{path, embedding}]}."""
+        paths = []
+        subjects = []
+        rows = []
+        for subject, items in labeled.items():
+            for item in items:
+                emb = item.get("embedding")
+                if emb is None:
+                    continue
+                paths.append(item.get("path"))
+                subjects.append(subject)
+                rows.append(np.asarray(emb, dtype=np.float32))
+        if not rows:
+            return cls(
+                np.zeros((0, 0), dtype=np.float32), [], subjects=[], normalized=True
+            )
+        return cls(np.stack(rows), paths, subjects=subjects)
+
+    def __len__(self):
+        return self.matrix.shape[0]
+
+    @property
+    def dim(self) -> int:
+        return int(self.matrix.shape[1]) if self.matrix.ndim == 2 else 0
+
+    def subject_slices(self) -> dict:
+        """Return {subject: slice} giving the contiguous rows of each subject."""
+        if self._subject_slices is None:
+            slices = {}
+            if self.subjects:
+                start = 0
+                for i in range(1, len(self.subjects) + 1):
+                    if i == len(self.subjects) or self.subjects[i] != self.subjects[start]:
+                        slices[self.subjects[start]] = slice(start, i)
+                        start = i
+            self._subject_slices = slices
+        return self._subject_slices
+
+    def subject_prototypes(self) -> "GalleryIndex":
+        """Return an index with one L2-normalized mean embedding per subject.
+
+        Rows of the returned index carry the subject name as both path and
+        subject, in the same order as :meth:`subject_slices`.
+        """
+        slices = self.subject_slices()
+        names = list(slices.keys())
+        if not names:
+            return GalleryIndex(
+                np.zeros((0, self.dim), dtype=np.float32),
+                [],
+                subjects=[],
+                normalized=True,
+                model=self.model,
+            )
+        starts = np.array([slices[n].start for n in names])
+        counts = np.array([slices[n].stop - slices[n].start for n in names])
+        sums = np.add.reduceat(self.matrix, starts, axis=0)
+        means = sums / counts[:, np.newaxis]
+        return GalleryIndex(means, names, subjects=names, model=self.model)
+
+    def compact(self, per_subject: int = 8, outlier_distance: float | None = None) -> "CompactGallery":
+        """Reduce each subject to a few diverse prototype rows.
+
+        Prototypes are chosen by farthest-point sampling over the subject's
+        inlier rows. With `outlier_distance`, rows far from the rest of their
+        subject (probably another person) are flagged; they are kept as extra
+        prototypes so shortlisting stays exact.
+        """
+        rows, starts, names, radius, outliers = [], [], [], [], {}
+        for subject, sl in self.subject_slices().items():
+            members = np.arange(sl.start, sl.stop)
+            bad = np.zeros(0, dtype=np.intp)
+            if outlier_distance is not None:
+                bad = find_outliers(self.matrix[members], outlier_distance)
+            inliers = np.delete(members, bad)
+            picked, r = farthest_point_sample(self.matrix[inliers], per_subject)
+            if bad.size:
+                outliers[subject] = [self.paths[i] for i in members[bad]]
+            starts.append(len(rows))
+            names.append(subject)
+            radius.append(r)
+            rows.extend(inliers[picked].tolist() + members[bad].tolist())
+        return CompactGallery(self, np.asarray(rows, dtype=np.intp), starts, names, radius, outliers)
+
+    def check_space(self, dim: int, model: str | None = None):
+        """Refuse probes from a different embedding space than the gallery.
+
+        Raises :class:`EmbeddingSpaceError` when `dim` differs from the
+        gallery dimension, or when both `model` and the gallery model are known
+        and differ. Distances across spaces are meaningless, so this is never
+        silently truncated or padded.
+        """
+        if len(self) == 0:
+            return
+        if model and self.model and model != self.model:
+            raise EmbeddingSpaceError(
+                "probe embedding from model %r cannot be matched against a %r gallery"
+                % (model, self.model)
+            )
+        if dim != self.dim:
+            raise EmbeddingSpaceError(
+                "probe embedding dimension %d does not match %s gallery dimension %d"
+                % (dim, self.model or "untagged", self.dim)
+            )
+
+    def distances(self, probes) -> np.ndarray:
+        """Euclidean distances between normalized probes and every gallery row.
+
+        Returns an array of shape (n_probes, n_rows).
+        """
+        return unit_distances(probes, self.matrix)
+
+    def search(
+        self, probe, top_k=None, threshold=None, rows=None, exact=False
+    ) -> list:
+        """Score a single probe and return ``(row, distance)`` pairs.
+
+        `rows` optionally restricts scoring to a slice of the gallery (e.g. one
+        subject); returned row numbers are always absolute.
+        """
+        if rows is not None:
+            sub = GalleryIndex(self.matrix[rows], self.paths[rows], normalized=True)
+            offset = rows.start or 0
+            return [
+                (r + offset, d)
+                for r, d in sub.search(probe, top_k=top_k, threshold=threshold)
+            ]
+        return self.search_batch(
+            _as_matrix(probe), top_k=top_k, threshold=threshold, exact=exact
+        )[0]
+
+    def search_batch(self, probes, top_k=None, threshold=None, exact=False) -> list:
+        """Score a batch of probes with one matrix product.
+
+        Returns one ``[(row, distance), ...]`` list per probe.
+        """
+        if len(probes) == 0:
+            return []
+        self.check_space(_as_matrix(probes).shape[1])
+        if self.ann is not None and top_k and not exact:
+            hits = self.ann.query(probes, top_k, effort=self.ann_effort)
+            if threshold is None:
+                return hits
+            return [[(r, d) for r, d in row if d <= threshold] for row in hits]
+        dists = self.distances(probes)
+        return [
+            select_top_k(row, top_k=top_k, threshold=threshold) for row in dists
+        ]
+
+
+class CompactGallery:
+    """Per-subject prototype rows of a labeled :class:`GalleryIndex`.
+
+    Attributes
+    ----------
+    index : GalleryIndex
+        Prototype rows (a few per subject, contiguous per subject).
+    rows : np.ndarray
+        Gallery row of each prototype.
+    radius : np.ndarray
+        Per subject, the largest distance from an inlier member to its nearest
+        prototype.
+    outliers : dict
+        {subject: [path, ...]} of flagged gallery images.
+
+    By the triangle inequality a subject whose nearest prototype is farther
+    than ``threshold + radius`` from a probe has no member within
+    `threshold`, so :meth:`shortlist` only drops subjects that cannot match
+    and scoring cost depends on the number of subjects, not on their photos.
+    """
+
+    def __init__(self, gallery: GalleryIndex, rows, starts, subjects, radius, outliers):
+        self.gallery = gallery
+        self.rows = rows
+        self.subjects = list(subjects)
+        self.starts = np.asarray(starts, dtype=np.intp)
+        self.radius = np.asarray(radius, dtype=np.float32)
+        self.outliers = outliers
+        self.index = GalleryIndex(
+            gallery.matrix[rows] if len(rows) else np.zeros((0, gallery.dim), dtype=np.float32),
+            [gallery.paths[r] for r in rows],
+            subjects=[gallery.subjects[r] for r in rows],
+            normalized=True,
+            model=gallery.model,
+        )
+
+    def __len__(self):
+        return len(self.index)
+
+    def subject_distances(self, probe) -> np.ndarray:
+        """Distance from `probe` to the nearest prototype of each subject."""
+        if not self.subjects:
+            return np.zeros(0, dtype=np.float32)
+        return np.minimum.reduceat(self.index.distances(probe)[0], self.starts)
+
+    def shortlist(self, probe, threshold=None) -> list:
+        """Subjects that may have a member within `threshold` of `probe`.
+
+        Returns ``(subject, prototype distance)`` pairs, nearest first.
+        """
+        best = self.subject_distances(probe)
+        keep = np.arange(best.shape[0])
+        if threshold is not None:
+            keep = np.flatnonzero(best <= threshold + self.radius + 1e-6)
+        keep = keep[np.argsort(best[keep], kind="stable")]
+        return [(self.subjects[i], float(best[i])) for i in keep]
@@ -0,0 +1,211 @@
+"""Parallel face matching over many crops or evidence images.
+
+Matching a directory of crops one at a time keeps a single core busy. The
+drivers here fan the work out to a process pool:
+
+- the gallery store is brought up to date once in the parent, so workers only
+  open it (the memory-mapped matrix is shared through the OS page cache);
+- each worker's initializer applies the parent's config, sets torch threads to
+  its share of the cores and loads the embedding model and gallery index once;
+- inputs are sent in chunks and a bounded number of chunks is in flight;
+- results stream back in completion order and only the calling process writes
+  to the database (:func:`persist_results`), so SQLite never sees concurrent
+  writers.
+
+With ``workers=1`` everything runs inline in the calling process.
+"""
+
+import logging
+import os
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from pathlib import Path
+
+from .. import config
+
+logger = logging.getLogger("case_agent.face_parallel")
+
+# Per-process state set by _init_worker (or _configure for inline runs)
+_worker = {}
+
+
+def default_workers() -> int:
+    return int(config.FACE_SCAN_WORKERS or os.cpu_count() or 1)
+
+
+def _config_snapshot() -> dict:
+    return {k: getattr(config, k) for k in dir(config) if k.isupper()}
+
+
+def _configure(gallery_dir, labeled, threshold, top_k, crops_dir):
+    from . import face_search
+
+    _worker.update(
+        gallery_dir=Path(gallery_dir),
+        labeled=labeled,
+        threshold=threshold,
+        top_k=top_k,
+        crops_dir=Path(crops_dir) if crops_dir is not None else None,
+    )
+    face_search.load_gallery(_worker["gallery_dir"], labeled=labeled)
+    if face_search._embedding_model_tag() == face_search.FACENET_MODEL:
+        face_search._ensure_facenet_model()
+
+
+def _init_worker(settings, torch_threads, gallery_dir, labeled, threshold, top_k, crops_dir):
+    """Pool initializer: load config, models and the gallery once per worker."""
+    from . import face_search
+
+    for key, value in settings.items():
+        setattr(config, key, value)
+    face_search.set_torch_threads(torch_threads)
+    _configure(gallery_dir, labeled, threshold, top_k, crops_dir)
+
+
+def _match_chunk(paths: list) -> list:
+    """Match face crops against the worker's gallery; one result per crop."""
+    from . import face_search
+
+    gallery_dir = _worker["gallery_dir"]
+    opts = {"threshold": _worker["threshold"], "top_k": _worker["top_k"]}
+    if _worker["labeled"]:
+        try:
+            return face_search.search_labeled_gallery_for_images(paths, gallery_dir, **opts)
+        except Exception:
+            logger.exception("Batch match failed; retrying %d crops one by one", len(paths))
+    out = []
+    for path in paths:
+        try:
+            if _worker["labeled"]:
+                out.append(face_search.search_labeled_gallery_for_image(path, gallery_dir, **opts))
+            else:
+                out.append(face_search.search_gallery_for_image(path, gallery_dir, **opts))
+        except Exception:
+            logger.exception("Failed to match %s", path)
+    return out
+
+
+def _scan_chunk(paths: list) -> list:
+    """Detect, embed and match every face in evidence images (labeled gallery).
+
+    Returns one labeled result per face, with the face's crop (written to the
+    worker's crops dir) as its source.
+    """
+    from . import face_search
+
+    gallery_dir = _worker["gallery_dir"]
+    opts = {"threshold": _worker["threshold"], "top_k": _worker["top_k"]}
+    out = []
+    for path in paths:
+        try:
+            faces = face_search.detect_and_embed(
+                path, crops_dir=_worker["crops_dir"], crop_stem=f"img_{Path(path).stem}"
+            )
+            for face in faces:
+                out.append(
+                    face_search.match_labeled_embedding(
+                        face["embedding"],
+                        gallery_dir,
+                        source=face["crop"] or str(path),
+                        model=face.get("model"),
+                        **opts,
+                    )
+                )
+        except Exception:
+            logger.exception("Face scan failed for %s", path)
+    # Crops must exist before the results naming them are returned
+    face_search.flush_crop_writes()
+    return out
+
+
+def _run(task, items, gallery_dir, labeled, threshold, top_k, workers, chunk_size,
+         crops_dir=None):
+    from . import face_search
+
+    items = [str(p) for p in items]
+    if not items:
+        return
+    workers = max(1, min(workers or default_workers(), len(items)))
+    chunk_size = chunk_size or config.FACE_SCAN_CHUNK_SIZE
+    chunks = [items[i : i + chunk_size] for i in range(0, len(items), chunk_size)]
+    # Refresh the gallery store once here so workers never race to rewrite it
+    face_search.load_gallery(Path(gallery_dir), labeled=labeled)
+    if workers == 1:
+        _configure(gallery_dir, labeled, threshold, top_k, crops_dir)
+        for chunk in chunks:
+            yield from task(chunk)
+        return
+    torch_threads = config.TORCH_NUM_THREADS or max(1, (os.cpu_count() or 1) // workers)
+    initargs = (
+        _config_snapshot(),
+        torch_threads,
+        str(gallery_dir),
+        labeled,
+        threshold,
+        top_k,
+        str(crops_dir) if crops_dir is not None else None,
+    )
+    logger.info(
+        "Matching %d inputs in %d chunks on %d workers", len(items), len(chunks), workers
+    )
+    with ProcessPoolExecutor(
+        max_workers=workers, initializer=_init_worker, initargs=initargs
+    ) as pool:
+        pending = set()
+        queue = iter(chunks)
+        while True:
+            # Keep two chunks per worker in flight to bound memory
+            for chunk in queue:
+                pending.add(pool.submit(task, chunk))
+                if len(pending) >= 2 * workers:
+                    break
+            if not pending:
+                break
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    yield from future.result()
+                except Exception:
+                    logger.exception("Face matching chunk failed")
+
+
+def match_crops(crops, gallery_dir: Path, labeled: bool = True, threshold: float = 0.6,
+                top_k: int = 5, workers: int | None = None, chunk_size: int | None = None):
+    """Yield one gallery search result per face crop, in completion order.
+
+    Labeled galleries give :func:`face_search.search_labeled_gallery_for_image`
+    results, unlabeled ones :func:`face_search.search_gallery_for_image`
+    results. `workers` defaults to ``config.FACE_SCAN_WORKERS`` (all cores).
+    """
+    yield from _run(_match_chunk, crops, gallery_dir, labeled, threshold, top_k, workers,
+                    chunk_size)
+
+
+def scan_images(images, gallery_dir: Path, crops_dir: Path, threshold: float = 0.6,
+                top_k: int = 5, workers: int | None = None, chunk_size: int | None = None):
+    """Detect faces in evidence images and yield one labeled result per face.
+
+    Face crops are written to `crops_dir` as ``img_<stem>_f<n>.jpg`` and each
+    result's source is its crop path.
+    """
+    yield from _run(_scan_chunk, images, gallery_dir, True, threshold, top_k, workers,
+                    chunk_size, crops_dir=crops_dir)
+
+
+def persist_results(results, db_path=None, aggregate: bool = False) -> dict:
+    """Write streamed results to the DB from this (single) process.
+
+    Returns {'results', 'persisted', 'failed'}.
+    """
+    from . import face_search
+
+    db_path = db_path if db_path is not None else config.DEFAULT_DB_PATH
+    counts = {"results": 0, "persisted": 0, "failed": 0}
+    for res in results:
+        counts["results"] += 1
+        try:
+            face_search._persist_results(db_path, res, aggregate=aggregate)
+            counts["persisted"] += 1
+        except Exception:
+            counts["failed"] += 1
+            logger.exception("Failed to persist matches for %s", res.get("source"))
+    return counts
@@ -0,0 +1,148 @@
+"""Stored probe face embeddings (``FaceEmbedding`` rows).
+
+Detection and embedding are the expensive part of a face scan. Each detected
+face is stored once per evidence file with its vector (L2-normalized float32
+bytes), model tag, bbox, page/timestamp and crop path, so re-matching after a
+gallery change or threshold retune runs from stored vectors instead of
+re-rendering, re-detecting and re-embedding.
+
+Each scan is recorded in the file's ``EvidenceFile.file_metadata['face_scan']``
+with the sha256 the faces were detected in, so a file that had no faces is
+not scanned again, and faces of a file whose content has since changed (the
+inventory updates the row's sha256 in place) are dropped and re-detected.
+"""
+
+import datetime
+import logging
+from pathlib import Path
+
+import numpy as np
+
+from ..db.init_db import get_session, init_db
+from ..db.models import EvidenceFile, FaceEmbedding
+from .face_index import l2_normalize
+
+logger = logging.getLogger("case_agent.face_probes")
+
+
+def encode_vector(embedding) -> bytes:
+    """L2-normalize an embedding and return it as little-endian float32 bytes."""
+    return l2_normalize(embedding)[0].astype("<f4").tobytes()
+
+
+def decode_vector(blob: bytes) -> np.ndarray:
+    return np.frombuffer(blob, dtype="<f4").astype(np.float32)
+
+
+def _session(db_path):
+    init_db(db_path) if db_path is not None else init_db()
+    return get_session()
+
+
+def save_faces(
+    source: Path,
+    faces: list,
+    model: str,
+    db_path=None,
+    page: int | None = None,
+    timestamp: float | None = None,
+) -> int:
+    """Store the faces detected in evidence file `source`, replacing earlier rows.
+
+    `faces` are dicts with 'bbox' and 'embedding' and optionally 'crop',
+    'duplicate_of', 'page' and 'timestamp' (overriding the call-level values). Faces without
+    an embedding are skipped. Returns the number of rows written.
+    """
+    session = _session(db_path)
+    source = str(source)
+    file_row = session.query(EvidenceFile).filter_by(path=source).first()
+    session.query(FaceEmbedding).filter_by(source=source, model=model).delete()
+    now = datetime.datetime.now(datetime.timezone.utc)
+    count = 0
+    for face in faces:
+        emb = face.get("embedding")
+        if emb is None:
+            continue
+        session.add(
+            FaceEmbedding(
+                file_id=file_row.id if file_row is not None else None,
+                source=source,
+                page=face.get("page", page),
+                timestamp=face.get("timestamp", timestamp),
+                bbox=face.get("bbox"),
+                crop_path=face.get("crop"),
+                duplicate_of=face.get("duplicate_of"),
+                model=model,
+                dim=int(np.asarray(emb).shape[-1]),
+                vector=encode_vector(emb),
+                created_at=now,
+            )
+        )
+        count += 1
+    if file_row is not None:
+        # Reassign so SQLAlchemy notices the JSON change
+        meta = dict(file_row.file_metadata or {})
+        scanned = dict((meta.get("face_scan") or {}).get("sha256_by_model") or {})
+        scanned[model] = file_row.sha256
+        meta["face_scan"] = {"model": model, "faces": count, "sha256_by_model": scanned}
+        file_row.file_metadata = meta
+    session.commit()
+    logger.info("Stored %d face embeddings (%s) for %s", count, model, source)
+    return count
+
+
+def _scanned_sha256(scan: dict | None, model: str) -> str | None:
+    """sha256 of the content `model` faces were stored for (None if unknown)."""
+    return ((scan or {}).get("sha256_by_model") or {}).get(model)
+
+
+def load_faces(source: Path, model: str, db_path=None) -> list | None:
+    """Return stored faces of `source` for `model`, or None if never scanned.
+
+    Faces are dicts with 'bbox', 'embedding' (float32), 'crop', 'page' and
+    'timestamp' (plus 'duplicate_of' for duplicate crops), ordered by page,
+    timestamp and insertion. Faces stored for
+    content other than the file's current sha256 are deleted and None is
+    returned, so the caller scans the file again.
+    """
+    session = _session(db_path)
+    source = str(source)
+    file_row = session.query(EvidenceFile).filter_by(path=source).first()
+    scan = (file_row.file_metadata or {}).get("face_scan") if file_row else None
+    if file_row is not None and file_row.sha256 and _scanned_sha256(scan, model) != file_row.sha256:
+        deleted = session.query(FaceEmbedding).filter_by(source=source, model=model).delete()
+        session.commit()
+        if deleted:
+            logger.info("Dropped %d stale face embeddings (%s) of changed file %s", deleted, model, source)
+        return None
+    rows = (
+        session.query(FaceEmbedding)
+        .filter_by(source=source, model=model)
+        .order_by(FaceEmbedding.page, FaceEmbedding.timestamp, FaceEmbedding.id)
+        .all()
+    )
+    if not rows and _scanned_sha256(scan, model) is None:
+        return None
+    faces = []
+    for r in rows:
+        face = {
+            "bbox": r.bbox,
+            "embedding": decode_vector(r.vector),
+            "crop": r.crop_path,
+            "page": r.page,
+            "timestamp": r.timestamp,
+        }
+        if r.duplicate_of:
+            face["duplicate_of"] = r.duplicate_of
+        faces.append(face)
+    return faces
+
+
+def faces_to_frames(faces: list) -> list:
+    """Group stored video faces into ``find_faces_in_video`` frame dicts."""
+    frames = {}
+    for face in faces:
+        frames.setdefault(face.get("timestamp"), []).append(
+            {"bbox": face.get("bbox"), "embedding": face.get("embedding")}
+        )
+    return [{"timestamp": ts, "detections": dets} for ts, dets in sorted(frames.items())]
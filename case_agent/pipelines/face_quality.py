@@ -0,0 +1,183 @@
+"""Cheap quality scores for detected faces, computed before embedding.
+
+Haar detections in particular include many tiny false positives and heavily
+compressed or blurred crops. Each one would otherwise be embedded, searched
+against the gallery and reported as an unidentified face. :class:`QualityFilter`
+scores the detected region on
+
+- size: the shorter side of the box in pixels;
+- sharpness: variance of the 4-neighbour Laplacian of the grayscale crop
+  (sampled down to at most ``_SHARPNESS_SIDE`` pixels so scores are comparable
+  across crop sizes);
+- exposure: mean brightness of the crop (0-255);
+- pose: horizontal offset of the nose tip from the eye midpoint relative to
+  the eye distance (0 = frontal), when landmarks are available;
+
+and drops faces below the configured cutoffs, counting the rejections per
+reason so a run can report how many embeddings were skipped.
+"""
+
+import threading
+
+import numpy as np
+
+from .. import config
+
+_SHARPNESS_SIDE = 128
+
+REJECT_REASONS = ("size", "blur", "exposure", "pose")
+
+
+def _gray(crop) -> np.ndarray:
+    """Channel mean of an RGB/BGR crop as float32 (channel order agnostic)."""
+    crop = np.asarray(crop)
+    gray = crop.mean(axis=2) if crop.ndim == 3 else crop
+    return gray.astype(np.float32, copy=False)
+
+
+def laplacian_variance(gray: np.ndarray) -> float:
+    """Variance of the 4-neighbour Laplacian (higher = sharper)."""
+    step = max(1, int(np.ceil(max(gray.shape) / float(_SHARPNESS_SIDE))))
+    g = gray[::step, ::step]
+    if min(g.shape) < 3:
+        return 0.0
+    lap = (
+        g[1:-1, :-2] + g[1:-1, 2:] + g[:-2, 1:-1] + g[2:, 1:-1] - 4.0 * g[1:-1, 1:-1]
+    )
+    return float(lap.var())
+
+
+def _centroid(points):
+    pts = np.asarray(points, dtype=np.float32).reshape(-1, 2)
+    return pts.mean(axis=0)
+
+
+def landmark_yaw(landmarks: dict) -> float | None:
+    """Estimate yaw from face_recognition landmarks (0 = frontal, ~0.5 = 45 deg).
+
+    Works with both the ``small`` (5-point) and ``large`` (68-point) models.
+    Returns None when the eyes or nose tip are missing.
+    """
+    try:
+        left = _centroid(landmarks["left_eye"])
+        right = _centroid(landmarks["right_eye"])
+        nose = _centroid(landmarks["nose_tip"])
+    except (KeyError, TypeError, ValueError):
+        return None
+    eye_dist = float(np.linalg.norm(right - left))
+    if eye_dist < 1e-6:
+        return None
+    mid = (left + right) / 2.0
+    return abs(float(nose[0] - mid[0])) / eye_dist
+
+
+def score_face(image, box, landmarks: dict | None = None) -> dict:
+    """Score the `box` (top, right, bottom, left) region of `image`.
+
+    Returns {'size', 'sharpness', 'brightness', 'yaw'}; 'yaw' is None
+    without landmarks.
+    """
+    top, right, bottom, left = (int(v) for v in box)
+    gray = _gray(np.asarray(image)[max(0, top) : bottom, max(0, left) : right])
+    empty = gray.size == 0
+    return {
+        "size": max(0, min(bottom - top, right - left)),
+        "sharpness": 0.0 if empty else laplacian_variance(gray),
+        "brightness": 0.0 if empty else float(gray.mean()),
+        "yaw": landmark_yaw(landmarks) if landmarks else None,
+    }
+
+
+class QualityFilter:
+    """Reject low-value face detections before embedding and count them.
+
+    A cutoff of None (or 0) disables that check. The size check runs first and
+    needs no pixel access.
+    """
+
+    def __init__(
+        self,
+        min_size: int | None = 40,
+        min_sharpness: float | None = 15.0,
+        min_brightness: float | None = 25.0,
+        max_brightness: float | None = 235.0,
+        max_yaw: float | None = 0.5,
+    ):
+        self.min_size = min_size
+        self.min_sharpness = min_sharpness
+        self.min_brightness = min_brightness
+        self.max_brightness = max_brightness
+        self.max_yaw = max_yaw
+        self.checked = 0
+        self.passed = 0
+        self.rejected = dict.fromkeys(REJECT_REASONS, 0)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls) -> "QualityFilter":
+        return cls(
+            min_size=config.FACE_QUALITY_MIN_SIZE,
+            min_sharpness=config.FACE_QUALITY_MIN_SHARPNESS,
+            min_brightness=config.FACE_QUALITY_MIN_BRIGHTNESS,
+            max_brightness=config.FACE_QUALITY_MAX_BRIGHTNESS,
+            max_yaw=config.FACE_QUALITY_MAX_YAW,
+        )
+
+    def reject_reason(self, image, box, landmarks: dict | None = None) -> str | None:
+        """Return why the face should be skipped, or None to keep it."""
+        top, right, bottom, left = box
+        if self.min_size and min(bottom - top, right - left) < self.min_size:
+            return "size"
+        scores = score_face(image, box, landmarks)
+        if self.min_sharpness and scores["sharpness"] < self.min_sharpness:
+            return "blur"
+        if (self.min_brightness and scores["brightness"] < self.min_brightness) or (
+            self.max_brightness and scores["brightness"] > self.max_brightness
+        ):
+            return "exposure"
+        if self.max_yaw and scores["yaw"] is not None and scores["yaw"] > self.max_yaw:
+            return "pose"
+        return None
+
+    def check(self, image, box, landmarks: dict | None = None) -> bool:
+        """True when the face is worth embedding; updates the counters."""
+        reason = self.reject_reason(image, box, landmarks)
+        with self._lock:
+            self.checked += 1
+            if reason is None:
+                self.passed += 1
+            else:
+                self.rejected[reason] += 1
+        return reason is None
+
+    def add_stats(self, stats: dict):
+        """Fold counters from another filter (e.g. a worker process) into this one."""
+        with self._lock:
+            self.checked += stats.get("checked", 0)
+            self.passed += stats.get("passed", 0)
+            for reason in REJECT_REASONS:
+                self.rejected[reason] += stats.get(f"rejected_{reason}", 0)
+
+    def stats(self) -> dict:
+        """Counters; 'embeddings_saved' is the number of rejected faces."""
+        with self._lock:
+            out = {"checked": self.checked, "passed": self.passed}
+            out.update({f"rejected_{r}": n for r, n in self.rejected.items()})
+            out["embeddings_saved"] = sum(self.rejected.values())
+        return out
+
+
+_shared_filter = None
+_shared_lock = threading.Lock()
+
+
+def shared_filter() -> QualityFilter | None:
+    """Process-wide filter built from config, or None when
+    ``config.FACE_QUALITY_FILTER`` is off."""
+    global _shared_filter
+    if not config.FACE_QUALITY_FILTER:
+        return None
+    with _shared_lock:
+        if _shared_filter is None:
+            _shared_filter = QualityFilter.from_config()
+        return _shared_filter
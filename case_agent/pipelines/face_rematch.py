@@ -0,0 +1,295 @@
+"""Re-match stored probe embeddings against gallery changes only.
+
+After a subject is added to or fixed in the labeled gallery, re-running the
+whole pipeline (or ``scripts/persist_all_face_matches.py`` over every crop)
+re-embeds every probe. This job instead:
+
+1. exports the stored ``FaceEmbedding`` vectors of one model into a
+   memory-mapped matrix (rebuilt only when the table changes);
+2. compares per-subject signatures of the gallery (member paths + sha256)
+   with those recorded by the previous run, and scores all probes only
+   against added/changed subjects, and probes added since the last run
+   against every subject, in vectorized blocks;
+3. diffs the result against ``face_matches`` and inserts, updates or deletes
+   only the rows that changed (one row per probe source and subject).
+
+Video faces (rows with a timestamp) are matched per track by
+``face_search.search_video_tracks`` and are not handled here.
+"""
+
+import datetime
+import hashlib
+import json
+import logging
+from pathlib import Path
+
+import numpy as np
+
+from .. import config
+from ..db.init_db import get_session, init_db
+from ..db.models import FaceEmbedding, FaceMatch
+from .face_index import EmbeddingSpaceError, GalleryIndex, unit_distances
+from .face_probes import decode_vector
+
+logger = logging.getLogger("case_agent.face_rematch")
+
+# Upper bound on the elements of one probe-block x gallery-rows distance matrix
+_BLOCK_ELEMENTS = 1 << 25
+
+
+def _cache_dir(db_path) -> Path:
+    return Path(db_path or config.DEFAULT_DB_PATH).parent / ".face_probes"
+
+
+def _probe_query(session, model):
+    return session.query(FaceEmbedding).filter(
+        FaceEmbedding.model == model, FaceEmbedding.timestamp.is_(None)
+    )
+
+
+def load_probe_matrix(db_path, model: str):
+    """Return ``(matrix, ids, keys)`` for all stored still-image probes of `model`.
+
+    `matrix` is a memory-mapped (n, dim) float32 array ordered by row id,
+    `ids` the FaceEmbedding ids and `keys` the FaceMatch source of each probe
+    (crop path, else evidence path). The export is reused until the table
+    changes.
+    """
+    from sqlalchemy import func
+
+    init_db(db_path) if db_path is not None else init_db()
+    session = get_session()
+    count, max_id = session.query(
+        func.count(FaceEmbedding.id), func.max(FaceEmbedding.id)
+    ).filter(FaceEmbedding.model == model, FaceEmbedding.timestamp.is_(None)).one()
+    cache = _cache_dir(db_path)
+    tag = model.replace("/", "_")
+    meta_path = cache / f"probes-{tag}.json"
+    npy_path = cache / f"probes-{tag}.npy"
+    try:
+        meta = json.loads(meta_path.read_text(encoding="utf-8"))
+    except Exception:
+        meta = None
+    if meta and meta.get("count") == count and meta.get("max_id") == max_id and count:
+        matrix = np.load(npy_path, mmap_mode="r")
+        if matrix.shape[0] == count:
+            return matrix, np.asarray(meta["ids"], dtype=np.int64), meta["keys"]
+    if not count:
+        return np.zeros((0, 0), dtype=np.float32), np.zeros(0, dtype=np.int64), []
+    dim = session.query(FaceEmbedding.dim).filter(
+        FaceEmbedding.model == model, FaceEmbedding.timestamp.is_(None)
+    ).first()[0]
+    cache.mkdir(parents=True, exist_ok=True)
+    tmp_path = npy_path.with_name(npy_path.name + ".tmp")
+    out = np.lib.format.open_memmap(tmp_path, mode="w+", dtype=np.float32, shape=(count, dim))
+    ids = []
+    keys = []
+    rows = (
+        _probe_query(session, model)
+        .with_entities(
+            FaceEmbedding.id, FaceEmbedding.vector, FaceEmbedding.crop_path, FaceEmbedding.source
+        )
+        .order_by(FaceEmbedding.id)
+        .yield_per(10000)
+    )
+    for i, (row_id, blob, crop, source) in enumerate(rows):
+        out[i] = decode_vector(blob)
+        ids.append(row_id)
+        keys.append(crop or source)
+    out.flush()
+    del out
+    tmp_path.replace(npy_path)
+    meta_path.write_text(
+        json.dumps({"count": count, "max_id": max_id, "ids": ids, "keys": keys}),
+        encoding="utf-8",
+    )
+    logger.info("Exported %d %s probe embeddings to %s", count, model, npy_path)
+    return np.load(npy_path, mmap_mode="r"), np.asarray(ids, dtype=np.int64), keys
+
+
+def subject_signatures(store) -> dict:
+    """Return {subject: sha256 of its member (path, file sha256) pairs}."""
+    members = {}
+    for path, subject in zip(store.paths, store.subjects or []):
+        fp = store.fingerprints.get(path) or [None, None, None]
+        members.setdefault(subject, []).append(f"{path}\0{fp[2]}")
+    return {
+        s: hashlib.sha256("\n".join(sorted(items)).encode("utf-8")).hexdigest()
+        for s, items in members.items()
+    }
+
+
+def best_subject_matches(probes, index: GalleryIndex, subjects: list, threshold: float,
+                         block_size: int = 65536) -> dict:
+    """Score `probes` against the rows of `subjects` in vectorized blocks.
+
+    Returns {(probe_row, subject): (distance, gallery_path)} for every pair
+    whose best (image-level) distance is within `threshold`.
+    """
+    slices = index.subject_slices()
+    subjects = [s for s in subjects if s in slices]
+    if not subjects or probes.shape[0] == 0:
+        return {}
+    rows = np.concatenate([np.arange(slices[s].start, slices[s].stop) for s in subjects])
+    sizes = np.array([slices[s].stop - slices[s].start for s in subjects])
+    starts = np.concatenate([[0], np.cumsum(sizes)[:-1]])
+    members = index.matrix[rows]
+    block = max(1, min(block_size, _BLOCK_ELEMENTS // max(1, members.shape[0])))
+    out = {}
+    for b in range(0, probes.shape[0], block):
+        dists = unit_distances(np.asarray(probes[b : b + block]), members)
+        best = np.minimum.reduceat(dists, starts, axis=1)
+        for pi, si in zip(*np.nonzero(best <= threshold)):
+            cols = slice(starts[si], starts[si] + sizes[si])
+            r = int(np.argmin(dists[pi, cols]))
+            out[(b + int(pi), subjects[si])] = (
+                float(best[pi, si]),
+                index.paths[int(rows[starts[si] + r])],
+            )
+    return out
+
+
+def _apply(session, desired: dict, scope_subjects: set, scope_sources: dict,
+           removed: set, known_sources: set):
+    """Sync face_matches rows in scope with `desired` {(source, subject): (dist, path)}.
+
+    `scope_subjects` are fully re-scored; `scope_sources` maps other subjects
+    to the set of sources re-scored for them; `removed` subjects lose all rows.
+    Rows whose source is not a stored probe (`known_sources`) are left alone.
+    """
+    counts = {"inserted": 0, "updated": 0, "deleted": 0, "unchanged": 0}
+    subjects = scope_subjects | set(scope_sources) | removed
+    existing = {}
+    if subjects:
+        for fm in session.query(FaceMatch).filter(
+            FaceMatch.subject.in_(subjects), FaceMatch.track_start.is_(None)
+        ):
+            if fm.source not in known_sources:
+                continue
+            if fm.subject in removed:
+                session.delete(fm)
+                counts["deleted"] += 1
+                continue
+            if fm.subject not in scope_subjects and fm.source not in scope_sources.get(fm.subject, ()):
+                continue
+            key = (fm.source, fm.subject)
+            if key in existing or key not in desired:
+                # duplicate or no longer a match
+                session.delete(fm)
+                counts["deleted"] += 1
+                continue
+            existing[key] = fm
+    now = datetime.datetime.now(datetime.timezone.utc)
+    for (source, subject), (dist, path) in desired.items():
+        fm = existing.get((source, subject))
+        if fm is None:
+            session.add(
+                FaceMatch(source=source, subject=subject, gallery_path=path,
+                          distance=dist, created_at=now)
+            )
+            counts["inserted"] += 1
+        elif fm.gallery_path != path or abs((fm.distance or 0.0) - dist) > 1e-6:
+            fm.gallery_path = path
+            fm.distance = dist
+            counts["updated"] += 1
+        else:
+            counts["unchanged"] += 1
+    return counts
+
+
+def rematch(db_path, gallery_dir: Path, threshold: float = 0.6, full: bool = False,
+            block_size: int = 65536) -> dict:
+    """Re-match stored probes against gallery changes and update face_matches.
+
+    Returns counters: probes, new_probes, subjects_rescored, subjects_removed,
+    inserted, updated, deleted, unchanged.
+    """
+    from . import face_search
+
+    gallery_dir = Path(gallery_dir)
+    store = face_search._open_labeled_store(gallery_dir)
+    index = GalleryIndex.from_store(store)
+    model = store.model or face_search._embedding_model_tag()
+    if model is None:
+        raise EmbeddingSpaceError(
+            "gallery store of %s has no model tag and no embedding backend is installed; "
+            "cannot tell which stored probe embeddings it can be matched against" % gallery_dir
+        )
+    probes, ids, keys = load_probe_matrix(db_path, model)
+
+    state_path = _cache_dir(db_path) / f"rematch-{model.replace('/', '_')}.json"
+    try:
+        state = json.loads(state_path.read_text(encoding="utf-8"))
+    except Exception:
+        state = {}
+    signatures = subject_signatures(store)
+    # subjects gone since the last run lose their rows even when everything
+    # else is re-scored below
+    removed = set(state.get("subjects", {})) - set(signatures)
+    if (
+        full
+        or state.get("gallery") != str(gallery_dir.resolve())
+        or state.get("threshold") != threshold
+    ):
+        state = {}
+    previous = state.get("subjects", {})
+    changed = {s for s, sig in signatures.items() if previous.get(s) != sig}
+    unchanged = sorted(set(signatures) - changed)
+    first_new = int(np.searchsorted(ids, int(state.get("probe_max_id", 0)), side="right"))
+    if probes.shape[0]:
+        index.check_space(probes.shape[1], model)
+
+    desired = {}
+
+    def collect(hits, offset=0):
+        for (row, subject), (dist, path) in hits.items():
+            key = (keys[offset + row], subject)
+            if key not in desired or dist < desired[key][0]:
+                desired[key] = (dist, path)
+
+    collect(best_subject_matches(probes, index, sorted(changed), threshold, block_size))
+    new_sources = {}
+    if unchanged and first_new < probes.shape[0]:
+        collect(
+            best_subject_matches(probes[first_new:], index, unchanged, threshold, block_size),
+            offset=first_new,
+        )
+        new_keys = set(keys[first_new:])
+        new_sources = {s: new_keys for s in unchanged}
+
+    init_db(db_path) if db_path is not None else init_db()
+    session = get_session()
+    counts = _apply(session, desired, changed, new_sources, removed, set(keys))
+    session.commit()
+
+    state_path.parent.mkdir(parents=True, exist_ok=True)
+    state_path.write_text(
+        json.dumps(
+            {
+                "gallery": str(gallery_dir.resolve()),
+                "threshold": threshold,
+                "probe_max_id": int(ids[-1]) if len(ids) else 0,
+                "subjects": signatures,
+            }
+        ),
+        encoding="utf-8",
+    )
+    counts.update(
+        probes=int(probes.shape[0]),
+        new_probes=int(probes.shape[0] - first_new),
+        subjects_rescored=len(changed),
+        subjects_removed=len(removed),
+    )
+    logger.info("Re-match %s: %s", gallery_dir, counts)
+    return counts
+
+
+def cli_run(args):
+    gallery = Path(args.gallery)
+    if not gallery.exists():
+        raise SystemExit("Gallery dir does not exist: " + str(gallery))
+    try:
+        counts = rematch(args.db, gallery, threshold=args.threshold, full=args.full)
+    except EmbeddingSpaceError as e:
+        raise SystemExit(str(e))
+    print(json.dumps(counts, indent=2))
@@ -7,9 +7,22 @@ operations are local and auditable; gallery embeddings are cached for speed.
 import json
 import logging
 import math
+import os
 import pickle
+import threading
 from pathlib import Path
 
+from .. import config
+from ..utils.image_buffer import BGR, RGB, ImageBuffer
+from .embedding_store import EmbeddingStore, file_fingerprint
+from .face_ann import load_or_build_ann
+from .face_detect import detect_boxes
+from .face_index import EmbeddingSpaceError, GalleryIndex, select_top_k, unit_distances
+from .face_quality import shared_filter
+from .face_tracking import track_faces
+from .hash_inventory import sha256_file
+from .video_frames import SceneSampler, adaptive_frames, iter_frames
+
 logger = logging.getLogger("case_agent.face_search")
 
 # Try common face libs
@@ -35,74 +48,437 @@ except Exception:
     _facenet_model = None
 
 
+_facenet_transform = None
+
+
+def set_torch_threads(num_threads: int | None = None):
+    """Set torch intra-op threads (defaults to config.TORCH_NUM_THREADS).
+
+    Lower this when several worker processes embed in parallel so they do not
+    oversubscribe the CPU cores.
+    """
+    num_threads = num_threads or config.TORCH_NUM_THREADS
+    if torch is not None and num_threads:
+        torch.set_num_threads(int(num_threads))
+
+
 def _ensure_facenet_model():
     global _facenet_model
     if _facenet_model is None and InceptionResnetV1 is not None:
+        set_torch_threads()
         _facenet_model = InceptionResnetV1(pretrained="vggface2").eval()
     return _facenet_model
 
 
-def _load_gallery_embeddings(gallery_dir: Path) -> dict:
-    cache = gallery_dir / ".face_cache.pkl"
-    if cache.exists():
-        try:
-            with cache.open("rb") as fh:
-                return pickle.load(fh)
-        except Exception:
-            logger.exception("Failed to load gallery cache; will rebuild")
-    embeddings = {}
-    for p in gallery_dir.rglob("*"):
-        if p.is_file() and p.suffix.lower() in {".jpg", ".jpeg", ".png"}:
-            emb = _compute_embedding(p)
-            if emb is not None:
-                embeddings[str(p)] = emb
+def _ensure_facenet_transform():
+    """Build the FaceNet input transform once per process."""
+    global _facenet_transform
+    if _facenet_transform is None:
+        import torchvision.transforms as transforms
+
+        _facenet_transform = transforms.Compose(
+            [
+                transforms.ToTensor(),
+                transforms.Normalize([0.485, 0.456, 0.406], [0.229, 0.224, 0.225]),
+            ]
+        )
+    return _facenet_transform
+
+
+# Embedding spaces. Vectors of different models are never compared, stored or
+# indexed together.
+DLIB_MODEL = "dlib"
+FACENET_MODEL = "facenet-vggface2"
+EMBEDDING_DIMS = {DLIB_MODEL: 128, FACENET_MODEL: 512}
+
+# Gallery embedding stores (see embedding_store.py), one per embedding model;
+# legacy pickle caches are migrated into them on first load.
+GALLERY_STORE = "face_store"
+LABELED_GALLERY_STORE = "labeled_face_store"
+_GALLERY_IMAGE_EXTS = {".jpg", ".jpeg", ".png"}
+
+
+def _embedding_model_tag():
+    """Tag of the embedding model `_compute_embedding` will use.
+
+    Follows ``config.FACE_EMBEDDING_MODEL``; returns None when the selected
+    backend is not installed.
+    """
+    wanted = config.FACE_EMBEDDING_MODEL or "auto"
+    if wanted == "auto":
+        if face_recognition is not None:
+            return DLIB_MODEL
+        if InceptionResnetV1 is not None:
+            return FACENET_MODEL
+        return None
+    if wanted == DLIB_MODEL:
+        return DLIB_MODEL if face_recognition is not None else None
+    if wanted == FACENET_MODEL:
+        return FACENET_MODEL if InceptionResnetV1 is not None else None
+    logger.warning("Unknown FACE_EMBEDDING_MODEL %r", wanted)
+    return None
+
+
+def embedding_space() -> tuple:
+    """Return ``(model, dim)`` of the current embedding space (dim may be None)."""
+    model = _embedding_model_tag()
+    return model, EMBEDDING_DIMS.get(model)
+
+
+def _store_name(base: str, model: str | None = None) -> str:
+    """Store name of gallery store `base` for `model` (default: current model)."""
+    model = model or _embedding_model_tag()
+    return f"{base}.{model}" if model else base
+
+
+def _in_space(store: EmbeddingStore, model: str | None) -> bool:
+    """True when `store` rows were produced by `model`."""
+    if store.model != model:
+        return False
+    expected = EMBEDDING_DIMS.get(model)
+    return not (expected and len(store) and store.dim != expected)
+
+
+def _gallery_images(directory: Path) -> list:
+    return sorted(
+        p
+        for p in Path(directory).rglob("*")
+        if p.is_file() and p.suffix.lower() in _GALLERY_IMAGE_EXTS
+    )
+
+
+def _scan_gallery(directory: Path, labeled: bool) -> list:
+    """List gallery images as ``(path, subject)`` pairs, grouped by subject."""
+    directory = Path(directory)
+    if not labeled:
+        return [(str(p), None) for p in _gallery_images(directory)]
+    out = []
+    for sub in sorted(directory.iterdir()):
+        if sub.is_dir():
+            out.extend((str(p), sub.name) for p in _gallery_images(sub))
+    return out
+
+
+def _write_gallery_store(
+    directory: Path, name: str, rows: list, labeled: bool, fingerprints=None, model=None
+):
+    """Persist ``(path, subject, embedding)`` rows as an EmbeddingStore.
+
+    Rows are tagged with `model` (default: the current embedding model).
+
+    `fingerprints` covers every scanned image, including images that produced
+    no embedding, so they are not retried until they change.
+    """
+    if fingerprints is None:
+        fingerprints = {}
+        for path, _subject, _emb in rows:
+            try:
+                fingerprints[path] = file_fingerprint(path)
+            except OSError:
+                fingerprints[path] = None
+    dims = {len(emb) for _p, _s, emb in rows}
+    if len(dims) > 1:
+        logger.warning(
+            "Gallery %s mixes embedding dimensions %s; keeping the most common",
+            directory,
+            sorted(dims),
+        )
+        common = max(dims, key=lambda d: sum(1 for r in rows if len(r[2]) == d))
+        rows = [r for r in rows if len(r[2]) == common]
+    return EmbeddingStore.write(
+        directory,
+        name,
+        [emb for _p, _s, emb in rows],
+        [path for path, _s, _e in rows],
+        subjects=[subject for _p, subject, _e in rows] if labeled else None,
+        model=model or _embedding_model_tag(),
+        fingerprints=fingerprints,
+    )
+
+
+def _migrate_pickle_cache(cache: Path, name: str, labeled: bool):
+    """Convert a legacy pickle gallery cache into an EmbeddingStore."""
     try:
-        with cache.open("wb") as fh:
-            pickle.dump(embeddings, fh)
+        with cache.open("rb") as fh:
+            data = pickle.load(fh)
     except Exception:
-        logger.exception("Failed to write gallery cache")
-    return embeddings
+        logger.exception("Failed to load legacy gallery cache %s; will rebuild", cache)
+        return None
+    if labeled:
+        rows = [
+            (item["path"], subject, item["embedding"])
+            for subject, items in data.items()
+            for item in items
+            if item.get("embedding") is not None
+        ]
+    else:
+        rows = [(path, None, emb) for path, emb in data.items() if emb is not None]
+    # Pickles carry no model tag; only adopt vectors of the current dimension
+    expected = embedding_space()[1]
+    if expected and rows and any(len(r[2]) != expected for r in rows):
+        logger.warning(
+            "Legacy gallery cache %s is not in the %s space; re-embedding",
+            cache,
+            _embedding_model_tag(),
+        )
+        return None
+    logger.info("Migrating legacy gallery cache %s (%d embeddings)", cache, len(rows))
+    return _write_gallery_store(cache.parent, name, rows, labeled)
 
 
-def _load_labeled_gallery(labeled_dir: Path) -> dict:
-    """Load a labeled gallery (subfolders = subjects) and cache embeddings.
+def _sync_gallery_store(directory: Path, base: str, legacy: str, labeled: bool):
+    """Open a gallery store and bring it up to date with the directory.
+
+    Each image is compared against its recorded fingerprint
+    ``[size, mtime_ns, sha256]``: matching size/mtime is trusted, a size match
+    with a new mtime is confirmed by sha256, and only added or changed images
+    are embedded. Removed images are dropped. The store is rewritten only when
+    something changed, reusing the stored rows of unchanged images.
 
-    Returns a dict {subject: [{'path': str(path), 'embedding': list}]}.
+    The store lives under the current model's name (see :func:`_store_name`).
+    A store from before per-model names is adopted when its rows are in the
+    current space; rows of any other model are never reused, so the gallery
+    is re-embedded instead.
     """
-    labeled_dir = Path(labeled_dir)
-    cache = labeled_dir / ".labeled_face_cache.pkl"
-    if cache.exists():
+    directory = Path(directory)
+    model = _embedding_model_tag()
+    name = _store_name(base, model)
+    store = EmbeddingStore.open(directory, name)
+    adopted = False
+    if store is None and name != base:
+        store = EmbeddingStore.open(directory, base)
+        adopted = store is not None
+    if store is None and (directory / legacy).exists():
+        store = _migrate_pickle_cache(directory / legacy, name, labeled)
+    # Without an embedding backend nothing can be re-embedded; keep the rows
+    if store is not None and model is not None and not _in_space(store, model):
+        logger.warning(
+            "Gallery store %s holds %s embeddings (dim %d); re-embedding for %s",
+            directory,
+            store.model or "untagged",
+            store.dim,
+            model or "untagged",
+        )
+        store = None
+        adopted = False
+    old_fps = store.fingerprints if store is not None else {}
+    old_rows = {p: i for i, p in enumerate(store.paths)} if store is not None else {}
+
+    rows = []
+    pending = []
+    fingerprints = {}
+    added = changed = touched = unchanged = 0
+    for path, subject in _scan_gallery(directory, labeled):
         try:
-            with cache.open("rb") as fh:
-                return pickle.load(fh)
-        except Exception:
-            logger.exception("Failed to load labeled gallery cache; will rebuild")
-    out = {}
-    for sub in sorted(labeled_dir.iterdir()):
-        if not sub.is_dir():
+            st = os.stat(path)
+        except OSError:
             continue
-        items = []
-        for p in sub.rglob("*"):
-            if p.is_file() and p.suffix.lower() in {".jpg", ".jpeg", ".png"}:
-                emb = _compute_embedding(p)
-                if emb is not None:
-                    items.append(
-                        {
-                            "path": str(p),
-                            "embedding": (
-                                emb.tolist() if hasattr(emb, "tolist") else list(emb)
-                            ),
-                        }
-                    )
-        if items:
-            out[sub.name] = items
-    try:
-        labeled_dir.mkdir(parents=True, exist_ok=True)
-        with cache.open("wb") as fh:
-            pickle.dump(out, fh)
-    except Exception:
-        logger.exception("Failed to write labeled gallery cache")
-    return out
+        old = old_fps.get(path)
+        row = old_rows.get(path)
+        if row is not None and labeled and store.subjects[row] != subject:
+            old = None
+        if old and old[:2] == [st.st_size, st.st_mtime_ns]:
+            fingerprints[path] = old
+            if row is not None:
+                rows.append((path, subject, store.matrix[row]))
+            unchanged += 1
+            continue
+        sha = sha256_file(Path(path))
+        fp = [st.st_size, st.st_mtime_ns, sha]
+        fingerprints[path] = fp
+        if old and len(old) > 2 and old[2] == sha:
+            # Touched but identical content: keep the stored embedding
+            if row is not None:
+                rows.append((path, subject, store.matrix[row]))
+            touched += 1
+            continue
+        if old:
+            changed += 1
+        else:
+            added += 1
+        # Placeholder row; filled from one batched embedding pass below
+        pending.append(len(rows))
+        rows.append((path, subject, None))
+    removed = sum(1 for p in old_fps if p not in fingerprints)
+    embs = compute_embeddings([rows[i][0] for i in pending])
+    for i, emb in zip(pending, embs):
+        rows[i] = (rows[i][0], rows[i][1], emb)
+    rows = [r for r in rows if r[2] is not None]
+
+    if store is not None and not adopted and not (added or changed or touched or removed):
+        return store
+    logger.info(
+        "Refreshing gallery store %s: %d added, %d changed, %d touched, %d removed, %d unchanged",
+        directory,
+        added,
+        changed,
+        touched,
+        removed,
+        unchanged,
+    )
+    return _write_gallery_store(
+        directory,
+        name,
+        rows,
+        labeled,
+        fingerprints,
+        model=model or (store.model if store is not None else None),
+    )
+
+
+def _load_gallery_embeddings(gallery_dir: Path) -> EmbeddingStore:
+    """Load (or incrementally refresh) the embedding store for a gallery.
+
+    Returns an EmbeddingStore, a read-only mapping {path: embedding}.
+    """
+    return _sync_gallery_store(
+        gallery_dir, GALLERY_STORE, ".face_cache.pkl", labeled=False
+    )
+
+
+def _open_labeled_store(labeled_dir: Path) -> EmbeddingStore:
+    """Load (or incrementally refresh) the store for a labeled gallery.
+
+    Rows are grouped by subject (subfolder name) in sorted order.
+    """
+    return _sync_gallery_store(
+        labeled_dir, LABELED_GALLERY_STORE, ".labeled_face_cache.pkl", labeled=True
+    )
+
+
+class CachedGallery:
+    """A loaded gallery plus the matrices derived from it.
+
+    Attributes
+    ----------
+    index : GalleryIndex
+        All gallery rows.
+    prototypes : GalleryIndex | None
+        One mean embedding per subject (labeled galleries only).
+    compact : CompactGallery | None
+        A few diverse prototypes per subject plus flagged outlier images
+        (labeled galleries with ``config.FACE_PROTOTYPES_PER_SUBJECT`` set).
+    members : dict
+        {subject: (n_i, dim) matrix view} of each subject's rows.
+    version : tuple | None
+        Manifest stat signature the entry was loaded from.
+    """
+
+    def __init__(self, index: GalleryIndex, version=None):
+        self.index = index
+        self.version = version
+        self.prototypes = (
+            index.subject_prototypes() if index.subjects is not None else None
+        )
+        self.members = {
+            subject: index.matrix[rows]
+            for subject, rows in index.subject_slices().items()
+        }
+        self.compact = None
+        if index.subjects is not None and config.FACE_PROTOTYPES_PER_SUBJECT:
+            self.compact = index.compact(
+                config.FACE_PROTOTYPES_PER_SUBJECT,
+                outlier_distance=config.FACE_GALLERY_OUTLIER_DISTANCE,
+            )
+            for subject, paths in self.compact.outliers.items():
+                logger.warning(
+                    "Gallery subject %s: %d image(s) look like a different person: %s",
+                    subject,
+                    len(paths),
+                    ", ".join(str(p) for p in paths),
+                )
+
+
+class GalleryCache:
+    """Process-wide cache of loaded galleries keyed by directory, embedding model
+    and store version.
+
+    A hit costs one ``stat`` of the store manifest: if another process (or an
+    explicit refresh) rewrote the store, the entry is reloaded. New images in
+    the gallery directory are picked up on the next reload; call
+    :meth:`invalidate` to force one.
+    """
+
+    def __init__(self):
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _manifest_version(gallery_dir: Path, labeled: bool):
+        name = _store_name(LABELED_GALLERY_STORE if labeled else GALLERY_STORE)
+        try:
+            st = (Path(gallery_dir) / f".{name}.json").stat()
+        except OSError:
+            return None
+        return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+    def get(self, gallery_dir: Path, labeled: bool = False) -> CachedGallery:
+        key = (str(Path(gallery_dir).resolve()), labeled, _embedding_model_tag())
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is not None and entry.version == self._manifest_version(
+            gallery_dir, labeled
+        ):
+            return entry
+        if labeled:
+            store = _open_labeled_store(gallery_dir)
+            index = GalleryIndex.from_store(store)
+        else:
+            store = _load_gallery_embeddings(gallery_dir)
+            index = GalleryIndex.from_embeddings(store)
+        # Labeled matching is exact over the prototype shortlist and never runs
+        # top-k queries, so only unlabeled galleries get an ANN index
+        if (
+            not labeled
+            and isinstance(store, EmbeddingStore)
+            and config.FACE_ANN_MIN_GALLERY
+            and len(index) >= config.FACE_ANN_MIN_GALLERY
+        ):
+            index.ann = load_or_build_ann(
+                gallery_dir,
+                _store_name(GALLERY_STORE),
+                store.generation,
+                index.matrix,
+                backend=config.FACE_ANN_BACKEND,
+            )
+            index.ann_effort = config.FACE_ANN_EFFORT
+        entry = CachedGallery(index, self._manifest_version(gallery_dir, labeled))
+        # Galleries without an on-disk store have no version to validate against
+        if entry.version is not None:
+            with self._lock:
+                self._entries[key] = entry
+        return entry
+
+    def invalidate(self, gallery_dir: Path | None = None):
+        """Drop cached entries for `gallery_dir` (or all entries)."""
+        with self._lock:
+            if gallery_dir is None:
+                self._entries.clear()
+                return
+            resolved = str(Path(gallery_dir).resolve())
+            for key in [k for k in self._entries if k[0] == resolved]:
+                del self._entries[key]
+
+
+gallery_cache = GalleryCache()
+
+
+def load_gallery(gallery_dir: Path, labeled: bool = False) -> CachedGallery:
+    """Return the cached gallery for `gallery_dir`, loading it if needed."""
+    return gallery_cache.get(gallery_dir, labeled=labeled)
+
+
+def invalidate_gallery_cache(gallery_dir: Path | None = None):
+    """Forget cached galleries so the next search re-scans the directory."""
+    gallery_cache.invalidate(gallery_dir)
+
+
+def _load_labeled_gallery(labeled_dir: Path) -> dict:
+    """Load a labeled gallery (subfolders = subjects) and cache embeddings.
+
+    Returns a dict {subject: [{'path': str(path), 'embedding': array}]}.
+    """
+    return _open_labeled_store(labeled_dir).as_labeled()
 
 
 def _align_face(pil_img, landmarks):
@@ -153,55 +529,27 @@ def _align_face(pil_img, landmarks):
 def _compute_embedding(image_input):
     """Compute an embedding for an image file or image object.
 
-    Accepts a Path to an image file, a PIL Image, or a numpy array (RGB or BGR).
-    Tries (in order): face_recognition (dlib with optional alignment), facenet-pytorch, then returns None.
+    Accepts a Path to an image file, a PIL Image, an :class:`ImageBuffer` or an
+    RGB numpy array (wrap BGR arrays as ``ImageBuffer(arr, BGR)``).
+    Embeds with the model selected by :func:`_embedding_model_tag` only: dlib
+    (with optional alignment) or facenet-pytorch (aligned from dlib landmarks
+    when available). Returns None when that model finds no face; there is no
+    fallback into the other model's embedding space.
     """
+    model = _embedding_model_tag()
     # Normalize input to numpy RGB array or PIL Image depending on library
-    pil_img = None
-    np_img = None
     try:
-        from PIL import Image
+        buf = ImageBuffer.wrap(image_input)
     except Exception:
-        Image = None
-    # If a Path-like was provided, load it
-    if isinstance(image_input, (str, Path)):
-        p = str(image_input)
-        if face_recognition is not None:
-            try:
-                img = face_recognition.load_image_file(p)
-                np_img = img
-            except Exception:
-                logger.exception("face_recognition failed to load image %s", p)
-        if np_img is None and Image is not None:
-            try:
-                pil_img = Image.open(p).convert("RGB")
-            except Exception:
-                logger.exception("PIL failed to load image %s", p)
-    else:
-        # Assume it's a numpy array or PIL Image
-        if Image is not None and isinstance(image_input, Image.Image):
-            pil_img = image_input
-        else:
-            try:
-                import numpy as _np
-
-                if isinstance(image_input, _np.ndarray):
-                    np_img = image_input
-                else:
-                    # Unknown input
-                    pass
-            except Exception:
-                pass
+        logger.exception("Failed to load image for embedding")
+        return None
 
     # 1) Try face_recognition (dlib) with alignment
+    landmarks = None
     if face_recognition is not None:
         try:
-            # If we have np_img, pass it directly; otherwise convert pil_img to np
-            if np_img is None and pil_img is not None:
-                np_img = _pil_to_np(pil_img)
-            face_locs = (
-                face_recognition.face_locations(np_img) if np_img is not None else []
-            )
+            np_img = buf.rgb(contiguous=True)
+            face_locs = face_recognition.face_locations(np_img)
             if face_locs:
                 # pick largest face bbox
                 loc = max(
@@ -213,73 +561,97 @@ def _compute_embedding(image_input):
                 landmarks_list = face_recognition.face_landmarks(np_img, [loc])
                 if landmarks_list:
                     landmarks = landmarks_list[0]
-                    # convert np image to PIL for alignment
-                    if pil_img is None and np_img is not None:
-                        pil_img = _np_to_pil(np_img)
-                    aligned = _align_face(pil_img, landmarks)
-                    if aligned is not None:
-                        encs = face_recognition.face_encodings(_pil_to_np(aligned))
-                        if encs:
-                            return encs[0]
-                # fallback: face_recognition enc on original
-                encs = face_recognition.face_encodings(np_img)
-                if encs:
-                    return encs[0]
+                if model == DLIB_MODEL:
+                    if landmarks is not None:
+                        aligned = _align_face(buf.pil(), landmarks)
+                        if aligned is not None:
+                            encs = face_recognition.face_encodings(_pil_to_np(aligned))
+                            if encs:
+                                return encs[0]
+                    # fallback: face_recognition enc on original
+                    encs = face_recognition.face_encodings(np_img)
+                    if encs:
+                        return encs[0]
         except Exception:
             logger.exception("face_recognition embedding failed for input")
+    if model == DLIB_MODEL:
+        return None
 
-    # 2) Try facenet-pytorch on aligned or resized PIL image
-    if InceptionResnetV1 is not None:
+    # 2) facenet-pytorch on aligned or resized PIL image
+    if model == FACENET_MODEL:
         try:
-            if pil_img is None and np_img is not None:
-                pil_img = _np_to_pil(np_img)
-            if pil_img is None:
-                return None
-            # Try to detect landmarks with face_recognition if available so we can align
-            aligned_img = None
-            if face_recognition is not None:
-                try:
-                    np_tmp = _pil_to_np(pil_img)
-                    locs = face_recognition.face_locations(np_tmp)
-                    if locs:
-                        best_loc = max(
-                            locs,
-                            key=lambda cand: (cand[2] - cand[0])
-                            * (
-                                cand[1] - cand[3]
-                                if cand[1] > cand[3]
-                                else cand[3] - cand[1]
-                            ),
-                        )
-                        lds = face_recognition.face_landmarks(np_tmp, [best_loc])
-                        if lds:
-                            aligned_img = _align_face(pil_img, lds[0])
-                except Exception:
-                    pass
-            img = aligned_img if aligned_img is not None else pil_img
-            model = _ensure_facenet_model()
-            if model is None:
-                return None
-            # Resize/crop to 160x160 as standard for FaceNet inputs
-            img = img.resize((160, 160))
-            import torchvision.transforms as transforms
-
-            transform = transforms.Compose(
-                [
-                    transforms.ToTensor(),
-                    transforms.Normalize([0.485, 0.456, 0.406], [0.229, 0.224, 0.225]),
-                ]
-            )
-            t = transform(img).unsqueeze(0)
-            with torch.no_grad():
-                v = model(t)
-            return v.squeeze(0).cpu().numpy()
+            # Reuse landmarks from the dlib pass instead of detecting again
+            return _facenet_forward([_facenet_input(buf.pil(), landmarks)])[0]
         except Exception:
             logger.exception("facenet-pytorch embedding failed for input")
     logger.warning("No embedding method available for input")
     return None
 
 
+def _facenet_input(pil_img, landmarks=None):
+    """Align (when `landmarks` are given) and resize a PIL image to 160x160."""
+    aligned_img = None
+    if landmarks:
+        try:
+            aligned_img = _align_face(pil_img, landmarks)
+        except Exception:
+            pass
+    img = aligned_img if aligned_img is not None else pil_img
+    return img.resize((160, 160))
+
+
+def _facenet_forward(pil_images: list, batch_size: int = 32) -> list:
+    """Run prepared 160x160 PIL images through FaceNet in fixed-size batches."""
+    model = _ensure_facenet_model()
+    transform = _ensure_facenet_transform()
+    out = []
+    for i in range(0, len(pil_images), batch_size):
+        t = torch.stack([transform(img) for img in pil_images[i : i + batch_size]])
+        with torch.no_grad():
+            v = model(t)
+        out.extend(v.cpu().numpy())
+    return out
+
+
+def _load_pil(image_input):
+    """Load a path, PIL Image, ImageBuffer or RGB array as a PIL Image (or None)."""
+    try:
+        return ImageBuffer.wrap(image_input).pil()
+    except Exception:
+        logger.exception("Failed to load image for embedding")
+        return None
+
+
+def compute_embeddings(images: list, batch_size: int = 32) -> list:
+    """Compute embeddings for many images (paths, PIL Images or arrays).
+
+    Returns a list aligned with `images` (None where no embedding could be
+    computed). With the FaceNet model crops are preprocessed once and run
+    through the model `batch_size` at a time; the dlib model embeds per image.
+    """
+    images = list(images)
+    if _embedding_model_tag() != FACENET_MODEL:
+        return [_compute_embedding(img) for img in images]
+    out = [None] * len(images)
+    prepared = []
+    positions = []
+    for i, img in enumerate(images):
+        pil = _load_pil(img)
+        if pil is None:
+            continue
+        try:
+            prepared.append(_facenet_input(pil))
+            positions.append(i)
+        except Exception:
+            logger.exception("Failed to prepare image %d for FaceNet", i)
+    try:
+        for i, emb in zip(positions, _facenet_forward(prepared, batch_size)):
+            out[i] = emb
+    except Exception:
+        logger.exception("facenet-pytorch batch embedding failed")
+    return out
+
+
 def _pil_to_np(img):
     """Convert PIL Image (RGB) to numpy array (RGB)"""
     import numpy as _np
@@ -287,163 +659,343 @@ def _pil_to_np(img):
     return _np.array(img)
 
 
-def _np_to_pil(arr):
-    """Convert numpy array (RGB or BGR) to PIL Image (RGB)"""
+def _np_to_pil(arr, order: str = RGB):
+    """Convert a numpy array in channel `order` (RGB or BGR) to a PIL Image.
+
+    The order is never guessed; pass ``order=BGR`` for OpenCV frames.
+    """
     try:
-        from PIL import Image
+        return ImageBuffer.wrap(arr, order=order).pil()
     except Exception:
         return None
 
-    if arr.ndim == 3 and arr.shape[2] == 3:
-        # Try to detect if it's BGR (common with OpenCV); assume values 0-255
-        # Heuristic: if mean of first channel is greater than mean of last channel, treat as BGR
-        if arr[:, :, 0].mean() > arr[:, :, 2].mean():
-            arr = arr[:, :, ::-1]
-        return Image.fromarray(arr.astype("uint8"))
-    if arr.ndim == 2:
-        return Image.fromarray(arr.astype("uint8"))
-    return None
-
 
 def _compare_embedding(enc1, enc2):
     # Euclidean distance
     if enc1 is None or enc2 is None:
         return math.inf
+    if len(enc1) != len(enc2):
+        raise EmbeddingSpaceError(
+            "cannot compare embeddings of dimension %d and %d" % (len(enc1), len(enc2))
+        )
     return math.sqrt(sum((a - b) ** 2 for a, b in zip(enc1, enc2)))
 
 
-def find_faces_in_image(image_path: Path):
-    """Return list of detected faces with bounding boxes and embeddings.
+class CropWriter:
+    """Write face crops to disk on a small background thread pool.
 
-    Uses face_recognition if available; otherwise tries OpenCV Haar cascade if cv2
-    is present. Each returned entry is {'bbox': {...}, 'embedding': [...]}.
+    Detection and matching never wait on JPEG encoding; call :meth:`flush`
+    before reading the crops back.
+    """
+
+    def __init__(self, max_workers: int = 2):
+        from concurrent.futures import ThreadPoolExecutor
+
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="crop-writer"
+        )
+        self._pending = []
+        self._lock = threading.Lock()
+
+    def _write(self, rgb, path: Path):
+        from PIL import Image
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        Image.fromarray(rgb).save(path)
+
+    def submit(self, rgb, path: Path):
+        """Queue an RGB uint8 array to be saved at `path`."""
+        fut = self._executor.submit(self._write, rgb, Path(path))
+        with self._lock:
+            self._pending.append((Path(path), fut))
+        return fut
+
+    def flush(self) -> int:
+        """Wait for queued writes; return the number that failed."""
+        with self._lock:
+            pending, self._pending = self._pending, []
+        failed = 0
+        for path, fut in pending:
+            try:
+                fut.result()
+            except Exception:
+                failed += 1
+                logger.exception("Failed to write face crop %s", path)
+        return failed
+
+    def close(self):
+        self.flush()
+        self._executor.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+_crop_writer = None
+_crop_writer_lock = threading.Lock()
+
+
+def crop_writer() -> CropWriter:
+    """Return the shared process-wide :class:`CropWriter`."""
+    global _crop_writer
+    with _crop_writer_lock:
+        if _crop_writer is None:
+            _crop_writer = CropWriter(max_workers=config.FACE_CROP_WRITER_THREADS)
+        return _crop_writer
+
+
+def flush_crop_writes() -> int:
+    """Wait for crops queued on the shared writer; return the failure count."""
+    return _crop_writer.flush() if _crop_writer is not None else 0
+
+
+def _load_rgb(image, bgr: bool = False):
+    """Load a path, PIL Image, ImageBuffer or array as a contiguous RGB uint8 array.
+
+    Arrays are RGB, or BGR with ``bgr=True``.
     """
-    # 1) Try face_recognition (dlib)
+    return ImageBuffer.wrap(image, order=BGR if bgr else RGB).rgb(contiguous=True)
+
+
+def _haar_boxes(rgb) -> list:
+    """Detect faces with the OpenCV Haar cascade; boxes are (top, right, bottom, left)."""
+    gray = cv2.cvtColor(rgb, cv2.COLOR_RGB2GRAY)
+    casc_path = cv2.data.haarcascades + "haarcascade_frontalface_default.xml"
+    cascade = cv2.CascadeClassifier(casc_path)
+    rects = cascade.detectMultiScale(
+        gray, scaleFactor=1.1, minNeighbors=5, minSize=(30, 30)
+    )
+    return [(int(y), int(x + w), int(y + h), int(x)) for x, y, w, h in rects]
+
+
+def _detect_faces_rgb(rgb, source="image") -> list:
+    """Detect and embed every face in an RGB array exactly once.
+
+    Returns ``[(box, embedding), ...]`` with boxes as (top, right, bottom,
+    left). Detection follows ``config.FACE_DETECT_MODE`` (see face_detect).
+    Faces are found with dlib when installed, else the OpenCV Haar cascade,
+    optionally screened by the quality pre-filter (``config.FACE_QUALITY_FILTER``)
+    and embedded in the current model's space only: dlib's
+    ``face_encodings`` aligns each face from its own landmarks; the FaceNet
+    model embeds all crops in one batch.
+    """
+    mode = config.FACE_DETECT_MODE
+    opts = {"max_side": config.FACE_DETECT_MAX_SIDE, "pad": config.FACE_DETECT_REGION_PAD}
+    boxes = None
     if face_recognition is not None:
         try:
-            img = face_recognition.load_image_file(str(image_path))
-            locations = face_recognition.face_locations(img)
-            encs = face_recognition.face_encodings(img, locations)
-            out = []
-            for loc, enc in zip(locations, encs):
-                # loc is (top, right, bottom, left)
-                out.append(
-                    {
-                        "bbox": {
-                            "top": int(loc[0]),
-                            "right": int(loc[1]),
-                            "bottom": int(loc[2]),
-                            "left": int(loc[3]),
-                        },
-                        "embedding": enc.tolist(),
-                    }
-                )
-            return out
-        except Exception:
-            logger.exception(
-                "face_recognition detection/encoding failed for %s", image_path
+            boxes = detect_boxes(
+                rgb,
+                face_recognition.face_locations,
+                mode=mode,
+                haar=_haar_boxes if cv2 is not None else None,
+                **opts,
             )
-            # Fall through to fallback methods (OpenCV or whole-image embedding).
-
-    # 2) Fallback to OpenCV Haar cascade if available
-    if cv2 is not None:
+        except Exception:
+            logger.exception("face_recognition detection failed for %s", source)
+            # Fall through to the OpenCV fallback.
+    if boxes is None and cv2 is not None:
         try:
-            # Read image with cv2 and detect faces
-            img = cv2.imread(str(image_path))
-            if img is None:
-                logger.error("cv2 failed to read image %s", image_path)
-                return []
-            gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-            casc_path = cv2.data.haarcascades + "haarcascade_frontalface_default.xml"
-            cascade = cv2.CascadeClassifier(casc_path)
-            rects = cascade.detectMultiScale(
-                gray, scaleFactor=1.1, minNeighbors=5, minSize=(30, 30)
-            )
-            out = []
-            for x, y, w, h in rects:
-                top, left, bottom, right = int(y), int(x), int(y + h), int(x + w)
-                crop = img[top:bottom, left:right]
-                emb = _compute_embedding(crop)
-                if emb is not None:
-                    out.append(
-                        {
-                            "bbox": {
-                                "top": top,
-                                "right": right,
-                                "bottom": bottom,
-                                "left": left,
-                            },
-                            "embedding": (
-                                emb.tolist() if hasattr(emb, "tolist") else list(emb)
-                            ),
-                        }
-                    )
-            return out
+            boxes = detect_boxes(rgb, _haar_boxes, mode=mode, **opts)
         except Exception:
-            logger.exception("OpenCV Haar face detection failed for %s", image_path)
+            logger.exception("OpenCV Haar face detection failed for %s", source)
+            return []
+    if boxes is None:
+        logger.warning("No face detection method available for %s", source)
+        return []
+    boxes = [tuple(int(v) for v in box) for box in boxes]
+    quality = shared_filter()
+    if quality is not None and boxes:
+        landmarks = None
+        if face_recognition is not None and quality.max_yaw:
+            try:
+                landmarks = face_recognition.face_landmarks(rgb, boxes, model="small")
+            except Exception:
+                logger.exception("face_recognition landmarks failed for %s", source)
+        boxes = [
+            box
+            for i, box in enumerate(boxes)
+            if quality.check(rgb, box, landmarks[i] if landmarks else None)
+        ]
+        if not boxes:
             return []
+    try:
+        if _embedding_model_tag() == DLIB_MODEL:
+            # Embeddings are always computed at full resolution
+            embs = face_recognition.face_encodings(rgb, boxes)
+        else:
+            frame = ImageBuffer(rgb, RGB)
+            crops = [frame.crop(*box) for box in boxes]
+            embs = compute_embeddings(crops, batch_size=config.FACE_EMBED_BATCH_SIZE)
+    except Exception:
+        logger.exception("Face embedding failed for %s", source)
+        return []
+    return [(box, emb) for box, emb in zip(boxes, embs) if emb is not None]
+
+
+def detect_and_embed(
+    image,
+    crops_dir: Path | None = None,
+    crop_stem: str | None = None,
+    bgr: bool = False,
+    writer: CropWriter | None = None,
+) -> list:
+    """Detect, align and embed each face in `image` in a single pass.
+
+    `image` is a path, PIL Image or numpy array (RGB, or BGR with
+    ``bgr=True``). Returns ``[{'bbox', 'embedding', 'crop', 'model'}, ...]``
+    where `embedding` is a float32 array ready for
+    :func:`match_labeled_embedding` and `model` tags its embedding space.
+    When `crops_dir` is set each face crop is queued on `writer` (default: the
+    shared :func:`crop_writer`) as ``<crop_stem>_f<n>.jpg`` and `crop` holds
+    its path; the file may not exist until the writer is flushed.
+    """
+    import numpy as _np
 
-    logger.warning("No face detection method available for %s", image_path)
-    return []
+    source = str(image) if isinstance(image, (str, Path)) else "image array"
+    try:
+        rgb = _load_rgb(image, bgr=bgr)
+    except Exception:
+        logger.exception("Failed to load image %s", source)
+        return []
+    if crop_stem is None:
+        crop_stem = Path(image).stem if isinstance(image, (str, Path)) else "face"
+    faces = []
+    model = _embedding_model_tag()
+    for i, ((top, right, bottom, left), emb) in enumerate(_detect_faces_rgb(rgb, source)):
+        crop = None
+        if crops_dir is not None:
+            crop = Path(crops_dir) / f"{crop_stem}_f{i + 1}.jpg"
+            # Copy the crop so callers may reuse their frame buffer
+            (writer or crop_writer()).submit(rgb[top:bottom, left:right].copy(), crop)
+            crop = str(crop)
+        faces.append(
+            {
+                "bbox": {"top": top, "right": right, "bottom": bottom, "left": left},
+                "embedding": _np.asarray(emb, dtype=_np.float32),
+                "crop": crop,
+                "model": model,
+            }
+        )
+    return faces
 
 
-def find_faces_in_video(video_path: Path, interval_seconds: float = 5.0):
-    """Sample frames and run face detection on them. Returns list of detections per timestamp."""
-    if cv2 is None:
-        logger.warning(
-            "opencv (cv2) not installed; cannot sample video frames for %s", video_path
+def _legacy_faces(faces: list) -> list:
+    """Drop crop paths and list-ify embeddings for the older dict format."""
+    return [{"bbox": f["bbox"], "embedding": f["embedding"].tolist()} for f in faces]
+
+
+def find_faces_in_image(image_path: Path):
+    """Return list of detected faces with bounding boxes and embeddings.
+
+    Uses face_recognition if available; otherwise tries OpenCV Haar cascade if cv2
+    is present. Each returned entry is {'bbox': {...}, 'embedding': [...]}.
+    See :func:`detect_and_embed` for the array-based API.
+    """
+    return _legacy_faces(detect_and_embed(image_path))
+
+
+def _detect_frame(image, desc) -> list:
+    """Frame-ring task: detect and embed the faces of one shared-memory frame."""
+    return _legacy_faces(detect_and_embed(image))
+
+
+def find_faces_in_video(
+    video_path: Path,
+    interval_seconds: float = 5.0,
+    max_side: int | None = None,
+    keyframes_only: bool = False,
+    adaptive: bool | None = None,
+    stats: dict | None = None,
+    workers: int | None = None,
+):
+    """Sample frames and run face detection on them. Returns list of detections per timestamp.
+
+    Frames are decoded sequentially by :func:`video_frames.iter_frames` (no
+    per-sample seeking). With `max_side`, frames are downscaled before
+    detection and bboxes refer to the downscaled frame.
+
+    With `adaptive` (default ``config.VIDEO_ADAPTIVE_SAMPLING``) frames are
+    examined every ``config.VIDEO_SCENE_PROBE_INTERVAL`` seconds and detection
+    runs only on scene changes, densely after each change and at least every
+    `interval_seconds` (see :class:`video_frames.SceneSampler`). Sampling
+    counters (frames examined/detected, scene changes) are written into
+    `stats` when a dict is passed.
+
+    With `workers` > 1 (default ``config.FRAME_WORKERS``) detection runs in
+    worker processes fed through shared-memory frame buffers (see
+    :mod:`frame_ring`) while this process keeps decoding.
+    """
+    if adaptive is None:
+        adaptive = config.VIDEO_ADAPTIVE_SAMPLING
+    sampler = None
+    frames = iter_frames(
+        video_path,
+        interval_seconds=(
+            min(config.VIDEO_SCENE_PROBE_INTERVAL, interval_seconds)
+            if adaptive
+            else interval_seconds
+        ),
+        max_side=max_side,
+        keyframes_only=keyframes_only,
+    )
+    if adaptive:
+        sampler = SceneSampler(
+            threshold=config.VIDEO_SCENE_THRESHOLD,
+            dense_interval=config.VIDEO_SCENE_DENSE_INTERVAL,
+            dense_duration=config.VIDEO_SCENE_DENSE_DURATION,
+            max_interval=interval_seconds,
         )
-        return []
-    cap = cv2.VideoCapture(str(video_path))
-    if not cap.isOpened():
-        logger.error("Failed to open video %s", video_path)
-        return []
-    fps = cap.get(cv2.CAP_PROP_FPS) or 25.0
-    total = cap.get(cv2.CAP_PROP_FRAME_COUNT) or 0
-    duration = total / fps if fps else 0
-    ts = 0.0
+        frames = adaptive_frames(frames, sampler)
     results = []
-    while ts < duration:
-        frame_no = int(ts * fps)
-        cap.set(cv2.CAP_PROP_POS_FRAMES, frame_no)
-        ret, frame = cap.read()
-        if not ret:
-            break
-        # Convert BGR -> RGB for face_recognition
-        rgb = frame[:, :, ::-1]
-        if face_recognition is None:
-            break
-        try:
-            locations = face_recognition.face_locations(rgb)
-            encs = face_recognition.face_encodings(rgb, locations)
-        except Exception:
-            logger.exception(
-                "face_recognition detection/encoding failed for frame at %s in %s",
-                ts,
-                video_path,
-            )
-            ts += interval_seconds
-            continue
-        dets = []
-        for loc, enc in zip(locations, encs):
-            dets.append(
-                {
-                    "bbox": {
-                        "top": int(loc[0]),
-                        "right": int(loc[1]),
-                        "bottom": int(loc[2]),
-                        "left": int(loc[3]),
-                    },
-                    "embedding": enc.tolist(),
+    examined = 0
+    workers = workers or config.FRAME_WORKERS
+    if workers and workers > 1:
+        from .frame_ring import process_frames
+
+        def described(frames):
+            for frame in frames:
+                yield frame.image, {
+                    "source": str(video_path),
+                    "timestamp": frame.timestamp,
+                    "index": frame.index,
                 }
-            )
-        if dets:
-            results.append({"timestamp": ts, "detections": dets})
-        ts += interval_seconds
-    cap.release()
+
+        for desc, dets in process_frames(described(frames), _detect_frame, workers=workers):
+            examined += 1
+            if dets:
+                results.append({"timestamp": desc.timestamp, "detections": dets})
+        results.sort(key=lambda r: r["timestamp"])
+    else:
+        for frame in frames:
+            examined += 1
+            dets = _legacy_faces(detect_and_embed(frame.image))
+            if dets:
+                results.append({"timestamp": frame.timestamp, "detections": dets})
+    counters = (
+        sampler.stats()
+        if sampler is not None
+        else {"frames_examined": examined, "frames_detected": examined, "scene_changes": 0}
+    )
+    logger.info(
+        "Video %s: examined %d frames, ran detection on %d",
+        video_path,
+        counters["frames_examined"],
+        counters["frames_detected"],
+    )
+    if stats is not None:
+        stats.update(counters)
     return results
 
 
+def _gallery_matches(index: GalleryIndex, hits: list) -> list:
+    """Convert ``(row, distance)`` hits from a GalleryIndex into match dicts."""
+    return [{"gallery_path": index.paths[r], "distance": d} for r, d in hits]
+
+
 def search_gallery_for_image(
     image_path: Path, gallery_dir: Path, threshold: float = 0.6, top_k: int = 5
 ):
@@ -452,8 +1004,7 @@ def search_gallery_for_image(
     If no face detector is available or detection finds nothing, fall back to
     computing an embedding for the whole image and comparing that single probe.
     """
-    gallery_dir = Path(gallery_dir)
-    gallery_embs = _load_gallery_embeddings(gallery_dir)
+    index = load_gallery(Path(gallery_dir)).index
     faces = find_faces_in_image(image_path)
     out = []
 
@@ -466,27 +1017,21 @@ def search_gallery_for_image(
         probe_emb = _compute_embedding(image_path)
         if probe_emb is None:
             return {"source": str(image_path), "num_faces": 0, "results": []}
-        best = []
-        for gp, genc in gallery_embs.items():
-            dist = _compare_embedding(probe_emb, genc)
-            if dist <= threshold:
-                best.append({"gallery_path": gp, "distance": dist})
-        best.sort(key=lambda x: x["distance"])
+        hits = index.search(probe_emb, top_k=top_k, threshold=threshold)
         return {
             "source": str(image_path),
             "num_faces": 1,
-            "results": [{"face_bbox": None, "matches": best[:top_k]}],
+            "results": [{"face_bbox": None, "matches": _gallery_matches(index, hits)}],
         }
 
+    # Score every face with an embedding in one batch
+    probes = [f.get("embedding") for f in faces if f.get("embedding") is not None]
+    batch = iter(index.search_batch(probes, top_k=top_k, threshold=threshold))
     for face in faces:
-        enc = face.get("embedding")
-        best = []
-        for gp, genc in gallery_embs.items():
-            dist = _compare_embedding(enc, genc)
-            if dist <= threshold:
-                best.append({"gallery_path": gp, "distance": dist})
-        best.sort(key=lambda x: x["distance"])
-        out.append({"face_bbox": face.get("bbox"), "matches": best[:top_k]})
+        hits = next(batch) if face.get("embedding") is not None else []
+        out.append(
+            {"face_bbox": face.get("bbox"), "matches": _gallery_matches(index, hits)}
+        )
     return {"source": str(image_path), "num_faces": len(faces), "results": out}
 
 
@@ -496,26 +1041,118 @@ def search_gallery_for_video(
     interval_seconds: float = 5.0,
     threshold: float = 0.6,
     top_k: int = 3,
+    max_side: int | None = None,
+    keyframes_only: bool = False,
+    adaptive: bool | None = None,
 ):
-    gallery_dir = Path(gallery_dir)
-    gallery_embs = _load_gallery_embeddings(gallery_dir)
-    frames = find_faces_in_video(video_path, interval_seconds=interval_seconds)
+    index = load_gallery(Path(gallery_dir)).index
+    sampling = {}
+    frames = find_faces_in_video(
+        video_path,
+        interval_seconds=interval_seconds,
+        max_side=max_side,
+        keyframes_only=keyframes_only,
+        adaptive=adaptive,
+        stats=sampling,
+    )
+    # Score all detections from all sampled frames in a single batch
+    dets_flat = [
+        d
+        for frame in frames
+        for d in frame.get("detections", [])
+        if d.get("embedding") is not None
+    ]
+    batch = iter(
+        index.search_batch(
+            [d.get("embedding") for d in dets_flat], top_k=top_k, threshold=threshold
+        )
+    )
     out = []
     for frame in frames:
         ts = frame.get("timestamp")
         dets = []
         for d in frame.get("detections", []):
-            enc = d.get("embedding")
-            best = []
-            for gp, genc in gallery_embs.items():
-                dist = _compare_embedding(enc, genc)
-                if dist <= threshold:
-                    best.append({"gallery_path": gp, "distance": dist})
-            best.sort(key=lambda x: x["distance"])
-            dets.append({"bbox": d.get("bbox"), "matches": best[:top_k]})
+            hits = next(batch) if d.get("embedding") is not None else []
+            dets.append({"bbox": d.get("bbox"), "matches": _gallery_matches(index, hits)})
         if dets:
             out.append({"timestamp": ts, "detections": dets})
-    return {"source": str(video_path), "frames_with_matches": len(out), "results": out}
+    return {
+        "source": str(video_path),
+        "frames_with_matches": len(out),
+        "sampling": sampling,
+        "results": out,
+    }
+
+
+def search_video_tracks(
+    video_path: Path,
+    gallery_dir: Path,
+    labeled: bool = False,
+    interval_seconds: float = 5.0,
+    threshold: float = 0.6,
+    top_k: int = 3,
+    max_side: int | None = None,
+    keyframes_only: bool = False,
+    adaptive: bool | None = None,
+    frames: list | None = None,
+) -> dict:
+    """Track faces across sampled frames and match each track once.
+
+    Detections are linked by :func:`face_tracking.track_faces` and each
+    track's prototype embedding is scored against the gallery (labeled
+    galleries return ``subject_matches`` per track, unlabeled ones
+    ``matches``). Tracks carry ``start``/``end`` timestamps for persistence.
+    Pass `frames` (``find_faces_in_video`` output, e.g. rebuilt from stored
+    embeddings) to skip decoding and detection.
+    """
+    sampling = {}
+    if frames is None:
+        frames = find_faces_in_video(
+            video_path,
+            interval_seconds=interval_seconds,
+            max_side=max_side,
+            keyframes_only=keyframes_only,
+            adaptive=adaptive,
+            stats=sampling,
+        )
+    tracks = track_faces(
+        frames,
+        iou_threshold=config.FACE_TRACK_IOU,
+        max_distance=config.FACE_TRACK_MAX_DISTANCE,
+        reid_distance=config.FACE_TRACK_REID_DISTANCE,
+        max_gap=max(config.FACE_TRACK_MAX_GAP_SECONDS, 2 * interval_seconds),
+    )
+    prototypes = [t.prototype() for t in tracks]
+    gallery = load_gallery(Path(gallery_dir), labeled=labeled)
+    if labeled:
+        matched = [
+            _match_labeled(p, gallery, str(video_path), threshold, top_k, True)
+            for p in prototypes
+        ]
+    else:
+        matched = [
+            {"matches": _gallery_matches(gallery.index, hits)}
+            for hits in gallery.index.search_batch(
+                prototypes, top_k=top_k, threshold=threshold
+            )
+        ]
+    out = []
+    for track, m in zip(tracks, matched):
+        entry = {
+            "track_id": track.track_id,
+            "start": track.start,
+            "end": track.end,
+            "num_detections": len(track.timestamps),
+            "bbox": track.best_bbox(),
+        }
+        if labeled:
+            entry["subject_matches"] = m["subject_matches"]
+        else:
+            entry["matches"] = m["matches"]
+        out.append(entry)
+    sampling["detections"] = sum(len(f.get("detections", [])) for f in frames)
+    sampling["tracks"] = len(tracks)
+    return {"source": str(video_path), "sampling": sampling, "tracks": out}
 
 
 # Labeled gallery helpers (subfolders = subject names)
@@ -552,63 +1189,158 @@ def search_labeled_gallery_for_image(
     top_k: int = 5,
     use_subject_embeddings: bool = True,
 ):
-    labeled = _load_labeled_gallery(labeled_gallery_dir)
+    gallery = load_gallery(Path(labeled_gallery_dir), labeled=True)
     probe = _compute_embedding(image_path)
+    return _match_labeled(
+        probe, gallery, str(image_path), threshold, top_k, use_subject_embeddings
+    )
+
+
+def search_labeled_gallery_for_images(
+    image_paths: list,
+    labeled_gallery_dir: Path,
+    threshold: float = 0.6,
+    top_k: int = 5,
+    use_subject_embeddings: bool = True,
+    batch_size: int | None = None,
+) -> list:
+    """Batch variant of :func:`search_labeled_gallery_for_image`.
+
+    Embeds all images with :func:`compute_embeddings` and returns one result
+    dict per image, in order.
+    """
+    gallery = load_gallery(Path(labeled_gallery_dir), labeled=True)
+    image_paths = list(image_paths)
+    probes = compute_embeddings(
+        image_paths, batch_size=batch_size or config.FACE_EMBED_BATCH_SIZE
+    )
+    return [
+        _match_labeled(
+            probe, gallery, str(path), threshold, top_k, use_subject_embeddings
+        )
+        for path, probe in zip(image_paths, probes)
+    ]
+
+
+def match_labeled_embedding(
+    embedding,
+    labeled_gallery_dir: Path,
+    threshold: float = 0.6,
+    top_k: int = 5,
+    use_subject_embeddings: bool = True,
+    source: str = "",
+    model: str | None = None,
+) -> dict:
+    """Labeled gallery search for a precomputed probe embedding.
+
+    Use with :func:`detect_and_embed` to match faces without writing and
+    re-reading crops; `source` is recorded as the result's source. Pass the
+    probe's `model` tag (e.g. a face's ``'model'``) so a probe from another
+    embedding space raises :class:`EmbeddingSpaceError` instead of matching.
+    """
+    gallery = load_gallery(Path(labeled_gallery_dir), labeled=True)
+    return _match_labeled(
+        embedding,
+        gallery,
+        str(source),
+        threshold,
+        top_k,
+        use_subject_embeddings,
+        model=model,
+    )
+
+
+def _match_labeled(
+    probe,
+    gallery: CachedGallery,
+    source: str,
+    threshold: float,
+    top_k: int,
+    use_subject_embeddings: bool,
+    model: str | None = None,
+) -> dict:
+    """Match one probe embedding against a cached labeled gallery.
+
+    Subjects are scored against the compact prototype matrix first
+    (``gallery.compact``) and only shortlisted subjects are expanded to their
+    member images.
+    """
     if probe is None:
-        return {"source": str(image_path), "num_subjects": 0, "subject_matches": []}
+        return {"source": source, "num_subjects": 0, "subject_matches": []}
+    index = gallery.index
+    index.check_space(len(probe), model)
+    slices = index.subject_slices()
+    compact = gallery.compact
+
+    def member_matches(subject, limit):
+        rows = slices[subject]
+        dists = unit_distances(probe, gallery.members[subject])[0]
+        return [
+            {"path": index.paths[rows.start + r], "distance": d}
+            for r, d in select_top_k(dists, top_k=top_k, threshold=limit)
+        ]
 
-    # Optionally compute subject-level embeddings and compare first (faster, more robust)
+    # Optionally compare against subject-level embeddings first (faster, more robust)
     subject_matches = []
     if use_subject_embeddings:
-        subj_embs = _compute_subject_embeddings(labeled)
-        for subject, s_emb in subj_embs.items():
-            dist = _compare_embedding(probe, s_emb)
-            if dist <= threshold:
-                subject_matches.append(
-                    {"subject": subject, "best_distance": float(dist), "matches": []}
-                )
-        # sort for top-k and if threshold filters none, fall back to image-level
-        subject_matches.sort(key=lambda x: x["best_distance"])
+        if compact is not None:
+            # nearest of a subject's diverse prototypes, not its mean
+            candidates = compact.shortlist(probe, threshold)
+            candidates = [(s, d) for s, d in candidates if d <= threshold]
+        else:
+            prototypes = gallery.prototypes
+            candidates = [
+                (prototypes.subjects[r], d)
+                for r, d in prototypes.search(probe, threshold=threshold)
+            ]
+        subject_matches = [
+            {"subject": subject, "best_distance": d, "matches": []}
+            for subject, d in candidates
+        ]
+        # if threshold filters none, fall back to image-level
         if subject_matches:
             # For each candidate subject, gather image-level matches as details
             for m in subject_matches[:top_k]:
-                items = labeled.get(m["subject"], [])
-                best = []
-                for item in items:
-                    d = _compare_embedding(probe, item.get("embedding"))
-                    best.append({"path": item.get("path"), "distance": float(d)})
-                best.sort(key=lambda x: x["distance"])
-                m["matches"] = best[:top_k]
+                m["matches"] = member_matches(m["subject"], None)
             return {
-                "source": str(image_path),
+                "source": source,
                 "num_subjects": len(subject_matches),
                 "subject_matches": subject_matches,
             }
 
-    # Fallback: exhaustive image-level comparison
-    for subject, items in labeled.items():
-        best = []
-        for item in items:
-            dist = _compare_embedding(probe, item.get("embedding"))
-            if dist <= threshold:
-                best.append({"path": item.get("path"), "distance": float(dist)})
+    # Fallback: image-level comparison, restricted to subjects the prototypes
+    # cannot rule out (all subjects without a compact gallery)
+    if compact is not None:
+        subjects = [s for s, _d in compact.shortlist(probe, threshold)]
+    else:
+        subjects = list(slices)
+    for subject in subjects:
+        best = member_matches(subject, threshold)
         if best:
-            best.sort(key=lambda x: x["distance"])
             subject_matches.append(
                 {
                     "subject": subject,
                     "best_distance": best[0]["distance"],
-                    "matches": best[:top_k],
+                    "matches": best,
                 }
             )
     subject_matches.sort(key=lambda x: x["best_distance"])
     return {
-        "source": str(image_path),
+        "source": source,
         "num_subjects": len(subject_matches),
         "subject_matches": subject_matches,
     }
 
 
+def labeled_gallery_outliers(labeled_gallery_dir: Path) -> dict:
+    """{subject: [path, ...]} of gallery images that look like another person."""
+    gallery = load_gallery(Path(labeled_gallery_dir), labeled=True)
+    compact = gallery.compact or gallery.index.compact(
+        1, outlier_distance=config.FACE_GALLERY_OUTLIER_DISTANCE
+    )
+    return dict(compact.outliers)
+
+
 def aggregate_subject_summary(res: dict):
     """Return per-subject summary list of {'subject','best_distance','best_path'} for labeled results."""
     out = []
@@ -647,8 +1379,37 @@ def _persist_results(db_path: str | Path, res: dict, aggregate: bool = False):
     now = datetime.datetime.now(datetime.timezone.utc)
     source = res.get("source")
 
+    # Video tracks: one row per track (best match only when aggregating)
+    if "tracks" in res:
+        for track in res.get("tracks", []):
+            if "subject_matches" in track:
+                candidates = [
+                    (sm.get("subject"), m.get("path"), m.get("distance"))
+                    for sm in track.get("subject_matches", [])
+                    for m in sm.get("matches", [])[:1]
+                ]
+            else:
+                candidates = [
+                    (None, m.get("gallery_path"), m.get("distance"))
+                    for m in track.get("matches", [])
+                ]
+            candidates.sort(key=lambda c: c[2])
+            for subject, gallery_path, distance in candidates[:1] if aggregate else candidates:
+                session.add(
+                    FaceMatch(
+                        source=source,
+                        probe_bbox=track.get("bbox"),
+                        subject=subject,
+                        gallery_path=gallery_path,
+                        distance=float(distance),
+                        track_start=track.get("start"),
+                        track_end=track.get("end"),
+                        num_detections=track.get("num_detections"),
+                        created_at=now,
+                    )
+                )
     # Labeled gallery format
-    if "subject_matches" in res:
+    elif "subject_matches" in res:
         if aggregate:
             summary = aggregate_subject_summary(res)
             for s in summary:
@@ -762,6 +1523,9 @@ def cli_run(args):
                 interval_seconds=args.interval,
                 threshold=args.threshold,
                 top_k=args.top_k,
+                max_side=getattr(args, "max_side", None),
+                keyframes_only=getattr(args, "keyframes_only", False),
+                adaptive=getattr(args, "adaptive", None),
             )
 
     # Optionally persist to DB
@@ -0,0 +1,130 @@
+"""Link face detections across sampled video frames into tracks.
+
+Without tracking every sampled frame yields independent detections, so one
+person on screen for five minutes produces dozens of near-identical gallery
+searches and FaceMatch rows. :class:`FaceTracker` links detections in
+consecutive samples by bounding-box overlap and embedding distance; each track
+is then matched against the gallery once using its prototype (the normalized
+mean of its embeddings) and persisted with start/end timestamps.
+"""
+
+import numpy as np
+
+from .face_detect import box_iou
+from .face_index import l2_normalize, unit_distances
+
+
+def _box(bbox: dict) -> tuple:
+    return (bbox["top"], bbox["right"], bbox["bottom"], bbox["left"])
+
+
+class FaceTrack:
+    """Detections of one face over time."""
+
+    def __init__(self, track_id: int, timestamp: float, bbox: dict, embedding):
+        self.track_id = track_id
+        self.timestamps = [timestamp]
+        self.bboxes = [bbox]
+        self.embeddings = [embedding]
+
+    @property
+    def start(self) -> float:
+        return self.timestamps[0]
+
+    @property
+    def end(self) -> float:
+        return self.timestamps[-1]
+
+    def add(self, timestamp: float, bbox: dict, embedding):
+        self.timestamps.append(timestamp)
+        self.bboxes.append(bbox)
+        self.embeddings.append(embedding)
+
+    def prototype(self) -> np.ndarray:
+        """L2-normalized mean of the track's normalized embeddings."""
+        return l2_normalize(l2_normalize(self.embeddings).mean(axis=0))[0]
+
+    def best_bbox(self) -> dict:
+        """Largest bounding box in the track (usually the sharpest view)."""
+        return max(
+            self.bboxes, key=lambda b: (b["bottom"] - b["top"]) * (b["right"] - b["left"])
+        )
+
+
+class FaceTracker:
+    """Greedy IoU + embedding tracker for sampled frames.
+
+    A detection continues an active track when its embedding is within
+    `max_distance` of the track's last embedding and its box overlaps the
+    track's last box by at least `iou_threshold`, or, without overlap, when the
+    embedding is within the stricter `reid_distance` (samples can be seconds
+    apart). Tracks not extended for `max_gap` seconds are closed.
+    """
+
+    def __init__(
+        self,
+        iou_threshold: float = 0.3,
+        max_distance: float = 0.6,
+        reid_distance: float = 0.45,
+        max_gap: float = 10.0,
+    ):
+        self.iou_threshold = iou_threshold
+        self.max_distance = max_distance
+        self.reid_distance = reid_distance
+        self.max_gap = max_gap
+        self.active = []
+        self.finished = []
+        self._next_id = 0
+
+    def update(self, timestamp: float, detections: list):
+        """Add one sampled frame's detections (``{'bbox', 'embedding'}`` dicts)."""
+        still_active = []
+        for track in self.active:
+            if timestamp - track.end > self.max_gap:
+                self.finished.append(track)
+            else:
+                still_active.append(track)
+        self.active = still_active
+        dets = [d for d in detections if d.get("embedding") is not None]
+        if not dets:
+            return
+        pairs = []
+        if self.active:
+            dists = unit_distances(
+                [d["embedding"] for d in dets],
+                l2_normalize([t.embeddings[-1] for t in self.active]),
+            )
+            for di, d in enumerate(dets):
+                for ti, track in enumerate(self.active):
+                    dist = float(dists[di, ti])
+                    iou = box_iou(_box(d["bbox"]), _box(track.bboxes[-1]))
+                    if dist <= self.reid_distance or (
+                        dist <= self.max_distance and iou >= self.iou_threshold
+                    ):
+                        pairs.append((dist, di, ti))
+        used_dets = set()
+        used_tracks = set()
+        for dist, di, ti in sorted(pairs):
+            if di in used_dets or ti in used_tracks:
+                continue
+            self.active[ti].add(timestamp, dets[di]["bbox"], dets[di]["embedding"])
+            used_dets.add(di)
+            used_tracks.add(ti)
+        for di, d in enumerate(dets):
+            if di not in used_dets:
+                self.active.append(FaceTrack(self._next_id, timestamp, d["bbox"], d["embedding"]))
+                self._next_id += 1
+
+    def finish(self) -> list:
+        """Close all tracks and return them ordered by track id."""
+        self.finished.extend(self.active)
+        self.active = []
+        return sorted(self.finished, key=lambda t: t.track_id)
+
+
+def track_faces(frames: list, **tracker_opts) -> list:
+    """Build tracks from ``find_faces_in_video`` output."""
+    tracker = FaceTracker(**tracker_opts)
+    for frame in frames:
+        tracker.update(frame.get("timestamp"), frame.get("detections", []))
+    return tracker.finish()
@@ -0,0 +1,183 @@
+"""Shared-memory frame hand-off between a decoding process and detection workers.
+
+Sending a decoded frame (H x W x 3 uint8) to a worker process through a pool
+pickles and copies it twice, which costs more than the face detection it
+feeds. :class:`FrameRing` owns a fixed ring of
+``multiprocessing.shared_memory`` buffers instead: the producer copies each
+frame into a free slot and only a small :class:`FrameDescriptor` (slot,
+segment name, shape, dtype, source, page/timestamp) goes to the worker, which
+maps the slot without copying. A slot returns to the ring when the worker's
+task for it has finished, so at most ``slots`` frames are decoded ahead of
+detection.
+
+:func:`process_frames` drives a ``ProcessPoolExecutor`` over any frame
+iterator (video samples, rendered PDF pages).
+"""
+
+import logging
+import os
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from multiprocessing import shared_memory
+from typing import NamedTuple
+
+import numpy as np
+
+from .. import config
+
+logger = logging.getLogger("case_agent.frame_ring")
+
+
+class FrameDescriptor(NamedTuple):
+    slot: int
+    name: str  # shared memory segment holding the slot
+    shape: tuple
+    dtype: str
+    source: str
+    page: int | None = None
+    timestamp: float | None = None
+    index: int = 0
+
+
+class FrameRing:
+    """Ring of reusable shared-memory frame buffers (producer side).
+
+    Slots start at `slot_bytes` and are re-created larger when a bigger frame
+    arrives. Use as a context manager, or call :meth:`close`, to unlink the
+    segments.
+    """
+
+    def __init__(self, slots: int, slot_bytes: int = 1920 * 1080 * 3):
+        self.slot_bytes = int(slot_bytes)
+        self._buffers = [self._create(self.slot_bytes) for _ in range(max(1, slots))]
+        self._free = list(range(len(self._buffers)))
+
+    @staticmethod
+    def _create(size: int) -> shared_memory.SharedMemory:
+        return shared_memory.SharedMemory(create=True, size=max(1, int(size)))
+
+    def __len__(self):
+        return len(self._buffers)
+
+    @property
+    def free_slots(self) -> int:
+        return len(self._free)
+
+    def put(self, image, source: str, page=None, timestamp=None, index: int = 0):
+        """Copy `image` into a free slot; returns its descriptor or None if full."""
+        if not self._free:
+            return None
+        image = np.asarray(image)
+        slot = self._free.pop()
+        shm = self._buffers[slot]
+        if image.nbytes > shm.size:
+            shm.close()
+            shm.unlink()
+            shm = self._buffers[slot] = self._create(image.nbytes)
+        view = np.ndarray(image.shape, dtype=image.dtype, buffer=shm.buf)
+        view[...] = image
+        del view
+        return FrameDescriptor(
+            slot, shm.name, tuple(image.shape), image.dtype.str, str(source), page, timestamp, index
+        )
+
+    def release(self, desc: FrameDescriptor):
+        """Return a slot to the ring once its worker is done with it."""
+        if desc.slot not in self._free:
+            self._free.append(desc.slot)
+
+    def close(self):
+        for shm in self._buffers:
+            try:
+                shm.close()
+                shm.unlink()
+            except FileNotFoundError:
+                pass
+        self._buffers = []
+        self._free = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# Worker side: segments stay mapped between tasks, keyed by slot
+_attached = {}
+
+
+def attach(desc: FrameDescriptor) -> np.ndarray:
+    """Map the frame of `desc` in this process (no copy).
+
+    The array is only valid until the task handling `desc` returns; copy
+    anything that must outlive it.
+    """
+    cached = _attached.get(desc.slot)
+    if cached is None or cached.name != desc.name:
+        if cached is not None:
+            cached.close()
+        cached = _attached[desc.slot] = shared_memory.SharedMemory(name=desc.name)
+    return np.ndarray(desc.shape, dtype=np.dtype(desc.dtype), buffer=cached.buf)
+
+
+def _init_worker(settings, torch_threads):
+    from . import face_search
+
+    for key, value in settings.items():
+        setattr(config, key, value)
+    face_search.set_torch_threads(torch_threads)
+
+
+def _run_task(task, desc: FrameDescriptor):
+    return task(attach(desc), desc)
+
+
+def process_frames(frames, task, workers: int | None = None, slots: int | None = None):
+    """Run ``task(image, desc)`` on every frame in worker processes.
+
+    `frames` yields ``(image, meta)`` pairs where `meta` may hold 'source',
+    'page', 'timestamp' and 'index'; `task` must be a picklable top-level
+    function (``functools.partial`` is fine) and must not keep references to
+    `image`. Yields ``(desc, result)`` in completion order. Decoding blocks
+    while all `slots` (default two per worker) are in use.
+    """
+    from .face_parallel import _config_snapshot
+
+    workers = max(1, workers or config.FRAME_WORKERS or os.cpu_count() or 1)
+    slots = slots or 2 * workers
+    torch_threads = config.TORCH_NUM_THREADS or max(1, (os.cpu_count() or 1) // workers)
+    with FrameRing(slots) as ring, ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=_init_worker,
+        initargs=(_config_snapshot(), torch_threads),
+    ) as pool:
+        pending = {}
+
+        def drain(block):
+            if not pending:
+                return
+            done, _ = wait(
+                list(pending), timeout=None if block else 0, return_when=FIRST_COMPLETED
+            )
+            for future in done:
+                desc = pending.pop(future)
+                ring.release(desc)
+                try:
+                    yield desc, future.result()
+                except Exception:
+                    logger.exception("Frame task failed for %s", desc.source)
+
+        for image, meta in frames:
+            while not ring.free_slots:
+                yield from drain(block=True)
+            desc = ring.put(
+                image,
+                meta.get("source", ""),
+                page=meta.get("page"),
+                timestamp=meta.get("timestamp"),
+                index=meta.get("index", 0),
+            )
+            pending[pool.submit(_run_task, task, desc)] = desc
+            yield from drain(block=False)
+        while pending:
+            yield from drain(block=True)
@@ -0,0 +1,121 @@
+"""Multi-threaded file hashing for the evidence inventory.
+
+``hashlib`` releases the GIL while it digests buffers larger than 2 KiB, so a
+pool of threads can keep several reads and digests in flight and use the
+bandwidth of NVMe or RAID storage that a single 8 KiB read loop leaves idle.
+
+- :func:`hash_file` hashes one file in one read pass, updating every requested
+  digest (e.g. sha256 plus md5/sha1 for exchange with other forensic tools)
+  from the same block. Blocks are read with ``readinto`` into a reusable
+  buffer; files of at least `mmap_threshold` bytes are memory-mapped instead.
+- :class:`HashEngine` runs :func:`hash_file` over many paths in a thread pool
+  with one preallocated buffer per thread.
+"""
+
+import hashlib
+import logging
+import mmap
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from .. import config
+
+logger = logging.getLogger("case_agent.hash_engine")
+
+
+def default_workers() -> int:
+    return config.HASH_WORKERS or min(8, os.cpu_count() or 1)
+
+
+def hash_file(
+    path: Path,
+    algorithms=("sha256",),
+    block_size: int | None = None,
+    buffer: bytearray | None = None,
+    mmap_threshold: int | None = None,
+) -> dict:
+    """Return {algorithm: hexdigest} for `path`, read once.
+
+    `buffer` (at least one byte) is reused for reads when given; its length is
+    the block size. `mmap_threshold` of 0 disables memory mapping.
+    """
+    digests = [hashlib.new(name) for name in algorithms]
+    if mmap_threshold is None:
+        mmap_threshold = config.HASH_MMAP_THRESHOLD
+    with open(path, "rb", buffering=0) as f:
+        size = os.fstat(f.fileno()).st_size
+        if buffer is None:
+            # one-off calls: no bigger than the file
+            buffer = bytearray(max(1, min(block_size or config.HASH_BLOCK_SIZE, size)))
+        view = memoryview(buffer)
+        step = len(buffer)
+        if mmap_threshold and size >= mmap_threshold:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                data = memoryview(mm)
+                try:
+                    for start in range(0, size, step):
+                        block = data[start : start + step]
+                        for h in digests:
+                            h.update(block)
+                        block.release()
+                finally:
+                    data.release()
+        else:
+            while True:
+                n = f.readinto(view)
+                if not n:
+                    break
+                block = view[:n]
+                for h in digests:
+                    h.update(block)
+    return {name: h.hexdigest() for name, h in zip(algorithms, digests)}
+
+
+class HashEngine:
+    """Hash many files concurrently.
+
+    Parameters default to ``config.HASH_WORKERS``, ``HASH_BLOCK_SIZE``,
+    ``HASH_ALGORITHMS`` and ``HASH_MMAP_THRESHOLD``. Each worker thread
+    allocates one `block_size` buffer and reuses it for every file.
+    """
+
+    def __init__(self, workers=None, block_size=None, algorithms=None, mmap_threshold=None):
+        self.workers = max(1, workers or default_workers())
+        self.block_size = int(block_size or config.HASH_BLOCK_SIZE)
+        algorithms = tuple(algorithms or config.HASH_ALGORITHMS)
+        # sha256 is the inventory key, so it is always computed
+        self.algorithms = algorithms if "sha256" in algorithms else ("sha256",) + algorithms
+        self.mmap_threshold = (
+            config.HASH_MMAP_THRESHOLD if mmap_threshold is None else mmap_threshold
+        )
+        self._local = threading.local()
+
+    def _buffer(self) -> bytearray:
+        buf = getattr(self._local, "buffer", None)
+        if buf is None:
+            buf = self._local.buffer = bytearray(self.block_size)
+        return buf
+
+    def hash(self, path) -> dict:
+        return hash_file(
+            path, self.algorithms, buffer=self._buffer(), mmap_threshold=self.mmap_threshold
+        )
+
+    def _try_hash(self, path):
+        try:
+            return path, self.hash(path)
+        except OSError as e:
+            logger.warning("Could not hash %s: %s", path, e)
+            return path, None
+
+    def map(self, paths):
+        """Yield ``(path, digests)`` in input order; `digests` is None for
+        files that could not be read."""
+        paths = list(paths)
+        if self.workers == 1 or len(paths) < 2:
+            yield from map(self._try_hash, paths)
+            return
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="hash") as pool:
+            yield from pool.map(self._try_hash, paths)
@@ -1,79 +1,318 @@
-"""Walk a directory, compute SHA256 for files, and store inventory in the DB."""
-import hashlib
+"""Walk a directory, compute SHA256 for files, and store inventory in the DB.
+
+Reruns only hash new or changed files (see :func:`walk_and_hash`); hashing
+runs in a thread pool (see hash_engine).
+"""
 import os
 from pathlib import Path
 import logging
 from ..db.init_db import get_session, init_db
-from ..db.models import EvidenceFile
-from ..config import CHUNK_SIZE
+from ..db.models import EvidenceFile, FileLocation
+from .file_walker import manifest_files, scan_tree
+from .hash_engine import HashEngine, hash_file
 import datetime
 
 logger = logging.getLogger("case_agent.hash_inventory")
 
 
 def sha256_file(path: Path) -> str:
-    h = hashlib.sha256()
-    with path.open("rb") as f:
-        while True:
-            chunk = f.read(CHUNK_SIZE)
-            if not chunk:
-                break
-            h.update(chunk)
-    return h.hexdigest()
+    return hash_file(path, ("sha256",))["sha256"]
+
+
+class Inventory(list):
+    """List of {"path", "sha256"} dicts from :func:`walk_and_hash`.
+
+    Entries of copies of content already inventoried under another path carry
+    'duplicate_of' (that path); :meth:`unique` leaves them out. Hashed entries
+    also carry any extra digests (config.HASH_ALGORITHMS).
+
+    `summary` counts the files seen and how each was handled: skipped
+    (unchanged, not re-read), hashed, added, changed, moved, restored (content
+    flagged deleted that reappeared), duplicates, deleted, mismatched (verify mode: content changed although size/mtime/inode
+    did not) and failed (unreadable).
+    """
+
+    def __init__(self, files=(), summary=None):
+        super().__init__(files)
+        self.summary = summary or {}
+
+    def unique(self) -> list:
+        """One entry per content: the entries without 'duplicate_of'."""
+        return [f for f in self if "duplicate_of" not in f]
+
+    def duplicate_paths(self) -> set:
+        return {f["path"] for f in self if "duplicate_of" in f}
+
+
+def _stat_key(size, mtime_ns, inode):
+    return (size, mtime_ns, inode)
+
+
+def _file_key(stat):
+    return _stat_key(stat.st_size, stat.st_mtime_ns, stat.st_ino)
+
+
+def _loc_key(loc):
+    return _stat_key(loc.size, loc.mtime_ns, loc.inode)
+
+
+def _set_digests(row, digests):
+    extra = {k: v for k, v in digests.items() if k != "sha256"}
+    if extra:
+        # Reassign so SQLAlchemy notices the JSON change
+        row.file_metadata = dict(row.file_metadata or {}, digests=extra)
+
+
+def _set_stat(row, stat):
+    row.size = stat.st_size
+    row.mtime = datetime.datetime.fromtimestamp(stat.st_mtime)
+    row.mtime_ns = stat.st_mtime_ns
+    row.inode = stat.st_ino
 
 
-def walk_and_hash(evidence_dir: Path, db_path=None, commit=True):
+def _set_location(loc, stat):
+    loc.size = stat.st_size
+    loc.mtime_ns = stat.st_mtime_ns
+    loc.inode = stat.st_ino
+
+
+def walk_and_hash(evidence_dir: Path, db_path=None, commit=True, verify=False, engine: HashEngine | None = None, files=None):
     """Walk the evidence directory, compute SHA256, and upsert into DB.
-    Returns a list of dicts with file info.
+
+    ``evidence_files`` has one row per unique content; every path is recorded
+    in ``file_locations``, so duplicate copies keep their provenance and later
+    stages can process each content once (see :meth:`Inventory.unique`).
+
+    Incremental: a path whose size, mtime_ns and inode match its location is
+    trusted and not re-read, and a file that only moved (same size, mtime_ns
+    and inode as a location whose path disappeared) keeps its hash. Content
+    with no remaining path is flagged with ``file_metadata['deleted_at']``.
+    `verify` re-hashes every file. Files are hashed by `engine` (default: a
+    :class:`HashEngine` from config). Returns an :class:`Inventory` (a list of
+    dicts with file info and a `summary` of counters).
+
+    The tree is listed once with parallel ``os.scandir`` (file_walker); pass
+    `files` (``[(path, stat_result)]``, e.g. from ``file_walker.manifest_files``)
+    to inventory a prebuilt list instead. Paths under `evidence_dir` missing
+    from such a list only count as moved or deleted if they no longer exist.
+    The resulting file list is kept in ``file_locations``; later stages read
+    it with :func:`inventoried_files`.
     """
     init_db(db_path) if db_path is not None else init_db()
     session = get_session()
-    files = []
-    for root, dirs, filenames in os.walk(evidence_dir):
-        for fn in filenames:
-            p = Path(root) / fn
-            try:
-                stat = p.stat()
-            except OSError as e:
-                logger.warning("Skipping %s: %s", p, e)
+    summary = dict.fromkeys(
+        ("files", "skipped", "hashed", "added", "changed", "moved", "restored", "duplicates", "deleted", "mismatched", "failed"), 0
+    )
+
+    complete = files is None
+    found = [(Path(path), stat) for path, stat in (scan_tree(evidence_dir) if complete else files)]
+    seen = {str(p) for p, _ in found}
+
+    prefix = str(Path(evidence_dir))
+    prefix = prefix if prefix.endswith(os.sep) else prefix + os.sep
+    locations = {
+        loc.path: loc
+        for loc in session.query(FileLocation).filter(FileLocation.path.startswith(prefix, autoescape=True))
+    }
+    # inventories from before file_locations: one location per content row
+    for row in session.query(EvidenceFile).filter(EvidenceFile.path.startswith(prefix, autoescape=True)):
+        if row.path not in locations and not (row.file_metadata or {}).get("deleted_at"):
+            locations[row.path] = FileLocation(file=row, path=row.path, size=row.size, mtime_ns=row.mtime_ns, inode=row.inode)
+            session.add(locations[row.path])
+    # locations whose file disappeared: candidates for a move, else deleted
+    gone = {path for path in locations if path not in seen and (complete or not os.path.exists(path))}
+    vanished = {_loc_key(loc): loc for path, loc in locations.items() if path in gone and loc.mtime_ns is not None}
+
+    def relocate(loc, path):
+        del locations[loc.path]
+        vanished.pop(_loc_key(loc), None)
+        if loc.file.path == loc.path:
+            loc.file.path = path
+        loc.path = path
+        locations[path] = loc
+
+    # decide from the stat results which files need reading, then hash those in parallel
+    results = [None] * len(found)
+    to_hash = []
+    for i, (p, stat) in enumerate(found):
+        path = str(p)
+        loc = locations.get(path)
+        summary["files"] += 1
+        if not verify:
+            if loc is not None and _loc_key(loc) == _file_key(stat):
+                summary["skipped"] += 1
+                results[i] = (loc.file, None)
+                continue
+            # without an inode, size and mtime alone do not identify a file
+            moved = vanished.get(_file_key(stat)) if loc is None and stat.st_ino else None
+            if moved is not None:
+                logger.info("Moved %s -> %s", moved.path, path)
+                relocate(moved, path)
+                summary["moved"] += 1
+                results[i] = (moved.file, None)
                 continue
-            sha = sha256_file(p)
-            file_row = session.query(EvidenceFile).filter_by(sha256=sha).first()
-            if not file_row:
-                file_row = EvidenceFile(
-                    path=str(p),
-                    size=stat.st_size,
-                    mtime=datetime.datetime.fromtimestamp(stat.st_mtime),
-                    sha256=sha,
-                    processed=False,
+        to_hash.append(i)
+
+    engine = engine or HashEngine()
+    for i, (p, digests) in zip(to_hash, engine.map(found[i][0] for i in to_hash)):
+        if digests is None:
+            summary["failed"] += 1
+            continue
+        stat = found[i][1]
+        path = str(p)
+        sha = digests["sha256"]
+        summary["hashed"] += 1
+        row = session.query(EvidenceFile).filter_by(sha256=sha).first()
+        loc = locations.get(path)
+        if loc is not None:
+            old = loc.file
+            if old.sha256 != sha:
+                if _loc_key(loc) == _file_key(stat):
+                    summary["mismatched"] += 1
+                    logger.warning("Content of %s changed without a size/mtime change", path)
+                else:
+                    summary["changed"] += 1
+                    logger.info("Changed %s", path)
+                other = (
+                    session.query(FileLocation)
+                    .filter(FileLocation.file_id == old.id, FileLocation.path != path)
+                    .first()
+                    if old.id is not None
+                    else None
                 )
-                session.add(file_row)
-                logger.info("Added %s", p)
-            else:
-                # Update metadata if changed
-                updated = False
-                if file_row.size != stat.st_size:
-                    file_row.size = stat.st_size
-                    updated = True
-                mtime_dt = datetime.datetime.fromtimestamp(stat.st_mtime)
-                if file_row.mtime != mtime_dt:
-                    file_row.mtime = mtime_dt
-                    updated = True
-                if updated:
-                    logger.info("Updated metadata for %s", p)
-            files.append({"path": str(p), "sha256": sha})
+                if row is None and other is None:
+                    # the only copy of the old content changed in place
+                    old.sha256 = sha
+                    row = old
+                elif old.path == path:
+                    if other is not None:
+                        # the old content lives on at its other path(s)
+                        old.path = other.path
+                    else:
+                        old.file_metadata = dict(old.file_metadata or {}, deleted_at=datetime.datetime.now(datetime.timezone.utc).isoformat())
+                if row is None:
+                    row = EvidenceFile(path=path, sha256=sha, processed=False, file_metadata={})
+                    session.add(row)
+                    summary["added"] += 1
+                loc.file = row
+            if row.path == path:
+                _set_stat(row, stat)
+            _set_location(loc, stat)
+            _set_digests(row, digests)
+            results[i] = (row, digests)
+            continue
+        if row is None:
+            row = EvidenceFile(path=path, sha256=sha, processed=False, file_metadata={})
+            _set_stat(row, stat)
+            _set_digests(row, digests)
+            session.add(row)
+            summary["added"] += 1
+            logger.info("Added %s", p)
+        elif (row.file_metadata or {}).get("deleted_at"):
+            # content flagged deleted by an earlier run is back
+            logger.info("Restored %s", path)
+            row.file_metadata = {k: v for k, v in row.file_metadata.items() if k != "deleted_at"}
+            row.path = path
+            _set_stat(row, stat)
+            summary["restored"] += 1
+        elif row.path not in seen and not Path(row.path).exists():
+            # same content at a new path: a move (or a copy whose original is gone)
+            logger.info("Moved %s -> %s", row.path, path)
+            loc = locations.get(row.path)
+            if loc is not None:
+                relocate(loc, path)
+            row.path = path
+            _set_stat(row, stat)
+            summary["moved"] += 1
+        elif row.path != path:
+            summary["duplicates"] += 1
+            logger.info("Duplicate of %s: %s", row.path, path)
+        if loc is None:
+            loc = locations[path] = FileLocation(file=row, path=path)
+            session.add(loc)
+        _set_location(loc, stat)
+        results[i] = (row, digests)
+
+    now = datetime.datetime.now(datetime.timezone.utc).isoformat()
+    live = {}
+    for path, loc in locations.items():
+        if path not in gone:
+            live.setdefault(id(loc.file), path)
+    for path, loc in list(locations.items()):
+        row = loc.file
+        # Reassign file_metadata so SQLAlchemy notices the JSON change
+        meta = row.file_metadata or {}
+        if path in seen:
+            if "deleted_at" in meta:
+                row.file_metadata = {k: v for k, v in meta.items() if k != "deleted_at"}
+            continue
+        if path not in gone:
+            continue
+        del locations[path]
+        if loc in session.new:
+            session.expunge(loc)
+        else:
+            session.delete(loc)
+        summary["deleted"] += 1
+        logger.info("Deleted %s", path)
+        if id(row) in live:
+            if row.path == path:
+                row.path = live[id(row)]
+        elif not meta.get("deleted_at"):
+            row.file_metadata = dict(meta, deleted_at=now)
+
+    files = Inventory(summary=summary)
+    for (p, _), res in zip(found, results):
+        if res is None:
+            continue
+        row, digests = res
+        entry = dict(digests or {"sha256": row.sha256}, path=str(p))
+        if row.path != str(p):
+            entry["duplicate_of"] = row.path
+        files.append(entry)
     if commit:
         session.commit()
+    logger.info("Inventory of %s: %s", evidence_dir, summary)
     return files
 
 
+def inventoried_files(evidence_dir: Path, db_path=None, unique=True) -> list:
+    """Paths under `evidence_dir` recorded by the last inventory, sorted.
+
+    Lets later stages iterate the evidence without walking the file system
+    again. With `unique` only one path per content is returned (copies
+    recorded by :func:`walk_and_hash` are left out), and content flagged as
+    deleted is skipped.
+    """
+    init_db(db_path) if db_path is not None else init_db()
+    session = get_session()
+    prefix = str(Path(evidence_dir))
+    prefix = prefix if prefix.endswith(os.sep) else prefix + os.sep
+    try:
+        query = session.query(FileLocation.path, EvidenceFile.path, EvidenceFile.file_metadata).join(
+            EvidenceFile, FileLocation.file_id == EvidenceFile.id
+        )
+        rows = query.filter(FileLocation.path.startswith(prefix, autoescape=True)).all()
+    finally:
+        session.close()
+    return sorted(
+        Path(path)
+        for path, canonical, meta in rows
+        if not (unique and path != canonical) and not (meta or {}).get("deleted_at")
+    )
+
+
 if __name__ == "__main__":
     import argparse
     from ..config import DEFAULT_EVIDENCE_DIR
 
     parser = argparse.ArgumentParser(description="Inventory evidence and compute SHA256 hashes")
     parser.add_argument("evidence_dir", nargs="?", default=str(DEFAULT_EVIDENCE_DIR))
+    parser.add_argument("--verify", action="store_true", help="Re-hash every file instead of trusting unchanged size/mtime/inode")
+    parser.add_argument("--manifest", help="Inventory the files listed in this manifest ('-' = stdin) instead of walking evidence_dir")
     args = parser.parse_args()
     print("Scanning:", args.evidence_dir)
-    result = walk_and_hash(Path(args.evidence_dir))
+    files = manifest_files(args.manifest, root=args.evidence_dir) if args.manifest else None
+    result = walk_and_hash(Path(args.evidence_dir), verify=args.verify, files=files)
     print(f"Discovered {len(result)} files")
+    print("Summary:", result.summary)
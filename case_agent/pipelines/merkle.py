@@ -0,0 +1,312 @@
+"""Merkle-tree integrity manifest over the evidence inventory.
+
+:func:`build_manifest` brings the inventory up to date (see hash_inventory)
+and stores a tree of the evidence folder in ``merkle_nodes``: one leaf per
+file (its sha256) and one node per directory hashed from its children's names
+and hashes, up to a single root hash for the whole case. :func:`export_root`
+writes that root hash with the examiner's sign-off to a JSON file for the
+custody record.
+
+Every node also carries a metadata hash over names, sizes and mtimes only.
+:func:`verify_manifest` lists the folder (no reads), recomputes the metadata
+hashes and descends only into directories where they differ, re-hashing just
+the files that were added or whose size/mtime changed. Unchanged subtrees
+are trusted unless picked for a random spot check (`sample`) or `full` is
+given. The report names exactly which files were added, removed or modified.
+"""
+
+import datetime
+import getpass
+import hashlib
+import json
+import logging
+import os
+import posixpath
+import random
+from collections import defaultdict
+from pathlib import Path
+
+from ..db.init_db import get_session, init_db
+from ..db.models import EvidenceFile, FileLocation, MerkleNode
+from .file_walker import scan_tree
+from .hash_engine import HashEngine
+from .hash_inventory import walk_and_hash
+
+logger = logging.getLogger("case_agent.merkle")
+
+ALGORITHM = "sha256-merkle-v1"
+
+
+def _digest(*parts) -> str:
+    # length-prefixed, so ("ab", "c") and ("a", "bc") hash differently
+    h = hashlib.sha256()
+    for part in parts:
+        data = str(part).encode("utf-8")
+        h.update(len(data).to_bytes(8, "little"))
+        h.update(data)
+    return h.hexdigest()
+
+
+def _session(db_path=None):
+    init_db(db_path) if db_path is not None else init_db()
+    return get_session()
+
+
+def _root_key(evidence_dir) -> str:
+    return str(Path(evidence_dir))
+
+
+def _depth(path: str) -> int:
+    return path.count("/") + 1 if path else 0
+
+
+def tree_hashes(files: dict) -> dict:
+    """Hash a tree bottom-up.
+
+    `files` maps '/'-separated paths relative to the root to
+    ``(size, mtime_ns, sha256)``; sha256 may be None when only the metadata
+    hashes are needed. Returns ``{dir: {"hash", "meta_hash", "size",
+    "file_count"}}`` for every directory, '' being the root.
+    """
+    children = defaultdict(list)
+    dirs = {""}
+    for rel in files:
+        parent = posixpath.dirname(rel)
+        children[parent].append((posixpath.basename(rel), "F", rel))
+        while parent not in dirs:
+            dirs.add(parent)
+            grand = posixpath.dirname(parent)
+            children[grand].append((posixpath.basename(parent), "D", parent))
+            parent = grand
+    out = {}
+    for d in sorted(dirs, key=_depth, reverse=True):
+        content, meta, size, count = [], [], 0, 0
+        for name, kind, key in sorted(children[d]):
+            if kind == "F":
+                fsize, mtime_ns, sha = files[key]
+                content += ["F", name, sha]
+                meta += ["F", name, fsize, mtime_ns]
+                size += fsize
+                count += 1
+            else:
+                node = out[key]
+                content += ["D", name, node["hash"]]
+                meta += ["D", name, node["meta_hash"]]
+                size += node["size"]
+                count += node["file_count"]
+        out[d] = {"hash": _digest(*content), "meta_hash": _digest(*meta), "size": size, "file_count": count}
+    return out
+
+
+def _file_meta_hash(rel: str, size, mtime_ns) -> str:
+    return _digest("F", posixpath.basename(rel), size, mtime_ns)
+
+
+def build_manifest(evidence_dir: Path, db_path=None, inventory=True) -> dict:
+    """Store the Merkle tree of `evidence_dir` and return its root record.
+
+    With `inventory` the folder is inventoried first (incremental: only new or
+    changed files are read). A previous tree of the same folder is replaced.
+    """
+    root = _root_key(evidence_dir)
+    if inventory:
+        walk_and_hash(Path(evidence_dir), db_path=db_path)
+    prefix = root if root.endswith(os.sep) else root + os.sep
+    session = _session(db_path)
+    try:
+        rows = (
+            session.query(FileLocation.path, FileLocation.size, FileLocation.mtime_ns, EvidenceFile.sha256)
+            .join(EvidenceFile, FileLocation.file_id == EvidenceFile.id)
+            .filter(FileLocation.path.startswith(prefix, autoescape=True))
+            .all()
+        )
+        files = {
+            Path(path).relative_to(root).as_posix(): (size or 0, mtime_ns, sha)
+            for path, size, mtime_ns, sha in rows
+        }
+        dirs = tree_hashes(files)
+        now = datetime.datetime.utcnow()
+        nodes = [
+            {
+                "root": root, "path": rel, "parent": posixpath.dirname(rel), "kind": "file",
+                "hash": sha, "meta_hash": _file_meta_hash(rel, size, mtime_ns), "sha256": sha,
+                "size": size, "mtime_ns": mtime_ns, "file_count": 1, "built_at": now,
+            }
+            for rel, (size, mtime_ns, sha) in files.items()
+        ]
+        nodes += [
+            {
+                "root": root, "path": rel, "parent": posixpath.dirname(rel) if rel else None,
+                "kind": "dir", "hash": node["hash"], "meta_hash": node["meta_hash"],
+                "size": node["size"], "file_count": node["file_count"], "built_at": now,
+            }
+            for rel, node in dirs.items()
+        ]
+        session.query(MerkleNode).filter_by(root=root).delete()
+        session.bulk_insert_mappings(MerkleNode, nodes)
+        session.commit()
+    finally:
+        session.close()
+    logger.info("Merkle tree of %s: %d files, %d directories, root %s", root, len(files), len(dirs), dirs[""]["hash"])
+    return root_record(evidence_dir, db_path)
+
+
+def root_record(evidence_dir: Path, db_path=None) -> dict | None:
+    """The stored root of `evidence_dir`'s tree, or None if none was built."""
+    root = _root_key(evidence_dir)
+    session = _session(db_path)
+    try:
+        node = session.query(MerkleNode).filter_by(root=root, path="", kind="dir").one_or_none()
+        if node is None:
+            return None
+        return {
+            "evidence_dir": root,
+            "algorithm": ALGORITHM,
+            "root_hash": node.hash,
+            "files": node.file_count,
+            "total_size": node.size,
+            "built_at": node.built_at.isoformat(),
+        }
+    finally:
+        session.close()
+
+
+def export_root(evidence_dir: Path, out_path: Path, db_path=None, signed_off_by=None) -> dict:
+    """Write the root record with the examiner's name and a timestamp to
+    `out_path` (JSON). The sign-off records who attested the hash; it is not
+    a cryptographic signature."""
+    record = root_record(evidence_dir, db_path)
+    if record is None:
+        raise ValueError(f"No integrity manifest for {_root_key(evidence_dir)}; build it first")
+    record["signed_off_by"] = signed_off_by or getpass.getuser()
+    record["signed_off_at"] = datetime.datetime.utcnow().isoformat()
+    Path(out_path).write_text(json.dumps(record, indent=2), encoding="utf-8")
+    return record
+
+
+def verify_manifest(
+    evidence_dir: Path, db_path=None, sample: float = 0.0, full=False, seed=None, engine: HashEngine | None = None
+) -> dict:
+    """Check `evidence_dir` against its stored tree.
+
+    Directories whose metadata hash is unchanged are skipped with their whole
+    subtree; with `sample` each of them is instead spot-checked (all its files
+    re-hashed) with that probability, and `full` re-hashes everything. In
+    changed directories only added files and files whose size/mtime differ
+    are re-hashed.
+
+    The report holds the recomputed and stored root hashes, `intact`, the
+    changed and sampled directories, and the paths (relative, '/'-separated)
+    that were added, removed, modified, touched (metadata changed, same
+    content), mismatched (content changed although metadata did not) or
+    unreadable, plus how many files and bytes were read.
+    """
+    root = _root_key(evidence_dir)
+    session = _session(db_path)
+    try:
+        stored = session.query(MerkleNode).filter_by(root=root).all()
+        session.expunge_all()
+    finally:
+        session.close()
+    if not stored:
+        raise ValueError(f"No integrity manifest for {root}; build it first")
+    stored_files = {n.path: n for n in stored if n.kind == "file"}
+    stored_dirs = {n.path: n for n in stored if n.kind == "dir"}
+
+    current = {
+        Path(path).relative_to(root).as_posix(): (stat.st_size, stat.st_mtime_ns, None)
+        for path, stat in scan_tree(root)
+    }
+    current_dirs = tree_hashes(current)
+
+    files_in, subdirs = defaultdict(set), defaultdict(set)
+    for rel in stored_files.keys() | current.keys():
+        files_in[posixpath.dirname(rel)].add(rel)
+    for rel in stored_dirs.keys() | current_dirs.keys():
+        if rel:
+            subdirs[posixpath.dirname(rel)].add(rel)
+
+    rng = random.Random(seed)
+    report = {k: [] for k in ("changed_dirs", "sampled_dirs", "added", "removed", "modified", "touched", "mismatched", "unreadable")}
+    to_hash = []
+    stack = [""]
+    while stack:
+        d = stack.pop()
+        s, c = stored_dirs.get(d), current_dirs.get(d)
+        unchanged = s is not None and c is not None and s.meta_hash == c["meta_hash"]
+        if unchanged and not full:
+            if sample:
+                if rng.random() < sample:
+                    report["sampled_dirs"].append(d)
+                    to_hash.extend(files_in[d])
+                stack.extend(subdirs[d])
+            continue
+        if not unchanged:
+            report["changed_dirs"].append(d)
+        for rel in files_in[d]:
+            sf, cf = stored_files.get(rel), current.get(rel)
+            if cf is None:
+                report["removed"].append(rel)
+            elif sf is None:
+                report["added"].append(rel)
+                to_hash.append(rel)
+            elif full or (sf.size, sf.mtime_ns) != cf[:2]:
+                to_hash.append(rel)
+        stack.extend(subdirs[d])
+
+    engine = engine or HashEngine()
+    new_sha = {}
+    bytes_hashed = 0
+    for path, digests in engine.map(Path(root) / rel for rel in to_hash):
+        rel = path.relative_to(root).as_posix()
+        if digests is None:
+            report["unreadable"].append(rel)
+            continue
+        new_sha[rel] = digests["sha256"]
+        bytes_hashed += current[rel][0]
+        sf = stored_files.get(rel)
+        if sf is None:
+            continue
+        same_meta = (sf.size, sf.mtime_ns) == current[rel][:2]
+        if sf.sha256 != new_sha[rel]:
+            report["mismatched" if same_meta else "modified"].append(rel)
+        elif not same_meta:
+            report["touched"].append(rel)
+
+    # files not read keep their stored hash; unreadable new files cannot match
+    leaves = {
+        rel: (size, mtime_ns, new_sha.get(rel) or getattr(stored_files.get(rel), "sha256", None))
+        for rel, (size, mtime_ns, _sha) in current.items()
+    }
+    root_hash = tree_hashes(leaves)[""]["hash"]
+    stored_root = stored_dirs[""].hash
+    report = {k: sorted(v) for k, v in report.items()}
+    report.update(
+        evidence_dir=root,
+        intact=root_hash == stored_root and not report["unreadable"],
+        root_hash=root_hash,
+        stored_root_hash=stored_root,
+        files=len(current),
+        files_hashed=len(new_sha),
+        bytes_hashed=bytes_hashed,
+    )
+    logger.info(
+        "Verified %s: %s (%d of %d files read)",
+        root, "intact" if report["intact"] else "CHANGED", len(new_sha), len(current),
+    )
+    return report
+
+
+def cli_run(args):
+    evidence = Path(args.evidence)
+    if args.action == "build":
+        result = build_manifest(evidence, db_path=args.db)
+    elif args.action == "verify":
+        result = verify_manifest(evidence, db_path=args.db, sample=args.sample, full=args.full)
+    else:
+        if not args.out:
+            raise SystemExit("--out is required for export")
+        result = export_root(evidence, Path(args.out), db_path=args.db, signed_off_by=args.signed_off_by)
+    print(json.dumps(result, indent=2))
+    if args.action == "verify" and not result["intact"]:
+        raise SystemExit(1)
@@ -0,0 +1,310 @@
+"""Sequential video frame sampling.
+
+Seeking with ``cap.set(CAP_PROP_POS_FRAMES, n)`` before every sample makes most
+codecs decode again from the previous keyframe, so sampling a long video costs
+far more than playing it. The sources here decode the stream once, front to
+back, and yield only the sampled frames:
+
+- ``cv2``: ``VideoCapture.grab()`` advances past skipped frames without
+  converting them; ``retrieve()`` decodes only the frames that are kept.
+- ``ffmpeg``: an ``fps=`` filter (or ``-skip_frame nokey`` for keyframe-only
+  sampling) piped out as raw RGB, optionally scaled by ffmpeg itself.
+
+Both yield :class:`VideoFrame` tuples with an RGB uint8 image, so callers feed
+whichever face detector is available.
+
+:class:`SceneSampler` adds scene-change-aware sampling on top: frames are
+examined at a short probe interval, but only frames whose dHash differs from
+the last detected frame (plus a dense burst after each change and a periodic
+heartbeat) are passed on to face detection.
+"""
+
+import json
+import logging
+import queue
+import re
+import shutil
+import subprocess
+import threading
+from collections import deque
+from pathlib import Path
+from typing import NamedTuple
+
+import numpy as np
+
+from .. import config
+from .face_detect import downscale
+
+logger = logging.getLogger("case_agent.video_frames")
+
+try:
+    import cv2
+except Exception:
+    cv2 = None
+
+
+class VideoFrame(NamedTuple):
+    index: int  # position among the sampled frames
+    timestamp: float  # seconds from the start of the video
+    image: np.ndarray  # RGB uint8, possibly downscaled to max_side
+
+
+def _ffmpeg_tool(name: str) -> str | None:
+    """Locate ffmpeg/ffprobe: next to config.FFMPEG_PATH, else on PATH."""
+    configured = Path(config.FFMPEG_PATH)
+    candidate = configured.with_name(name + configured.suffix)
+    if candidate.exists():
+        return str(candidate)
+    return shutil.which(name)
+
+
+def _probe(video_path: Path, ffprobe: str) -> dict | None:
+    cmd = [
+        ffprobe,
+        "-v",
+        "error",
+        "-select_streams",
+        "v:0",
+        "-show_entries",
+        "stream=width,height",
+        "-of",
+        "json",
+        str(video_path),
+    ]
+    try:
+        out = subprocess.run(cmd, check=True, capture_output=True).stdout
+        stream = json.loads(out)["streams"][0]
+        return {"width": int(stream["width"]), "height": int(stream["height"])}
+    except Exception:
+        logger.exception("ffprobe failed for %s", video_path)
+        return None
+
+
+def _scaled_size(width: int, height: int, max_side: int | None) -> tuple:
+    """Even output dimensions with the longest side at most `max_side`."""
+    if max_side and max(width, height) > max_side:
+        scale = max_side / float(max(width, height))
+        width, height = int(width * scale), int(height * scale)
+    return max(2, width - width % 2), max(2, height - height % 2)
+
+
+_PTS_RE = re.compile(r"pts_time:\s*([0-9.]+)")
+
+
+def _read_timestamps(stderr, out: queue.Queue, messages: deque):
+    """Forward showinfo ``pts_time`` values from ffmpeg's stderr to `out`;
+    other lines are kept in `messages` for error reporting."""
+    for line in iter(stderr.readline, b""):
+        text = line.decode("utf-8", "replace")
+        m = _PTS_RE.search(text)
+        if m:
+            out.put(float(m.group(1)))
+        else:
+            messages.append(text.rstrip())
+
+
+def iter_frames_ffmpeg(
+    video_path: Path,
+    interval_seconds: float = 5.0,
+    max_side: int | None = None,
+    keyframes_only: bool = False,
+):
+    """Yield sampled frames decoded by an ffmpeg pipe (see module docstring)."""
+    ffmpeg = _ffmpeg_tool("ffmpeg")
+    ffprobe = _ffmpeg_tool("ffprobe")
+    if ffmpeg is None or ffprobe is None:
+        logger.warning("ffmpeg/ffprobe not found; cannot sample %s", video_path)
+        return
+    info = _probe(video_path, ffprobe)
+    if info is None:
+        return
+    width, height = _scaled_size(info["width"], info["height"], max_side)
+    filters = [] if keyframes_only else [f"fps=1/{interval_seconds}"]
+    filters += [f"scale={width}:{height}", "showinfo"]
+    cmd = [ffmpeg, "-v", "info", "-nostdin", "-noautorotate"]
+    if keyframes_only:
+        cmd += ["-skip_frame", "nokey"]
+    cmd += ["-i", str(video_path), "-an", "-vf", ",".join(filters)]
+    if keyframes_only:
+        # -fps_mode only exists from ffmpeg 5.1; -vsync is accepted by 4.x and later
+        cmd += ["-vsync", "vfr"]
+    cmd += ["-f", "rawvideo", "-pix_fmt", "rgb24", "-"]
+    frame_bytes = width * height * 3
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    timestamps = queue.Queue()
+    messages = deque(maxlen=20)
+    reader = threading.Thread(
+        target=_read_timestamps, args=(proc.stderr, timestamps, messages), daemon=True
+    )
+    reader.start()
+    index = 0
+    finished = False
+    try:
+        while True:
+            buf = proc.stdout.read(frame_bytes)
+            if len(buf) < frame_bytes:
+                finished = True
+                break
+            try:
+                ts = timestamps.get(timeout=1.0)
+            except queue.Empty:
+                ts = index * interval_seconds
+            image = np.frombuffer(buf, dtype=np.uint8).reshape(height, width, 3)
+            yield VideoFrame(index, ts, image)
+            index += 1
+    finally:
+        proc.stdout.close()
+        if not finished and proc.poll() is None:
+            # the caller stopped early
+            proc.kill()
+        proc.wait()
+        reader.join(timeout=1.0)
+        if finished and proc.returncode:
+            logger.error(
+                "ffmpeg failed on %s (exit %s) after %d frames: %s",
+                video_path,
+                proc.returncode,
+                index,
+                "\n".join(messages),
+            )
+
+
+def iter_frames_cv2(
+    video_path: Path, interval_seconds: float = 5.0, max_side: int | None = None
+):
+    """Yield sampled frames decoded sequentially with ``VideoCapture.grab()``."""
+    cap = cv2.VideoCapture(str(video_path))
+    if not cap.isOpened():
+        logger.error("Failed to open video %s", video_path)
+        return
+    try:
+        fps = cap.get(cv2.CAP_PROP_FPS) or 25.0
+        step = max(1, int(round(interval_seconds * fps)))
+        frame_no = 0
+        index = 0
+        while cap.grab():
+            if frame_no % step == 0:
+                ret, frame = cap.retrieve()
+                if not ret:
+                    break
+                if max_side:
+                    frame, _ = downscale(frame, max_side)
+                image = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+                yield VideoFrame(index, frame_no / fps, image)
+                index += 1
+            frame_no += 1
+    finally:
+        cap.release()
+
+
+def iter_frames(
+    video_path: Path,
+    interval_seconds: float = 5.0,
+    max_side: int | None = None,
+    keyframes_only: bool = False,
+    backend: str | None = None,
+):
+    """Yield :class:`VideoFrame` samples from `video_path`, decoding sequentially.
+
+    `backend` is ``"cv2"``, ``"ffmpeg"`` or ``"auto"`` (default
+    ``config.VIDEO_FRAME_BACKEND``): cv2 when installed, otherwise ffmpeg.
+    Keyframe-only sampling needs ffmpeg and ignores `interval_seconds`.
+    """
+    backend = backend or config.VIDEO_FRAME_BACKEND
+    if backend == "auto":
+        backend = "cv2" if cv2 is not None and not keyframes_only else "ffmpeg"
+    if backend == "cv2" and keyframes_only:
+        logger.warning("cv2 cannot decode keyframes only; using ffmpeg for %s", video_path)
+        backend = "ffmpeg"
+    if backend == "cv2":
+        if cv2 is None:
+            logger.warning("opencv (cv2) not installed; using ffmpeg for %s", video_path)
+            backend = "ffmpeg"
+        else:
+            return iter_frames_cv2(video_path, interval_seconds, max_side)
+    return iter_frames_ffmpeg(video_path, interval_seconds, max_side, keyframes_only)
+
+
+def dhash(image: np.ndarray, size: int = 8) -> int:
+    """Difference hash of an RGB/gray image as a ``size * size``-bit integer."""
+    gray = image.mean(axis=2) if image.ndim == 3 else image
+    gray = np.ascontiguousarray(gray, dtype=np.float32)
+    if cv2 is not None:
+        small = cv2.resize(gray, (size + 1, size), interpolation=cv2.INTER_AREA)
+    else:
+        from PIL import Image
+
+        small = np.asarray(
+            Image.fromarray(gray, mode="F").resize((size + 1, size), Image.BILINEAR)
+        )
+    bits = (small[:, 1:] > small[:, :-1]).ravel()
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+class SceneSampler:
+    """Decide which examined frames need face detection.
+
+    A frame is detected when its dHash differs from the last detected frame by
+    more than `threshold` bits (a scene change), every `dense_interval` seconds
+    for `dense_duration` seconds after a change, and at least every
+    `max_interval` seconds otherwise. Counters show the work saved.
+    """
+
+    def __init__(
+        self,
+        threshold: int = 10,
+        dense_interval: float = 1.0,
+        dense_duration: float = 3.0,
+        max_interval: float = 5.0,
+    ):
+        self.threshold = threshold
+        self.dense_interval = dense_interval
+        self.dense_duration = dense_duration
+        self.max_interval = max_interval
+        self.frames_examined = 0
+        self.frames_detected = 0
+        self.scene_changes = 0
+        self._reference = None
+        self._last_detect = None
+        self._dense_until = -1.0
+
+    def should_detect(self, timestamp: float, image: np.ndarray) -> bool:
+        self.frames_examined += 1
+        sig = dhash(image)
+        if self._reference is None:
+            changed = True
+        else:
+            changed = hamming(sig, self._reference) > self.threshold
+            if changed:
+                self.scene_changes += 1
+        if changed:
+            self._dense_until = timestamp + self.dense_duration
+        since = None if self._last_detect is None else timestamp - self._last_detect
+        due = (
+            changed
+            or since >= self.max_interval
+            or (timestamp <= self._dense_until and since >= self.dense_interval)
+        )
+        if due:
+            self.frames_detected += 1
+            self._last_detect = timestamp
+            self._reference = sig
+        return due
+
+    def stats(self) -> dict:
+        return {
+            "frames_examined": self.frames_examined,
+            "frames_detected": self.frames_detected,
+            "scene_changes": self.scene_changes,
+        }
+
+
+def adaptive_frames(frames, sampler: SceneSampler):
+    """Filter a frame iterator down to the frames `sampler` wants detected."""
+    for frame in frames:
+        if sampler.should_detect(frame.timestamp, frame.image):
+            yield frame
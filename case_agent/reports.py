@@ -243,6 +243,10 @@ def generate_extended_report(
                 "distance": fm.distance,
                 "created_at": created,
             }
+            if fm.track_start is not None:
+                # video face track: time span covered by this match
+                rec["track_start"] = fm.track_start
+                rec["track_end"] = fm.track_end
             face_matches.append(rec)
             # populate map
             face_matches_map.setdefault(fm.source, []).append(
@@ -0,0 +1,175 @@
+"""Image container with an explicit channel order.
+
+Backends disagree on pixel layout: PIL and face_recognition want RGB, OpenCV
+wants BGR, PyMuPDF renders RGB(A) and Haar detection only needs grayscale.
+Guessing the order from channel statistics is slow (a full-image reduction)
+and often wrong, and converting eagerly at every hand-off copies the image
+several times. An :class:`ImageBuffer` records the order once, hands out
+zero-copy views where possible and converts lazily, at most once per format.
+
+Classes:
+- ImageBuffer(array, order='RGB') with rgb(), bgr(), gray(), pil() and crop()
+- ImageBuffer.wrap(image, order='RGB') accepts a buffer, PIL image, array or path
+- ImageBuffer.from_pixmap(pix) wraps a PyMuPDF pixmap (without copying on PyMuPDF >= 1.21)
+"""
+from pathlib import Path
+
+import numpy as np
+
+RGB = 'RGB'
+BGR = 'BGR'
+GRAY = 'L'
+ORDERS = (RGB, BGR, GRAY)
+
+
+class ImageBuffer:
+    """A uint8 image (H x W x 3, or H x W for GRAY) with a known channel order."""
+
+    def __init__(self, array, order: str = RGB, pil=None):
+        if order not in ORDERS:
+            raise ValueError(f'unknown channel order {order!r}; expected one of {ORDERS}')
+        array = np.asarray(array)
+        if array.dtype != np.uint8:
+            array = array.astype(np.uint8)
+        if order == GRAY and array.ndim != 2:
+            raise ValueError('GRAY buffers must be 2-D')
+        if order != GRAY and (array.ndim != 3 or array.shape[2] != 3):
+            raise ValueError(f'{order} buffers must be H x W x 3, got shape {array.shape}')
+        self.array = array
+        self.order = order
+        # object owning memory that `array` views (e.g. a PyMuPDF pixmap)
+        self._owner = None
+        self._cache = {}
+        if pil is not None:
+            self._cache['pil'] = pil
+
+    # Constructors
+    @classmethod
+    def from_pil(cls, img) -> 'ImageBuffer':
+        """Wrap a PIL image (converted to RGB or L only if needed)."""
+        if img.mode not in (RGB, GRAY):
+            img = img.convert(RGB)
+        return cls(np.asarray(img), img.mode, pil=img if img.mode == RGB else None)
+
+    @classmethod
+    def from_path(cls, path) -> 'ImageBuffer':
+        from PIL import Image
+
+        with Image.open(str(path)) as img:
+            img.load()
+            return cls.from_pil(img if img.mode in (RGB, GRAY) else img.convert(RGB))
+
+    @classmethod
+    def from_pixmap(cls, pix) -> 'ImageBuffer':
+        """Wrap a PyMuPDF pixmap's RGB(A) samples (alpha is dropped by a view).
+
+        ``pix.samples_mv`` (PyMuPDF >= 1.21) is viewed without copying; the
+        buffer and its crops keep `pix` alive, so arrays taken from them must
+        not outlive the buffer. Older versions only offer ``pix.samples``, a
+        bytes copy.
+        """
+        channels = pix.n
+        samples = getattr(pix, 'samples_mv', None)
+        if samples is None:
+            samples = pix.samples
+        arr = np.frombuffer(samples, dtype=np.uint8).reshape(pix.height, pix.width, channels)
+        buf = cls(arr[:, :, 0], GRAY) if channels == 1 else cls(arr[:, :, :3], RGB)
+        buf._owner = pix
+        return buf
+
+    @classmethod
+    def wrap(cls, image, order: str = RGB) -> 'ImageBuffer':
+        """Return `image` as a buffer: buffers pass through, PIL images and
+        paths are RGB, arrays are taken to be in `order`."""
+        if isinstance(image, ImageBuffer):
+            return image
+        if isinstance(image, (str, Path)):
+            return cls.from_path(image)
+        if hasattr(image, 'convert') and hasattr(image, 'mode'):
+            return cls.from_pil(image)
+        arr = np.asarray(image)
+        if arr.ndim == 2:
+            return cls(arr, GRAY)
+        if arr.ndim == 3 and arr.shape[2] == 4:
+            arr = arr[:, :, :3]
+        return cls(arr, order)
+
+    # Geometry
+    @property
+    def shape(self) -> tuple:
+        return self.array.shape
+
+    @property
+    def height(self) -> int:
+        return self.array.shape[0]
+
+    @property
+    def width(self) -> int:
+        return self.array.shape[1]
+
+    def crop(self, top: int, right: int, bottom: int, left: int) -> 'ImageBuffer':
+        """Zero-copy view of a (top, right, bottom, left) box, clipped to the image."""
+        top, left = max(0, int(top)), max(0, int(left))
+        view = ImageBuffer(self.array[top:int(bottom), left:int(right)], self.order)
+        view._owner = self._owner
+        return view
+
+    # Views / conversions
+    def _converted(self, key, make, contiguous: bool):
+        if contiguous:
+            key = key + '_c'
+        out = self._cache.get(key)
+        if out is None:
+            out = make()
+            if contiguous:
+                out = np.ascontiguousarray(out)
+            self._cache[key] = out
+        return out
+
+    def _as(self, order: str, contiguous: bool) -> np.ndarray:
+        if self.order == order and (not contiguous or self.array.flags.c_contiguous):
+            return self.array
+        if self.order == GRAY:
+            make = lambda: np.repeat(self.array[:, :, np.newaxis], 3, axis=2)
+        elif self.order == order:
+            make = lambda: self.array
+        else:
+            make = lambda: self.array[:, :, ::-1]
+        return self._converted(order.lower(), make, contiguous)
+
+    def rgb(self, contiguous: bool = False) -> np.ndarray:
+        """RGB array; a view of the stored array unless a conversion is needed.
+
+        Pass ``contiguous=True`` for libraries that need C-contiguous input
+        (dlib, ``Image.fromarray``); the copy is made once and cached.
+        """
+        return self._as(RGB, contiguous)
+
+    def bgr(self, contiguous: bool = False) -> np.ndarray:
+        """BGR array for OpenCV (see :meth:`rgb`)."""
+        return self._as(BGR, contiguous)
+
+    def gray(self) -> np.ndarray:
+        """Grayscale uint8 array (ITU-R 601 luma), computed once."""
+        if self.order == GRAY:
+            return self.array
+
+        def make():
+            weights = (0.299, 0.587, 0.114) if self.order == RGB else (0.114, 0.587, 0.299)
+            luma = self.array.astype(np.float32) @ np.asarray(weights, dtype=np.float32)
+            return np.clip(luma + 0.5, 0, 255).astype(np.uint8)
+
+        return self._converted('gray', make, False)
+
+    def pil(self):
+        """RGB (or L) PIL image, created once."""
+        img = self._cache.get('pil')
+        if img is None:
+            from PIL import Image
+
+            if self.order == GRAY:
+                img = Image.fromarray(np.ascontiguousarray(self.array))
+            else:
+                img = Image.fromarray(self.rgb(contiguous=True))
+            self._cache['pil'] = img
+        return img
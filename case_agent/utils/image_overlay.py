@@ -2,13 +2,16 @@
 
 Functions:
 - overlay_matches_on_pil(img, matches, size=None) -> PIL.Image with rectangles and labels
-  where matches is list of {'probe_bbox': {'top','left','bottom','right'}, 'subject': str}
+  where matches is list of {'probe_bbox': {'top','left','bottom','right'}, 'subject': str};
+  img may also be an ImageBuffer or RGB array
 
 - render_pdf_first_page(path, size) -> PIL.Image rendering first page using fitz (PyMuPDF) if available
 """
 from PIL import Image, ImageDraw, ImageFont
 from pathlib import Path
 
+from case_agent.utils.image_buffer import ImageBuffer
+
 try:
     import fitz  # PyMuPDF
 except Exception:
@@ -20,6 +23,8 @@ def overlay_matches_on_pil(img: Image.Image, matches: list, size: tuple | None =
 
     If size is provided, image will be resized (thumbnail) before drawing and bboxes scaled.
     """
+    if not isinstance(img, Image.Image):
+        img = ImageBuffer.wrap(img).pil()
     orig_w, orig_h = img.size
     if size is not None:
         img = img.copy()
@@ -86,7 +91,7 @@ def render_pdf_first_page(path: str | Path, size=(160, 120)) -> Image.Image:
     page = doc.load_page(0)
     mat = fitz.Matrix(2, 2)
     pix = page.get_pixmap(matrix=mat)
-    mode = 'RGB' if pix.n < 4 else 'RGBA'
-    img = Image.frombytes(mode, [pix.width, pix.height], pix.samples)
+    # copy: the buffer is a view of the pixmap's samples
+    img = ImageBuffer.from_pixmap(pix).pil().copy()
     img.thumbnail(size)
     return img
@@ -4,15 +4,16 @@ Functions:
 - ensure_thumbnails_dir(out_dir) -> Path
 - thumbnail_for_image(path, out_dir, size=(160,160)) -> Path (thumbnail file path)
 - thumbnail_for_pil_image(pil_img, out_dir, key=None, size=(160,160)) -> Path
+  (also accepts an ImageBuffer or RGB array)
 
 Thumbnails are cached by file sha256 (or key) to avoid regenerating.
 """
 from pathlib import Path
-from io import BytesIO
 import hashlib
 from PIL import Image
 
 from case_agent.pipelines.hash_inventory import sha256_file
+from case_agent.utils.image_buffer import ImageBuffer
 
 THUMB_SUBDIR = "thumbnails"
 
@@ -68,15 +69,16 @@ def thumbnail_for_image(image_path: str, out_dir: str | Path, size=(160, 160)) -
         return out_path
 
 
-def thumbnail_for_pil_image(pil_img: Image.Image, out_dir: str | Path, key: str | None = None, size=(160, 160)) -> Path:
-    """Create a thumbnail from a PIL image instance; key (if provided) will be hashed to name the file."""
+def thumbnail_for_pil_image(pil_img: Image.Image | ImageBuffer, out_dir: str | Path, key: str | None = None, size=(160, 160)) -> Path:
+    """Create a thumbnail from a PIL image instance (or ImageBuffer / RGB array); key (if provided) will be hashed to name the file."""
     out_dir = Path(out_dir)
     td = ensure_thumbnails_dir(out_dir)
+    buf = ImageBuffer.wrap(pil_img)
     if key is None:
-        # derive a quick hash from image bytes
-        buf = BytesIO()
-        pil_img.save(buf, format='PNG')
-        digest = hashlib.sha256(buf.getvalue()).hexdigest()
+        # derive a quick hash from the raw pixels (no PNG encode)
+        h = hashlib.sha256(f'{buf.order}{buf.shape}'.encode('utf-8'))
+        h.update(buf.array.tobytes() if buf.array.flags.c_contiguous else buf.rgb(contiguous=True).tobytes())
+        digest = h.hexdigest()
     else:
         digest = hashlib.sha256(key.encode('utf-8')).hexdigest()
     fname = _thumb_filename_from_hash(digest, size)
@@ -84,7 +86,7 @@ def thumbnail_for_pil_image(pil_img: Image.Image, out_dir: str | Path, key: str
     if out_path.exists():
         return out_path
     try:
-        img = pil_img.convert('RGB')
+        img = buf.pil().convert('RGB')
         img.thumbnail(size)
         img.save(out_path, format='JPEG', quality=85)
         return out_path
@@ -0,0 +1,50 @@
+"""Benchmark ANN recall/latency against exact search for a gallery embedding store.
+
+Queries are gallery rows perturbed with Gaussian noise, so the true neighbours
+are known to exist in the gallery.
+
+Usage:
+  python scripts/bench_face_ann.py --gallery C:/Projects/FileAnalyzer/Images --labeled --backend ivf --k 10
+"""
+from pathlib import Path
+import argparse
+
+import numpy as np
+
+from case_agent.pipelines import face_search
+from case_agent.pipelines.face_ann import available_backends, load_or_build_ann, benchmark_recall
+
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument('--gallery', required=True)
+    p.add_argument('--labeled', action='store_true', help='Gallery uses subfolders as subjects')
+    p.add_argument('--backend', default='auto', choices=['auto'] + available_backends())
+    p.add_argument('--queries', type=int, default=200)
+    p.add_argument('--noise', type=float, default=0.05, help='Std-dev of noise added to query rows')
+    p.add_argument('--k', type=int, default=10)
+    p.add_argument('--efforts', nargs='+', type=int, default=[1, 2, 4, 8, 16, 32])
+    args = p.parse_args()
+
+    gallery = Path(args.gallery)
+    if args.labeled:
+        store = face_search._open_labeled_store(gallery)
+        name = face_search._store_name(face_search.LABELED_GALLERY_STORE)
+    else:
+        store = face_search._load_gallery_embeddings(gallery)
+        name = face_search._store_name(face_search.GALLERY_STORE)
+    if len(store) == 0:
+        raise SystemExit('Gallery has no embeddings: ' + str(gallery))
+    ann = load_or_build_ann(gallery, name, store.generation, store.matrix, backend=args.backend)
+
+    rng = np.random.default_rng(0)
+    rows = rng.choice(len(store), size=min(args.queries, len(store)), replace=False)
+    queries = np.asarray(store.matrix[np.sort(rows)]) + rng.normal(scale=args.noise, size=(len(rows), store.dim))
+
+    print(f'Gallery rows: {len(store)}  dim: {store.dim}  backend: {ann.backend}  k: {args.k}')
+    for r in benchmark_recall(ann, store.matrix, queries, k=args.k, efforts=args.efforts):
+        print(f"effort={r['effort']!s:>6}  recall@{args.k}={r['recall']:.3f}  {r['ms_per_query']:.3f} ms/query")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+"""Benchmark multi-resolution face detection against full-resolution detection.
+
+Runs every detection mode over a folder of fixture images and reports
+images/sec, faces/sec and recall (IoU >= 0.5) against the boxes found by the
+full-resolution pass.
+
+Usage:
+  python scripts/bench_face_detect.py --fixtures C:/path/to/exhibits --detector hog --max-side 1024
+"""
+from pathlib import Path
+import argparse
+import time
+
+import numpy as np
+
+from case_agent.pipelines import face_search
+from case_agent.pipelines.face_detect import DETECT_MODES, detect_boxes, match_recall
+
+IMAGE_EXTS = {'.jpg', '.jpeg', '.png', '.bmp', '.tif', '.tiff'}
+
+
+def _load(path: Path):
+    from PIL import Image
+    return np.asarray(Image.open(path).convert('RGB'))
+
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument('--fixtures', required=True, help='Folder of images to detect faces in')
+    p.add_argument('--detector', default='hog', choices=['hog', 'haar'])
+    p.add_argument('--max-side', type=int, default=1024)
+    p.add_argument('--pad', type=float, default=0.5)
+    p.add_argument('--limit', type=int, default=0)
+    args = p.parse_args()
+
+    if args.detector == 'hog':
+        if face_search.face_recognition is None:
+            raise SystemExit('face_recognition is not installed')
+        detector = face_search.face_recognition.face_locations
+    else:
+        if face_search.cv2 is None:
+            raise SystemExit('OpenCV (cv2) is not installed')
+        detector = face_search._haar_boxes
+    haar = face_search._haar_boxes if face_search.cv2 is not None else None
+
+    paths = sorted(q for q in Path(args.fixtures).rglob('*') if q.suffix.lower() in IMAGE_EXTS)
+    if args.limit:
+        paths = paths[:args.limit]
+    if not paths:
+        raise SystemExit('No fixture images found in ' + args.fixtures)
+    images = [_load(q) for q in paths]
+
+    reference = None
+    print(f'Images: {len(images)}  detector: {args.detector}  max-side: {args.max_side}')
+    for mode in DETECT_MODES:
+        if mode == 'haar' and haar is None:
+            continue
+        start = time.perf_counter()
+        found = [detect_boxes(img, detector, mode=mode, max_side=args.max_side, pad=args.pad, haar=haar) for img in images]
+        elapsed = time.perf_counter() - start
+        if reference is None:
+            reference = found
+        matched = total = 0
+        for ref, got in zip(reference, found):
+            m, t = match_recall(ref, got)
+            matched += m
+            total += t
+        n_faces = sum(len(f) for f in found)
+        recall = matched / total if total else 1.0
+        print(f'{mode:>9}: {len(images) / elapsed:7.2f} images/s  {n_faces / elapsed:7.2f} faces/s  '
+              f'faces={n_faces}  recall={recall:.3f}  total={elapsed:.1f}s')
+
+
+if __name__ == '__main__':
+    main()
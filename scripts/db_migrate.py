@@ -2,6 +2,9 @@
 
 Currently supports:
  - add 'confidence' column to 'entities' table if missing
+ - add video track columns to 'face_matches' if missing
+
+init_db() also adds missing nullable model columns automatically.
 """
 import sqlite3
 from pathlib import Path
@@ -24,5 +27,13 @@ if 'confidence' not in cols:
 else:
     print('column confidence already present')
 
+cur.execute("PRAGMA table_info('face_matches')")
+cols = [r[1] for r in cur.fetchall()]
+for name, sql_type in (('track_start', 'FLOAT'), ('track_end', 'FLOAT'), ('num_detections', 'INTEGER')):
+    if cols and name not in cols:
+        print(f'Adding column {name} to face_matches')
+        cur.execute(f"ALTER TABLE face_matches ADD COLUMN {name} {sql_type}")
+        conn.commit()
+
 conn.close()
 print('Migration complete')
\ No newline at end of file
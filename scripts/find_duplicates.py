@@ -0,0 +1,46 @@
+"""Report groups of identical files under a folder without hashing every file.
+
+Files are bucketed by size, candidates are compared by a head/tail partial
+hash and only files that still collide are fully hashed (see
+case_agent.pipelines.duplicates).
+
+Usage:
+  python scripts/find_duplicates.py --input C:/path/to/evidence --out ./duplicates.json
+"""
+from pathlib import Path
+import argparse
+import json
+import os
+
+from case_agent.pipelines.duplicates import PARTIAL_BYTES, find_duplicates
+from case_agent.pipelines.hash_engine import HashEngine
+
+
+def _walk(root: Path):
+    for dirpath, _dirs, filenames in os.walk(root):
+        for fn in filenames:
+            p = os.path.join(dirpath, fn)
+            try:
+                yield p, os.stat(p).st_size
+            except OSError:
+                continue
+
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument('--input', required=True)
+    p.add_argument('--out', default=None, help='Write the groups as JSON here')
+    p.add_argument('--workers', type=int, default=None, help='Hashing threads (default: config.HASH_WORKERS)')
+    p.add_argument('--partial-kb', type=int, default=PARTIAL_BYTES // 1024, help='Bytes compared at the head and tail of each candidate')
+    args = p.parse_args()
+
+    groups, stats = find_duplicates(_walk(Path(args.input)), HashEngine(workers=args.workers), partial_bytes=args.partial_kb * 1024)
+    wasted = sum((len(g) - 1) * os.path.getsize(g[0]) for g in groups)
+    print(json.dumps(stats))
+    print(f'{len(groups)} duplicate groups, {sum(len(g) - 1 for g in groups)} redundant copies, {wasted / 1e6:.1f} MB')
+    if args.out:
+        Path(args.out).write_text(json.dumps({'stats': stats, 'groups': groups}, indent=2), encoding='utf-8')
+
+
+if __name__ == '__main__':
+    main()
@@ -7,8 +7,12 @@ from pathlib import Path
 import argparse
 import json
 import logging
-from case_agent.pipelines import face_search
-from case_agent.pipelines.hash_inventory import walk_and_hash
+from case_agent import config
+from case_agent.pipelines import face_parallel, face_search
+from case_agent.pipelines.crop_dedup import shared_dedup
+from case_agent.pipelines.face_quality import shared_filter
+from case_agent.pipelines.file_walker import manifest_files
+from case_agent.pipelines.hash_inventory import inventoried_files, walk_and_hash
 from case_agent.pipelines.text_extract import extract_for_file
 from case_agent.pipelines.entity_extract import extract_entities_for_file
 from case_agent.pipelines.media_extract import process_media
@@ -42,17 +46,20 @@ def crop_image_save(img_path: Path, bbox: dict, out_dir: Path, tag_prefix: str):
     return out_path
 
 
-def process_folder(evidence_dir: Path, gallery_dir: Path, db_path: Path, faces_out: Path, threshold: float = 0.9, top_k: int = 5, aggregate: bool = True):
+def process_folder(evidence_dir: Path, gallery_dir: Path, db_path: Path, faces_out: Path, threshold: float = 0.9, top_k: int = 5, aggregate: bool = True, workers: int | None = None, verify: bool = False, manifest=None):
     evidence_dir = Path(evidence_dir)
     gallery_dir = Path(gallery_dir)
     faces_out = Path(faces_out)
 
     logger.info('Initializing DB and inventorying files...')
-    walk_and_hash(evidence_dir, db_path=str(db_path))
+    files = manifest_files(manifest, root=evidence_dir) if manifest else None
+    walk_and_hash(evidence_dir, db_path=str(db_path), verify=verify, files=files)
+    # later passes use the inventoried file list (one path per content) instead of walking the tree again
+    evidence = inventoried_files(evidence_dir, db_path=str(db_path))
 
     # Process each file for text/entities/media
     logger.info('Extracting text, entities, and media where applicable...')
-    for p in evidence_dir.rglob('*'):
+    for p in evidence:
         if p.is_file():
             try:
                 extract_for_file(p, db_path=str(db_path))
@@ -65,55 +72,44 @@ def process_folder(evidence_dir: Path, gallery_dir: Path, db_path: Path, faces_o
     # 1) PDFs: extract page crops via scripts/pdf_face_detect.py functionality
     logger.info('Detecting faces in PDFs...')
     from scripts import pdf_face_detect
-    pdf_results = pdf_face_detect.run_folder(evidence_dir, faces_out / 'pdf_report.json', faces_out, limit=None)
+    # with crop dedup on, a face reproduced in several PDFs is written (and so matched below) once
+    dedup = shared_dedup(db_path)
+    pdf_results = pdf_face_detect.run_folder(evidence_dir, faces_out / 'pdf_report.json', faces_out, limit=None, dedup=dedup, pdfs=[p for p in evidence if p.suffix.lower() == '.pdf'])
 
     # 2) Images: detect and crop faces
     logger.info('Detecting faces in images...')
-    from case_agent.pipelines.face_search import find_faces_in_image
-    for img in evidence_dir.rglob('*'):
-        if img.suffix.lower() in IMAGE_EXTS:
-            try:
-                dets = find_faces_in_image(img)
-                for i, d in enumerate(dets):
-                    bbox = d.get('bbox')
-                    crop = crop_image_save(img, bbox, faces_out, 'img')
-                    if crop:
-                        # run labeled search and persist
-                        res = face_search.search_labeled_gallery_for_image(crop, gallery_dir, threshold=threshold, top_k=top_k)
-                        face_search._persist_results(db_path if db_path is not None else None, res, aggregate=aggregate)
-            except Exception:
-                logger.exception('Image face detection failed for %s', img)
+    matched_crops = set()
+    images = [img for img in evidence if img.suffix.lower() in IMAGE_EXTS]
+    # detect, embed and match in worker processes; this process writes the DB
+    results = face_parallel.scan_images(images, gallery_dir, faces_out, threshold=threshold, top_k=top_k, workers=workers)
+
+    def track_sources(results):
+        for res in results:
+            matched_crops.add(Path(res['source']))
+            yield res
 
-    # 3) Videos: sample frames and persist results
+    face_parallel.persist_results(track_sources(results), db_path, aggregate=aggregate)
+
+    # 3) Videos: track faces across sampled frames, match each track once
     logger.info('Detecting faces in videos...')
-    from case_agent.pipelines.face_search import find_faces_in_video
-    for vid in evidence_dir.rglob('*'):
+    for vid in evidence:
         if vid.suffix.lower() in VIDEO_EXTS:
             try:
-                frames = find_faces_in_video(vid, interval_seconds=5.0)
-                for frame in frames:
-                    ts = frame.get('timestamp')
-                    for i, d in enumerate(frame.get('detections', [])):
-                        bbox = d.get('bbox')
-                        # frame images are not available here; create a synthetic name
-                        crop_path = faces_out / f"{vid.stem}_t{int(ts)}_f{i+1}.jpg"
-                        # We can't easily extract the exact frame in current helper; skip saving but persist
-                        res = {'source': str(vid), 'results': [{'face_bbox': bbox, 'matches': []}]}
-                        # enrich by searching gallery for the face embedding if embedding available
-                        face_search._persist_results(db_path if db_path is not None else None, res, aggregate=aggregate)
+                res = face_search.search_video_tracks(vid, gallery_dir, labeled=True, interval_seconds=5.0, threshold=threshold, top_k=top_k)
+                if res.get('tracks'):
+                    face_search._persist_results(db_path if db_path is not None else None, res, aggregate=aggregate)
             except Exception:
                 logger.exception('Video face detection failed for %s', vid)
 
     # After all crops created, run a pass to match remaining crops not yet persisted
     logger.info('Matching remaining crops in faces dir against labeled gallery...')
-    for crop in faces_out.rglob('*'):
-        if crop.suffix.lower() in {'.jpg', '.jpeg', '.png'}:
-            try:
-                res = face_search.search_labeled_gallery_for_image(crop, gallery_dir, threshold=threshold, top_k=top_k)
-                face_search._persist_results(db_path if db_path is not None else None, res, aggregate=aggregate)
-            except Exception:
-                logger.exception('Failed to match crop %s', crop)
+    crops = [c for c in faces_out.rglob('*') if c.suffix.lower() in {'.jpg', '.jpeg', '.png'} and c not in matched_crops]
+    results = face_parallel.match_crops(crops, gallery_dir, labeled=True, threshold=threshold, top_k=top_k, workers=workers)
+    face_parallel.persist_results(results, db_path, aggregate=aggregate)
 
+    quality = shared_filter()
+    if quality is not None:
+        logger.info('Face quality filter: %s', quality.stats())
     logger.info('Full face scan complete')
 
 
@@ -141,10 +137,19 @@ def main():
     parser.add_argument('--top-k', type=int, default=5)
     parser.add_argument('--aggregate', action='store_true')
     parser.add_argument('--report-out', default='./reports')
+    parser.add_argument('--workers', type=int, default=None, help='Face matching worker processes (default: config.FACE_SCAN_WORKERS or all cores)')
+    parser.add_argument('--verify', action='store_true', help='Re-hash every file during inventory instead of skipping unchanged ones')
+    parser.add_argument('--manifest', default=None, help="Inventory the files listed in this manifest ('-' = stdin; 'path' or 'path<TAB>size' per line) instead of walking --evidence")
+    parser.add_argument('--quality-filter', action='store_true', help='Skip tiny, blurry, badly exposed or non-frontal faces before embedding (config.FACE_QUALITY_*)')
+    parser.add_argument('--dedup-crops', action='store_true', help='Write and match perceptually identical PDF face crops once (config.CROP_DEDUP_MAX_DISTANCE)')
     args = parser.parse_args()
+    if args.quality_filter:
+        config.FACE_QUALITY_FILTER = True
+    if args.dedup_crops:
+        config.CROP_DEDUP = True
 
     db = args.db if args.db else None
-    process_folder(Path(args.evidence), Path(args.gallery), db, Path(args.faces_out), threshold=args.threshold, top_k=args.top_k, aggregate=args.aggregate)
+    process_folder(Path(args.evidence), Path(args.gallery), db, Path(args.faces_out), threshold=args.threshold, top_k=args.top_k, aggregate=args.aggregate, workers=args.workers, verify=args.verify, manifest=args.manifest)
     export_reports(db if db else None, Path(args.report_out))
 
 
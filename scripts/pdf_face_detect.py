@@ -7,6 +7,14 @@ from pathlib import Path
 import json
 import logging
 from datetime import datetime
+from functools import partial
+
+from case_agent import config
+from case_agent.pipelines.face_detect import detect_boxes
+from case_agent.pipelines.crop_dedup import CropDedup, crop_hash
+from case_agent.pipelines.face_quality import QualityFilter, shared_filter
+from case_agent.pipelines.frame_ring import process_frames
+from case_agent.utils.image_buffer import RGB, ImageBuffer
 
 logger = logging.getLogger("pdf_face_detect")
 logging.basicConfig(level=logging.INFO)
@@ -18,10 +26,8 @@ except Exception:
 
 try:
     import cv2
-    import numpy as np
 except Exception:
     cv2 = None
-    np = None
 
 # Load Haar cascade once to avoid repeated disk reads and speed up detection
 if cv2 is not None:
@@ -34,66 +40,143 @@ else:
 
 
 def detect_faces_in_image_np(img_np, scaleFactor=1.1, minNeighbors=5, minSize=(30, 30)):
+    """Haar detection on a BGR or grayscale array, or an ImageBuffer; returns [(x, y, w, h)]."""
     if cv2 is None:
         raise RuntimeError("OpenCV (cv2) not installed")
-    gray = cv2.cvtColor(img_np, cv2.COLOR_BGR2GRAY)
+    if isinstance(img_np, ImageBuffer):
+        gray = img_np.gray()
+    elif img_np.ndim == 2:
+        gray = img_np
+    else:
+        gray = cv2.cvtColor(img_np, cv2.COLOR_BGR2GRAY)
     cascade = _cascade if _cascade is not None else cv2.CascadeClassifier(cv2.data.haarcascades + "haarcascade_frontalface_default.xml")
     faces = cascade.detectMultiScale(gray, scaleFactor=scaleFactor, minNeighbors=minNeighbors, minSize=minSize)
     return faces.tolist() if len(faces) else []
 
 
-def pix_to_numpy(pix):
-    # fitz Pixmap -> numpy ndarray BGR for OpenCV
-    # Preferred direct path when pix.samples is populated
-    if pix.samples is None:
-        # fallback: get PNG bytes and decode with OpenCV
-        try:
-            png_bytes = pix.tobytes("png")
-            nparr = np.frombuffer(png_bytes, dtype=np.uint8)
-            img_np = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-            return img_np
-        except Exception:
-            logger.exception("Failed to convert pix to numpy via PNG fallback")
-            return None
-
-    mode = "RGB" if pix.alpha == 0 else "RGBA"
-    arr = np.frombuffer(pix.samples, dtype=np.uint8)
-    if mode == "RGB":
-        arr = arr.reshape((pix.h, pix.w, 3))
-    else:
-        arr = arr.reshape((pix.h, pix.w, 4))
-        arr = arr[:, :, :3]
-    # fitz gives RGB; convert to BGR for OpenCV
-    arr = cv2.cvtColor(arr, cv2.COLOR_RGB2BGR)
-    return arr
+def _haar_detector(img_np):
+    """detect_faces_in_image_np as a (top, right, bottom, left) detector."""
+    return [(y, x + w, y + h, x) for x, y, w, h in detect_faces_in_image_np(img_np)]
+
+
+def detect_page_faces(img_np, mode=None):
+    """Detect faces on a rendered page; returns [(x, y, w, h)] in page pixels.
+
+    `img_np` is a BGR array or an ImageBuffer (detection then runs on its
+    grayscale view, converted once per page). `mode` (default
+    config.FACE_DETECT_MODE) selects full-resolution Haar or a downscaled pass
+    with full-resolution re-detection in candidate regions.
+    """
+    if isinstance(img_np, ImageBuffer):
+        img_np = img_np.gray()
+    boxes = detect_boxes(
+        img_np,
+        _haar_detector,
+        mode=mode or config.FACE_DETECT_MODE,
+        max_side=config.FACE_DETECT_MAX_SIDE,
+        pad=config.FACE_DETECT_REGION_PAD,
+    )
+    return [(left, top, right - left, bottom - top) for top, right, bottom, left in boxes]
+
+
+def pix_to_buffer(pix):
+    """Wrap a fitz Pixmap as an RGB ImageBuffer without copying its samples."""
+    return ImageBuffer.from_pixmap(pix)
+
+
+def _page_entry(page: ImageBuffer, page_number, stem, faces_out: Path, detect_mode=None, quality=None, dedup=None, source=None, hash_crops=False):
+    """Detect faces on one rendered page and write their crops.
+
+    With a CropDedup a crop that matches an already processed one is not
+    written; its face entry points at the earlier crop ('duplicate_of').
+    `hash_crops` instead stores each crop's 'hash' in its face entry so the
+    caller can deduplicate later (worker processes).
+    """
+    faces = detect_page_faces(page, mode=detect_mode)
+    if quality is not None:
+        # optional quality pre-filter: low-value detections get no crop at all
+        faces = [(x, y, w, h) for x, y, w, h in faces if quality.check(page.gray(), (y, x + w, y + h, x))]
+    page_entry = {"page": page_number + 1, "num_faces": len(faces), "faces": []}
+    for i, (x, y, w, h) in enumerate(faces):
+        crop = page.crop(y, x + w, y + h, x)
+        crop_path = faces_out / f"{stem}_p{page_number+1}_f{i+1}.jpg"
+        face = {"bbox": {"x": int(x), "y": int(y), "w": int(w), "h": int(h)}, "crop": str(crop_path)}
+        if dedup is not None:
+            canonical = dedup.check(crop, source or stem, crop_path, page=page_number + 1, bbox=face["bbox"])
+            if canonical is not None:
+                face.update(crop=canonical, duplicate_of=canonical)
+                page_entry["faces"].append(face)
+                continue
+        elif hash_crops:
+            face["hash"] = crop_hash(crop)
+        faces_out.mkdir(parents=True, exist_ok=True)
+        cv2.imwrite(str(crop_path), crop.bgr(contiguous=True))
+        page_entry["faces"].append(face)
+    return page_entry
+
+
+def _dedup_written(entry, dedup, source):
+    """Deduplicate a page whose crops were already written by a worker."""
+    for face in entry["faces"]:
+        h = face.pop("hash", None)
+        if h is None:
+            continue
+        canonical = dedup.check(None, source, face["crop"], page=entry["page"], bbox=face["bbox"], h=h)
+        if canonical is not None:
+            Path(face["crop"]).unlink(missing_ok=True)
+            face.update(crop=canonical, duplicate_of=canonical)
+
+
+def _page_task(img_np, desc, faces_out, detect_mode=None, hash_crops=False):
+    """frame_ring task: detect faces on a shared-memory page in a worker process."""
+    quality = QualityFilter.from_config() if config.FACE_QUALITY_FILTER else None
+    entry = _page_entry(ImageBuffer(img_np, RGB), desc.page, Path(desc.source).stem, Path(faces_out), detect_mode, quality, hash_crops=hash_crops)
+    return entry, quality.stats() if quality is not None else None
+
+
+def _render_pages(doc, render_zoom):
+    mat = fitz.Matrix(render_zoom, render_zoom)
+    for page_number in range(len(doc)):
+        pix = doc[page_number].get_pixmap(matrix=mat, alpha=False)
+        yield page_number, pix_to_buffer(pix)
 
 
-def process_pdf(pdf_path: Path, faces_out: Path, render_zoom=2.0):
+def process_pdf(pdf_path: Path, faces_out: Path, render_zoom=2.0, detect_mode=None, workers=None, dedup=None):
+    """Render each page, detect faces and write crops under `faces_out`.
+
+    With `workers` > 1 (default config.FRAME_WORKERS) pages are handed to
+    detection worker processes through shared-memory buffers while rendering
+    continues here. With a `dedup` index (crop_dedup.CropDedup) faces already
+    seen in another crop are marked 'duplicate_of' instead of written again.
+    """
     out = {"file": str(pdf_path), "pages": []}
+    quality = shared_filter()
     if fitz is None:
         logger.error("PyMuPDF (fitz) not available; cannot extract pages")
         return out
     doc = fitz.open(str(pdf_path))
-    for page_number in range(len(doc)):
-        page = doc[page_number]
-        mat = fitz.Matrix(render_zoom, render_zoom)
-        pix = page.get_pixmap(matrix=mat, alpha=False)
-        img_np = pix_to_numpy(pix)
-        faces = detect_faces_in_image_np(img_np)
-        page_entry = {"page": page_number + 1, "num_faces": len(faces), "faces": []}
-        for i, (x, y, w, h) in enumerate(faces):
-            crop = img_np[y:y+h, x:x+w]
-            faces_out.mkdir(parents=True, exist_ok=True)
-            crop_path = faces_out / f"{pdf_path.stem}_p{page_number+1}_f{i+1}.jpg"
-            cv2.imwrite(str(crop_path), crop)
-            page_entry["faces"].append({"bbox": {"x": int(x), "y": int(y), "w": int(w), "h": int(h)}, "crop": str(crop_path)})
-        out["pages"].append(page_entry)
+    workers = workers or config.FRAME_WORKERS
+    if workers and workers > 1:
+        pages = ((buf.rgb(), {"source": str(pdf_path), "page": n}) for n, buf in _render_pages(doc, render_zoom))
+        task = partial(_page_task, faces_out=str(faces_out), detect_mode=detect_mode, hash_crops=dedup is not None)
+        for _desc, (entry, stats) in process_frames(pages, task, workers=workers):
+            if dedup is not None:
+                _dedup_written(entry, dedup, str(pdf_path))
+            out["pages"].append(entry)
+            if quality is not None and stats:
+                quality.add_stats(stats)
+        out["pages"].sort(key=lambda e: e["page"])
+        return out
+    for page_number, page in _render_pages(doc, render_zoom):
+        out["pages"].append(_page_entry(page, page_number, pdf_path.stem, faces_out, detect_mode, quality, dedup, str(pdf_path)))
     return out
 
 
-def run_folder(input_dir: Path, out_json: Path, faces_out: Path, limit=None):
+def run_folder(input_dir: Path, out_json: Path, faces_out: Path, limit=None, dedup=None, pdfs=None):
+    """Process `pdfs` (default: every PDF under `input_dir`)."""
     input_dir = Path(input_dir)
-    pdfs = [p for p in input_dir.rglob('*.pdf')]
+    if pdfs is None:
+        pdfs = [p for p in input_dir.rglob('*.pdf')]
     results = {"generated_at": datetime.utcnow().isoformat() + 'Z', "pdfs": []}
     count = 0
     try:
@@ -102,8 +185,10 @@ def run_folder(input_dir: Path, out_json: Path, faces_out: Path, limit=None):
                 break
             logger.info("Processing %s", p)
             try:
-                res = process_pdf(p, faces_out)
+                res = process_pdf(p, faces_out, dedup=dedup)
                 results["pdfs"].append(res)
+                if dedup is not None:
+                    dedup.flush()
             except Exception as e:
                 logger.exception("Failed to process %s: %s", p, e)
             count += 1
@@ -113,6 +198,13 @@ def run_folder(input_dir: Path, out_json: Path, faces_out: Path, limit=None):
         with out_json.open('w', encoding='utf-8') as fh:
             json.dump(results, fh, indent=2)
         return results
+    quality = shared_filter()
+    if quality is not None:
+        results["quality"] = quality.stats()
+        logger.info("Face quality filter: %s", results["quality"])
+    if dedup is not None:
+        results["dedup"] = dedup.stats()
+        logger.info("Crop deduplication: %s", results["dedup"])
     out_json.parent.mkdir(parents=True, exist_ok=True)
     with out_json.open('w', encoding='utf-8') as fh:
         json.dump(results, fh, indent=2)
@@ -127,5 +219,12 @@ if __name__ == '__main__':
     parser.add_argument('--out', default='./pdf_face_results.json')
     parser.add_argument('--faces-out', default='./faces')
     parser.add_argument('--limit', type=int, default=None, help='Optional: limit number of PDFs to process')
+    parser.add_argument('--quality-filter', action='store_true', help='Skip tiny, blurry, badly exposed or non-frontal faces (config.FACE_QUALITY_*)')
+    parser.add_argument('--dedup-crops', action='store_true', help='Write each perceptually identical face crop once (config.CROP_DEDUP_MAX_DISTANCE)')
     args = parser.parse_args()
-    run_folder(Path(args.input), Path(args.out), Path(args.faces_out), limit=args.limit)
+    if args.quality_filter:
+        config.FACE_QUALITY_FILTER = True
+    dedup = None
+    if args.dedup_crops:
+        dedup = CropDedup()
+    run_folder(Path(args.input), Path(args.out), Path(args.faces_out), limit=args.limit, dedup=dedup)
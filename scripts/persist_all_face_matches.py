@@ -1,12 +1,15 @@
 """Sweep face crops and persist matches to DB.
 
+Crops are matched in parallel worker processes (see
+case_agent.pipelines.face_parallel); this process is the only DB writer.
+
 Usage examples:
-  python scripts/persist_all_face_matches.py --faces C:\Projects\FileAnalyzer\faces_0001 --gallery C:\Projects\FileAnalyzer\Images --labeled --db C:\Projects\FileAnalyzer\file_analyzer.db --threshold 0.9
+  python scripts/persist_all_face_matches.py --faces C:\Projects\FileAnalyzer\faces_0001 --gallery C:\Projects\FileAnalyzer\Images --labeled --db C:\Projects\FileAnalyzer\file_analyzer.db --threshold 0.9 --workers 16
 """
 from pathlib import Path
 import argparse
 import json
-from case_agent.pipelines import face_search
+from case_agent.pipelines import face_parallel
 
 
 def main():
@@ -18,36 +21,21 @@ def main():
     p.add_argument('--threshold', type=float, default=1.0)
     p.add_argument('--top-k', type=int, default=5)
     p.add_argument('--aggregate', action='store_true', help='Persist only best match per subject/face')
+    p.add_argument('--workers', type=int, default=None, help='Worker processes (default: config.FACE_SCAN_WORKERS or all cores)')
+    p.add_argument('--chunk-size', type=int, default=None, help='Crops per worker task (default: config.FACE_SCAN_CHUNK_SIZE)')
     args = p.parse_args()
 
     faces_dir = Path(args.faces)
     gallery = Path(args.gallery)
-    db = args.db
     if not faces_dir.exists():
         raise SystemExit('Faces dir does not exist: ' + str(faces_dir))
     if not gallery.exists():
         raise SystemExit('Gallery dir does not exist: ' + str(gallery))
 
-    total = 0
-    persisted = 0
-    for pth in sorted(faces_dir.glob('*')):
-        if pth.suffix.lower() not in {'.jpg', '.jpeg', '.png'}:
-            continue
-        total += 1
-        try:
-            if args.labeled:
-                res = face_search.search_labeled_gallery_for_image(pth, gallery, threshold=args.threshold, top_k=args.top_k)
-            else:
-                res = face_search.search_gallery_for_image(pth, gallery, threshold=args.threshold, top_k=args.top_k)
-            if db:
-                face_search._persist_results(db, res, aggregate=args.aggregate)
-            else:
-                # persist to default DB
-                face_search._persist_results(None, res, aggregate=args.aggregate)
-            persisted += 1
-        except Exception as e:
-            print('Error processing', pth, e)
-    print(f'Processed {total} face crops; persisted {persisted} results')
+    crops = [pth for pth in sorted(faces_dir.glob('*')) if pth.suffix.lower() in {'.jpg', '.jpeg', '.png'}]
+    results = face_parallel.match_crops(crops, gallery, labeled=args.labeled, threshold=args.threshold, top_k=args.top_k, workers=args.workers, chunk_size=args.chunk_size)
+    counts = face_parallel.persist_results(results, args.db, aggregate=args.aggregate)
+    print(f'Processed {len(crops)} face crops; persisted {counts["persisted"]} results')
 
 
 if __name__ == '__main__':
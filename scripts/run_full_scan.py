@@ -20,13 +20,17 @@ import sys
 import time
 
 sys.path.insert(0, r'C:\Projects\FileAnalyzer')
+from case_agent import config
 from case_agent.db.init_db import init_db, get_session
-from case_agent.pipelines.hash_inventory import walk_and_hash
+from case_agent.pipelines.file_walker import manifest_files
+from case_agent.pipelines.hash_inventory import inventoried_files, walk_and_hash
 from case_agent.pipelines.text_extract import extract_for_file
 from case_agent.pipelines.entity_extract import extract_entities_for_file
 from case_agent.pipelines.media_extract import process_media
 from case_agent.pipelines import face_search
-from case_agent.pipelines.face_search import search_labeled_gallery_for_image
+from case_agent.pipelines import face_probes
+from case_agent.pipelines.crop_dedup import shared_dedup
+from case_agent.pipelines.face_quality import shared_filter
 from case_agent.reports import generate_extended_report, write_report_json, write_report_csv, write_report_html
 from scripts.pdf_face_detect import process_pdf
 
@@ -43,88 +47,85 @@ def process_pdf_file(p: Path, faces_out: Path, gallery: Path, db_path: Path, agg
     - aggregate: If True, aggregate results in DB rather than inserting raw
     - threshold, top_k: matching thresholds passed to search routine
     """
-    res = process_pdf(p, faces_out)
-    # for each page, check crops
-    for pg in res.get('pages', []):
-        for f in pg.get('faces', []):
-            crop = Path(f.get('crop'))
-            if crop.exists():
-                r = search_labeled_gallery_for_image(crop, gallery, threshold=threshold, top_k=top_k)
-                face_search._persist_results(db_path or None, r, aggregate=aggregate)
+    model = face_search._embedding_model_tag()
+    faces = face_probes.load_faces(p, model, db_path=db_path)
+    if faces is None:
+        # first scan: render, detect, embed crops in batches and store the vectors
+        dedup = shared_dedup(db_path)
+        res = process_pdf(p, faces_out, dedup=dedup)
+        found = []
+        for pg in res.get('pages', []):
+            for f in pg.get('faces', []):
+                if Path(f.get('crop')).exists():
+                    found.append({'bbox': f.get('bbox'), 'crop': f.get('crop'), 'page': pg.get('page'), 'duplicate_of': f.get('duplicate_of')})
+        # duplicates of crops embedded in earlier PDFs reuse the stored vector
+        known = {}
+        for f in found:
+            if f['duplicate_of'] and f['crop'] not in known:
+                known[f['crop']] = dedup.embedding(f['crop'], model)
+        todo = list(dict.fromkeys(f['crop'] for f in found if known.get(f['crop']) is None))
+        known.update(zip(todo, face_search.compute_embeddings(todo, batch_size=config.FACE_EMBED_BATCH_SIZE)))
+        faces = [dict(f, embedding=known[f['crop']]) for f in found if known.get(f['crop']) is not None]
+        face_probes.save_faces(p, faces, model, db_path=db_path)
+        if dedup is not None:
+            dedup.flush()
+    # a duplicate's canonical crop was matched when it was first seen; stored
+    # faces keep the marker so reruns do not match it again
+    faces = [f for f in faces if not f.get('duplicate_of')]
+    for f in faces:
+        r = face_search.match_labeled_embedding(f['embedding'], gallery, threshold=threshold, top_k=top_k, source=f['crop'], model=model)
+        face_search._persist_results(db_path or None, r, aggregate=aggregate)
 
 
 def process_image_file(p: Path, faces_out: Path, gallery: Path, db_path: Path, aggregate=True, threshold=0.9, top_k=5):
     """Process an image file:
     - Attempt face detection; if no faces are detected, compute an embedding for the
       whole image and compare with the labeled gallery.
-    - If faces are detected and a crop can be created, save the crop to `faces_out`
-      and perform per-crop gallery matching.
+    - If faces are detected, match each face embedding against the labeled gallery
+      and queue its crop to be written to `faces_out`.
 
     Parameters: same as `process_pdf_file`.
     """
-    # detect faces and save crops if desired
-    dets = face_search.find_faces_in_image(p)
-    if not dets:
+    # detect and embed each face once per file (reused from the DB on later
+    # runs); crops are written in the background
+    model = face_search._embedding_model_tag()
+    faces = face_probes.load_faces(p, model, db_path=db_path)
+    if faces is None:
+        faces = face_search.detect_and_embed(p, crops_dir=faces_out)
+        face_probes.save_faces(p, faces, model, db_path=db_path)
+    if not faces:
         # fallback: try to compute whole-image embedding and compare
         r = face_search.search_labeled_gallery_for_image(p, gallery, threshold=threshold, top_k=top_k)
         face_search._persist_results(db_path or None, r, aggregate=aggregate)
         return
-    # If detections, optionally crop and persist per-crop
-    try:
-        from PIL import Image
-        img = Image.open(p).convert('RGB')
-    except Exception:
-        img = None
-    for i, d in enumerate(dets):
-        bbox = d.get('bbox')
-        if img is not None and bbox:
-            left = bbox.get('left', 0)
-            top = bbox.get('top', 0)
-            right = bbox.get('right')
-            bottom = bbox.get('bottom')
-            crop = img.crop((left, top, right, bottom))
-            crop_path = faces_out / f"{p.stem}_f{i+1}.jpg"
-            faces_out.mkdir(parents=True, exist_ok=True)
-            crop.save(crop_path)
-            r = search_labeled_gallery_for_image(crop_path, gallery, threshold=threshold, top_k=top_k)
-            face_search._persist_results(db_path or None, r, aggregate=aggregate)
-        else:
-            # if no crop, persist using whole-image method
-            r = face_search.search_labeled_gallery_for_image(p, gallery, threshold=threshold, top_k=top_k)
-            face_search._persist_results(db_path or None, r, aggregate=aggregate)
+    for f in faces:
+        r = face_search.match_labeled_embedding(f['embedding'], gallery, threshold=threshold, top_k=top_k, source=f['crop'], model=model)
+        face_search._persist_results(db_path or None, r, aggregate=aggregate)
 
 
 def process_video_file(p: Path, gallery: Path, db_path: Path, aggregate=True, threshold=0.9, top_k=5, interval=5.0):
     """Process a video file:
     - Sample frames at the given interval and detect faces in each sampled frame.
-    - For each detection, compare the embedding to the gallery embeddings and persist
-      matches to the DB if they meet the threshold.
+    - Link detections across frames into tracks, match each track's prototype
+      embedding against the gallery once and persist one result per track
+      (with start/end timestamps) if it meets the threshold.
 
     Parameters:
     - interval: sampling interval in seconds
     """
-    frames = face_search.find_faces_in_video(p, interval_seconds=interval)
-    for frame in frames:
-        ts = frame.get('timestamp')
-        dets = frame.get('detections', [])
-        for d in dets:
-            # Each detection includes an embedding; we will compare to gallery image embeddings
-            # Create a synthetic probe by writing frame crop if needed - here we rely on in-memory embedding
-            enc = d.get('embedding')
-            # Compare to gallery image-level embeddings
-            gallery_embs = face_search._load_gallery_embeddings(gallery)
-            best = []
-            for gp, genc in gallery_embs.items():
-                dist = face_search._compare_embedding(enc, genc)
-                if dist <= threshold:
-                    best.append({'path': gp, 'distance': float(dist)})
-            if best:
-                best.sort(key=lambda x: x['distance'])
-                res = {'source': str(p), 'num_subjects': 1, 'subject_matches': [{'subject': None, 'best_distance': best[0]['distance'], 'matches': best[:top_k]}]}
-                face_search._persist_results(db_path or None, res, aggregate=aggregate)
-
-
-def run_full_scan(root: Path, gallery: Path, db_path: Path, faces_out: Path, out_dir: Path, aggregate=True, threshold=0.9, top_k=5, limit=0):
+    model = face_search._embedding_model_tag()
+    stored = face_probes.load_faces(p, model, db_path=db_path)
+    if stored is None:
+        frames = face_search.find_faces_in_video(p, interval_seconds=interval)
+        face_probes.save_faces(p, [dict(d, timestamp=f['timestamp']) for f in frames for d in f['detections']], model, db_path=db_path)
+    else:
+        frames = face_probes.faces_to_frames(stored)
+    res = face_search.search_video_tracks(p, gallery, interval_seconds=interval, threshold=threshold, top_k=top_k, frames=frames)
+    if res.get('tracks'):
+        face_search._persist_results(db_path or None, res, aggregate=aggregate)
+
+
+def run_full_scan(root: Path, gallery: Path, db_path: Path, faces_out: Path, out_dir: Path, aggregate=True, threshold=0.9, top_k=5, limit=0, verify=False, manifest=None):
     """Run a full dataset scan over `root` and generate reports.
 
     Workflow:
@@ -137,20 +138,22 @@ def run_full_scan(root: Path, gallery: Path, db_path: Path, faces_out: Path, out
     - faces_out: directory where face crops are written
     - aggregate: whether to aggregate match results into DB
     - limit: optional limit to number of files processed (0 means no limit)
+    - verify: re-hash every file instead of skipping files whose size/mtime/inode are unchanged
+    - manifest: optional manifest file ('-' = stdin) listing the files to inventory instead of walking `root`
     """
     start = time.time()
     init_db(db_path)
     # 1) inventory
     print('Walking & hashing files...')
-    walk_and_hash(root, db_path=db_path)
+    files = manifest_files(manifest, root=root) if manifest else None
+    inventory = walk_and_hash(root, db_path=db_path, verify=verify, files=files)
+    print('Inventory:', json.dumps(inventory.summary))
 
-    # iterate through files
+    # iterate through the inventoried files (one path per content) instead of walking the tree again
     count = 0
-    for p in root.rglob('*'):
+    for p in inventoried_files(root, db_path=db_path):
         if limit and limit > 0 and count >= limit:
             break
-        if not p.is_file():
-            continue
         count += 1
         ext = p.suffix.lower()
         try:
@@ -168,6 +171,14 @@ def run_full_scan(root: Path, gallery: Path, db_path: Path, faces_out: Path, out
                 process_media(p, out_dir, db_path=db_path)
         except Exception as e:
             print('Error processing', p, e)
+    # wait for face crops queued by detect_and_embed
+    face_search.flush_crop_writes()
+    quality = shared_filter()
+    if quality is not None:
+        print('Face quality filter:', json.dumps(quality.stats()))
+    dedup = shared_dedup(db_path)
+    if dedup is not None:
+        print('Crop deduplication:', json.dumps(dedup.stats()))
 
     # Build timeline
     from case_agent.pipelines.timeline_builder import build_timeline
@@ -198,5 +209,13 @@ if __name__ == '__main__':
     parser.add_argument('--top-k', type=int, default=5)
     parser.add_argument('--aggregate', action='store_true')
     parser.add_argument('--limit', type=int, default=0, help='Optional limit number of files to process (0 = all)')
+    parser.add_argument('--verify', action='store_true', help='Re-hash every file during inventory instead of skipping unchanged ones')
+    parser.add_argument('--manifest', default=None, help="Inventory the files listed in this manifest ('-' = stdin; 'path' or 'path<TAB>size' per line) instead of walking --root")
+    parser.add_argument('--quality-filter', action='store_true', help='Skip tiny, blurry, badly exposed or non-frontal faces before embedding (config.FACE_QUALITY_*)')
+    parser.add_argument('--dedup-crops', action='store_true', help='Embed and match perceptually identical PDF face crops once (config.CROP_DEDUP_MAX_DISTANCE)')
     args = parser.parse_args()
-    run_full_scan(Path(args.root), Path(args.gallery), Path(args.db), Path(args.faces_out), Path(args.out), aggregate=args.aggregate, threshold=args.threshold, top_k=args.top_k, limit=args.limit)
+    if args.quality_filter:
+        config.FACE_QUALITY_FILTER = True
+    if args.dedup_crops:
+        config.CROP_DEDUP = True
+    run_full_scan(Path(args.root), Path(args.gallery), Path(args.db), Path(args.faces_out), Path(args.out), aggregate=args.aggregate, threshold=args.threshold, top_k=args.top_k, limit=args.limit, verify=args.verify, manifest=args.manifest)
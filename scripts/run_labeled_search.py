@@ -1,17 +1,20 @@
 from pathlib import Path
 import json
-from case_agent.pipelines import face_search
+from case_agent.pipelines import face_parallel
 
 faces_dir = Path(r"C:\Projects\FileAnalyzer\faces_0001")
 gallery = Path(r"C:\Projects\FileAnalyzer\Images")
 out = Path(r"C:\Projects\FileAnalyzer\face_match_labeled_all.json")
-res_list = []
-for p in sorted(faces_dir.glob('*.jpg')):
-    try:
-        r = face_search.search_labeled_gallery_for_image(p, gallery, threshold=1.0, top_k=5)
-        res_list.append(r)
-    except Exception as e:
-        print('Error for', p, e)
-with out.open('w', encoding='utf-8') as fh:
-    json.dump(res_list, fh, indent=2)
-print('Wrote', out)
+
+
+def main():
+    # worker processes re-import this module, so the scan only runs under __main__
+    crops = sorted(faces_dir.glob('*.jpg'))
+    res_list = sorted(face_parallel.match_crops(crops, gallery, labeled=True, threshold=1.0, top_k=5), key=lambda r: r['source'])
+    with out.open('w', encoding='utf-8') as fh:
+        json.dump(res_list, fh, indent=2)
+    print('Wrote', out)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+import numpy as np
+
+from case_agent.pipelines import crop_dedup, face_probes
+
+
+def test_hash_index_finds_near_duplicates_in_any_band():
+    index = crop_dedup.HashIndex(max_distance=4)
+    base = 0xF0F0_1234_ABCD_0FF0
+    index.add(base, "a.jpg")
+    index.add(base ^ (0xFF << 40), "b.jpg")
+    # flip 4 bits spread over different bands
+    near = base ^ (1 | 1 << 17 | 1 << 33 | 1 << 63)
+    assert index.find(near) == ("a.jpg", 4)
+    assert index.find(near ^ (1 << 5)) is None
+    assert index.find(base) == ("a.jpg", 0)
+
+
+def test_crop_dedup_persists_canonical_crops_and_reuses_embeddings(tmp_path):
+    db = tmp_path / "dedup.db"
+    rng = np.random.default_rng(0)
+    face = rng.integers(0, 255, (60, 50, 3), dtype=np.uint8)
+    other = rng.integers(0, 255, (60, 50, 3), dtype=np.uint8)
+
+    dedup = crop_dedup.CropDedup(db)
+    assert dedup.check(face, "a.pdf", "a_p1_f1.jpg", page=1) is None
+    brighter = np.clip(face.astype(int) + 3, 0, 255).astype(np.uint8)
+    assert dedup.check(brighter, "b.pdf", "b_p2_f1.jpg", page=2) == "a_p1_f1.jpg"
+    assert dedup.check(other, "b.pdf", "b_p2_f2.jpg", page=2) is None
+    assert dedup.flush() == 3
+    assert dedup.stats() == {"checked": 3, "unique": 2, "deduplicated": 1}
+
+    face_probes.save_faces("a.pdf", [{"bbox": None, "crop": "a_p1_f1.jpg", "embedding": np.ones(4)}], "dlib", db_path=db)
+    again = crop_dedup.CropDedup(db)
+    assert again.check(face, "c.pdf", "c_p1_f1.jpg") == "a_p1_f1.jpg"
+    assert np.allclose(again.embedding("a_p1_f1.jpg", "dlib"), 0.5)
+    assert again.embedding("a_p1_f1.jpg", "facenet-vggface2") is None
+
+
+def test_duplicate_crops_are_not_matched_again_on_rerun(tmp_path, monkeypatch):
+    from case_agent.pipelines import face_search
+    from scripts import run_full_scan
+
+    crop = tmp_path / "faces" / "doc_p1_0.jpg"
+    crop.parent.mkdir()
+    crop.write_bytes(b"jpg")
+    page = {"page": 1, "faces": [
+        {"bbox": [0, 0, 4, 4], "crop": str(crop)},
+        {"bbox": [8, 0, 4, 4], "crop": str(crop), "duplicate_of": str(crop)},
+    ]}
+
+    class Dedup:
+        def embedding(self, crop_path, model):
+            return None
+
+        def flush(self):
+            pass
+
+    matched = []
+    monkeypatch.setattr(run_full_scan, "process_pdf", lambda p, out, dedup=None: {"pages": [page]})
+    monkeypatch.setattr(run_full_scan, "shared_dedup", lambda db: Dedup())
+    monkeypatch.setattr(face_search, "_embedding_model_tag", lambda: "dlib")
+    monkeypatch.setattr(face_search, "compute_embeddings", lambda crops, batch_size=None: [np.ones(8) for _ in crops])
+    monkeypatch.setattr(face_search, "match_labeled_embedding", lambda emb, g, **k: matched.append(k["source"]) or {})
+    monkeypatch.setattr(face_search, "_persist_results", lambda *a, **k: None)
+
+    db = str(tmp_path / "scan.db")
+    for _ in range(2):
+        run_full_scan.process_pdf_file(tmp_path / "doc.pdf", tmp_path / "faces", tmp_path / "gallery", db)
+    assert matched == [str(crop), str(crop)]
+    faces = face_probes.load_faces(tmp_path / "doc.pdf", "dlib", db_path=db)
+    assert [f.get("duplicate_of") for f in faces] == [None, str(crop)]
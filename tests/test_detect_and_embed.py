@@ -0,0 +1,48 @@
+import types
+
+import numpy as np
+from PIL import Image
+
+from case_agent.pipelines import face_search
+
+
+def test_detect_and_embed_single_pass(tmp_path, monkeypatch):
+    calls = {"locations": 0, "encodings": 0}
+
+    def face_locations(img):
+        calls["locations"] += 1
+        return [(10, 30, 30, 10), (5, 60, 25, 40)]
+
+    def face_encodings(img, locations):
+        calls["encodings"] += 1
+        return [np.full(16, i + 1.0) for i in range(len(locations))]
+
+    fake = types.SimpleNamespace(face_locations=face_locations, face_encodings=face_encodings)
+    monkeypatch.setattr(face_search, "face_recognition", fake)
+
+    frame = np.zeros((64, 64, 3), dtype=np.uint8)
+    frame[:, :, 0] = 255  # blue in BGR order
+    with face_search.CropWriter() as writer:
+        faces = face_search.detect_and_embed(
+            frame, crops_dir=tmp_path / "crops", crop_stem="frame", bgr=True, writer=writer
+        )
+    assert calls == {"locations": 1, "encodings": 1}
+    assert [f["bbox"]["left"] for f in faces] == [10, 40]
+    assert faces[0]["embedding"].dtype == np.float32
+    crop = Image.open(faces[0]["crop"])
+    assert crop.size == (20, 20)
+    assert crop.getpixel((0, 0))[2] > 200  # written as RGB
+
+
+def test_match_labeled_embedding(tmp_path, monkeypatch):
+    root = tmp_path / "Images"
+    (root / "Alice").mkdir(parents=True)
+    Image.new("RGB", (8, 8)).save(root / "Alice" / "a1.jpg")
+    monkeypatch.setattr(face_search, "_compute_embedding", lambda p: np.ones(16))
+    face_search.invalidate_gallery_cache()
+
+    res = face_search.match_labeled_embedding(
+        np.ones(16), root, threshold=0.5, source="crop.jpg"
+    )
+    assert res["source"] == "crop.jpg"
+    assert res["subject_matches"][0]["subject"] == "Alice"
@@ -0,0 +1,23 @@
+import os
+
+from case_agent.pipelines import duplicates
+
+
+def test_find_duplicates_only_fully_hashes_partial_collisions(tmp_path):
+    big = os.urandom(300_000)
+    middle_changed = big[:150_000] + b"x" + big[150_001:]
+    files = {
+        "a.bin": big,
+        "b.bin": big,
+        "c.bin": middle_changed,  # same size, head and tail: needs a full hash
+        "d.bin": big[:-1] + b"y",  # same size, differs in the tail
+        "small1.txt": b"hello",
+        "small2.txt": b"hello",
+        "unique.txt": b"only one of this size",
+    }
+    for name, data in files.items():
+        (tmp_path / name).write_bytes(data)
+
+    groups, stats = duplicates.find_duplicates(sorted(tmp_path.iterdir()), partial_bytes=4096)
+    assert sorted(sorted(p.name for p in g) for g in groups) == [["a.bin", "b.bin"], ["small1.txt", "small2.txt"]]
+    assert stats["fully_hashed"] == 3 and stats["size_candidates"] == 6
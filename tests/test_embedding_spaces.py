@@ -0,0 +1,65 @@
+import numpy as np
+import pytest
+from PIL import Image
+
+from case_agent.pipelines import face_search
+from case_agent.pipelines.embedding_store import EmbeddingStore
+from case_agent.pipelines.face_index import EmbeddingSpaceError
+
+
+def _gallery(tmp_path):
+    root = tmp_path / "Images"
+    (root / "Alice").mkdir(parents=True)
+    Image.new("RGB", (8, 8)).save(root / "Alice" / "a1.jpg")
+    return root
+
+
+def _use_model(monkeypatch, model, calls):
+    dim = face_search.EMBEDDING_DIMS[model]
+
+    def fake(path):
+        calls.append(model)
+        return np.eye(dim)[0]
+
+    monkeypatch.setattr(face_search, "_embedding_model_tag", lambda: model)
+    monkeypatch.setattr(face_search, "_compute_embedding", fake)
+    monkeypatch.setattr(face_search, "compute_embeddings", lambda imgs, batch_size=32: [fake(i) for i in imgs])
+
+
+def test_gallery_stores_are_kept_per_model(tmp_path, monkeypatch):
+    root = _gallery(tmp_path)
+    calls = []
+    _use_model(monkeypatch, "dlib", calls)
+    assert face_search._open_labeled_store(root).dim == 128
+    _use_model(monkeypatch, "facenet-vggface2", calls)
+    store = face_search._open_labeled_store(root)
+    assert (store.model, store.dim) == ("facenet-vggface2", 512)
+    assert (root / ".labeled_face_store.dlib.json").exists()
+    assert (root / ".labeled_face_store.facenet-vggface2.json").exists()
+
+    # Switching back reuses the dlib store without re-embedding
+    _use_model(monkeypatch, "dlib", calls)
+    assert face_search._open_labeled_store(root).model == "dlib"
+    assert calls == ["dlib", "facenet-vggface2"]
+
+
+def test_store_of_other_model_is_re_embedded_and_probes_refused(tmp_path, monkeypatch):
+    root = _gallery(tmp_path)
+    # Pre-per-model store name holding FaceNet vectors
+    EmbeddingStore.write(
+        root, "labeled_face_store", np.eye(512)[:1], [str(root / "Alice" / "a1.jpg")],
+        subjects=["Alice"], model="facenet-vggface2",
+    )
+    calls = []
+    _use_model(monkeypatch, "dlib", calls)
+    assert face_search._open_labeled_store(root).dim == 128
+    assert calls == ["dlib"]
+
+    res = face_search.match_labeled_embedding(np.eye(128)[0], root, threshold=0.1, model="dlib")
+    assert res["subject_matches"][0]["subject"] == "Alice"
+    with pytest.raises(EmbeddingSpaceError):
+        face_search.match_labeled_embedding(np.eye(512)[0], root)
+    with pytest.raises(EmbeddingSpaceError):
+        face_search.match_labeled_embedding(np.eye(128)[0], root, model="facenet-vggface2")
+    with pytest.raises(EmbeddingSpaceError):
+        face_search._compare_embedding([0.0] * 128, [0.0] * 512)
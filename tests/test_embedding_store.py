@@ -0,0 +1,44 @@
+import pickle
+
+import numpy as np
+from PIL import Image
+
+from case_agent.pipelines import face_search
+from case_agent.pipelines.embedding_store import EmbeddingStore
+
+
+def test_store_roundtrip_is_memory_mapped(tmp_path):
+    matrix = np.array([[3.0, 4.0], [0.0, 2.0]])
+    EmbeddingStore.write(
+        tmp_path, "face_store", matrix, ["a.jpg", "b.jpg"], model="dlib"
+    )
+    store = EmbeddingStore.open(tmp_path, "face_store")
+    assert isinstance(store.matrix, np.memmap)
+    assert store.matrix.dtype == np.float32
+    assert store.model == "dlib"
+    assert list(store) == ["a.jpg", "b.jpg"]
+    assert np.allclose(store["a.jpg"], [0.6, 0.8])
+
+
+def test_legacy_pickle_caches_are_migrated(tmp_path, monkeypatch):
+    # Embedding must not be recomputed when a legacy cache exists
+    monkeypatch.setattr(face_search, "_compute_embedding", lambda p: None)
+
+    root = tmp_path / "Images"
+    (root / "Alice").mkdir(parents=True)
+    img = root / "Alice" / "a1.jpg"
+    Image.new("RGB", (8, 8)).save(img)
+    legacy = {"Alice": [{"path": str(img), "embedding": [0.0, 1.0, 0.0]}]}
+    with (root / ".labeled_face_cache.pkl").open("wb") as fh:
+        pickle.dump(legacy, fh)
+    with (tmp_path / ".face_cache.pkl").open("wb") as fh:
+        pickle.dump({str(img): np.array([2.0, 0.0])}, fh)
+
+    labeled = face_search._load_labeled_gallery(root)
+    assert list(labeled) == ["Alice"]
+    assert np.allclose(labeled["Alice"][0]["embedding"], [0.0, 1.0, 0.0])
+    assert (root / ".labeled_face_store.json").exists()
+
+    gallery = face_search._load_gallery_embeddings(tmp_path)
+    assert np.allclose(gallery[str(img)], [1.0, 0.0])
+    assert (tmp_path / ".face_store.json").exists()
@@ -0,0 +1,37 @@
+import numpy as np
+
+from case_agent.pipelines.face_ann import IVFIndex, benchmark_recall, load_or_build_ann
+from case_agent.pipelines.face_index import GalleryIndex, l2_normalize
+
+
+def _clustered_gallery(n=2000, dim=32, clusters=20, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, dim))
+    rows = centers[rng.integers(0, clusters, size=n)] + rng.normal(scale=0.3, size=(n, dim))
+    return l2_normalize(rows)
+
+
+def test_ivf_recall_improves_with_effort_and_reaches_exact():
+    matrix = _clustered_gallery()
+    ann = IVFIndex.build(matrix, nlist=16)
+    queries = matrix[:50] + 0.01
+    results = benchmark_recall(ann, matrix, queries, k=5, efforts=(1, 16))
+    assert results[0]["effort"] == "exact"
+    by_effort = {r["effort"]: r["recall"] for r in results}
+    # Probing every list is exhaustive
+    assert by_effort[16] == 1.0
+    assert by_effort[1] <= by_effort[16]
+
+
+def test_gallery_index_uses_persisted_ann(tmp_path):
+    matrix = _clustered_gallery(n=500)
+    ann = load_or_build_ann(tmp_path, "face_store", 1, matrix, backend="ivf")
+    assert (tmp_path / ".face_store.ann.json").exists()
+    reloaded = load_or_build_ann(tmp_path, "face_store", 1, matrix, backend="ivf")
+    assert np.array_equal(reloaded.list_rows, ann.list_rows)
+
+    index = GalleryIndex(matrix, [f"g{i}" for i in range(500)], normalized=True)
+    index.ann = reloaded
+    index.ann_effort = 64
+    probe = matrix[7]
+    assert index.search(probe, top_k=3) == index.search(probe, top_k=3, exact=True)
@@ -0,0 +1,42 @@
+import numpy as np
+
+from case_agent.pipelines.face_detect import candidate_regions, detect_boxes, match_recall
+
+
+def _blob_detector(calls):
+    """Fake detector: one box around the bright pixels of the image."""
+
+    def detect(img):
+        calls.append(img.shape[:2])
+        ys, xs = np.nonzero(img[:, :, 0] > 128)
+        if ys.size == 0:
+            return []
+        return [(int(ys.min()), int(xs.max()) + 1, int(ys.max()) + 1, int(xs.min()))]
+
+    return detect
+
+
+def test_downscale_mode_refines_in_full_resolution_regions():
+    img = np.zeros((4000, 3000, 3), dtype=np.uint8)
+    img[2000:2200, 1000:1160] = 255
+    calls = []
+    boxes = detect_boxes(img, _blob_detector(calls), mode="downscale", max_side=500)
+    # Exact original coordinates from the region pass
+    assert boxes == [(2000, 1160, 2200, 1000)]
+    # Coarse pass on the small image, then one small full-resolution region
+    assert calls[0] == (500, 375)
+    assert calls[1][0] < 500 and calls[1][1] < 500
+    assert match_recall(detect_boxes(img, _blob_detector([]), mode="full"), boxes) == (1, 1)
+
+
+def test_no_candidates_skips_full_resolution_pass():
+    img = np.zeros((4000, 3000, 3), dtype=np.uint8)
+    calls = []
+    assert detect_boxes(img, _blob_detector(calls), mode="haar", max_side=500,
+                        haar=lambda small: []) == []
+    assert calls == []
+
+
+def test_candidate_regions_merge_overlaps():
+    regions = candidate_regions([(10, 30, 30, 10), (20, 45, 40, 25)], (100, 100), pad=0.5)
+    assert regions == [(0, 55, 50, 0)]
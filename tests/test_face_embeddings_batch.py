@@ -0,0 +1,50 @@
+import numpy as np
+from PIL import Image
+
+from case_agent.pipelines import face_search
+
+
+def test_compute_embeddings_batches_facenet(tmp_path, monkeypatch):
+    paths = []
+    for i in range(5):
+        p = tmp_path / f"crop{i}.jpg"
+        Image.new("RGB", (40, 40), color=(i * 40, 0, 0)).save(p)
+        paths.append(p)
+    missing = tmp_path / "missing.jpg"
+
+    calls = []
+
+    def fake_forward(images, batch_size=32):
+        calls.append(len(images))
+        return [np.full(8, float(i)) for i in range(len(images))]
+
+    monkeypatch.setattr(face_search, "face_recognition", None)
+    monkeypatch.setattr(face_search, "InceptionResnetV1", object)
+    monkeypatch.setattr(face_search, "_facenet_forward", fake_forward)
+
+    embs = face_search.compute_embeddings(paths[:2] + [missing] + paths[2:], batch_size=2)
+    # One forward call for all loadable crops; results stay aligned with inputs
+    assert calls == [5]
+    assert embs[2] is None
+    assert [e[0] for e in embs if e is not None] == [0.0, 1.0, 2.0, 3.0, 4.0]
+
+
+def test_labeled_batch_search_matches_single(tmp_path, monkeypatch):
+    root = tmp_path / "Images"
+    (root / "Alice").mkdir(parents=True)
+    Image.new("RGB", (8, 8)).save(root / "Alice" / "a1.jpg")
+    probes = []
+    for i in range(3):
+        p = tmp_path / f"probe{i}.jpg"
+        Image.new("RGB", (8, 8)).save(p)
+        probes.append(p)
+    monkeypatch.setattr(face_search, "_compute_embedding", lambda p: np.ones(16))
+    face_search.invalidate_gallery_cache()
+
+    batch = face_search.search_labeled_gallery_for_images(probes, root, threshold=0.5)
+    single = [
+        face_search.search_labeled_gallery_for_image(p, root, threshold=0.5)
+        for p in probes
+    ]
+    assert batch == single
+    assert batch[0]["subject_matches"][0]["subject"] == "Alice"
@@ -0,0 +1,71 @@
+import numpy as np
+
+from case_agent.pipelines import face_search
+from case_agent.pipelines.face_index import GalleryIndex, select_top_k
+
+
+def test_gallery_index_batch_matches_pairwise_distances():
+    rng = np.random.default_rng(0)
+    gallery = {f"g{i}.jpg": rng.normal(size=128) for i in range(50)}
+    probes = rng.normal(size=(4, 128))
+    index = GalleryIndex.from_embeddings(gallery)
+    assert index.matrix.dtype == np.float32
+    assert abs(np.linalg.norm(index.matrix[0]) - 1.0) < 1e-5
+
+    batch = index.search_batch(probes, top_k=5)
+    for probe, hits in zip(probes, batch):
+        # Reference: pure-Python distance on normalized vectors, full sort
+        unit = probe / np.linalg.norm(probe)
+        ref = sorted(
+            (
+                face_search._compare_embedding(unit, emb / np.linalg.norm(emb)),
+                path,
+            )
+            for path, emb in gallery.items()
+        )[:5]
+        assert [index.paths[r] for r, _ in hits] == [p for _, p in ref]
+        assert np.allclose([d for _, d in hits], [d for d, _ in ref], atol=1e-4)
+
+
+def test_select_top_k_threshold_and_subject_prototypes():
+    dists = np.array([0.5, 0.1, 0.9, 0.1, 0.3])
+    assert select_top_k(dists, top_k=2) == [(1, 0.1), (3, 0.1)]
+    assert [r for r, _ in select_top_k(dists, threshold=0.4)] == [1, 3, 4]
+    assert select_top_k(dists, top_k=0) == []
+
+    labeled = {
+        "A": [{"path": "a1", "embedding": [1.0, 0.0]}, {"path": "a2", "embedding": [0.0, 1.0]}],
+        "B": [{"path": "b1", "embedding": [-1.0, 0.0]}],
+    }
+    index = GalleryIndex.from_labeled(labeled)
+    assert index.subject_slices() == {"A": slice(0, 2), "B": slice(2, 3)}
+    protos = index.subject_prototypes()
+    assert protos.subjects == ["A", "B"]
+    assert np.allclose(protos.matrix[0], [2 ** -0.5, 2 ** -0.5], atol=1e-6)
+
+
+def test_compact_gallery_shortlist_is_exact_and_flags_outliers():
+    rng = np.random.default_rng(1)
+    centers = rng.normal(size=(6, 64))
+    labeled = {
+        f"S{s}": [
+            {"path": f"S{s}/{i}.jpg", "embedding": centers[s] + 0.3 * rng.normal(size=64)}
+            for i in range(40)
+        ]
+        for s in range(6)
+    }
+    labeled["S0"].append({"path": "S0/wrong.jpg", "embedding": centers[3]})
+    index = GalleryIndex.from_labeled(labeled)
+    compact = index.compact(per_subject=4, outlier_distance=0.9)
+    assert compact.outliers == {"S0": ["S0/wrong.jpg"]}
+    assert len(compact) == 6 * 4 + 1
+
+    gallery = face_search.CachedGallery(index)
+    exhaustive = face_search.CachedGallery(index)
+    exhaustive.compact = None
+    gallery.compact = compact
+    for probe in centers + 0.35 * rng.normal(size=(6, 64)):
+        for threshold in (0.4, 0.6, 0.8):
+            fast = face_search._match_labeled(probe, gallery, "p", threshold, 3, False)
+            ref = face_search._match_labeled(probe, exhaustive, "p", threshold, 3, False)
+            assert fast == ref
@@ -0,0 +1,44 @@
+import numpy as np
+from PIL import Image
+
+from case_agent.db.init_db import get_session, init_db
+from case_agent.db.models import FaceMatch
+from case_agent.pipelines import face_parallel, face_search
+
+
+def _setup(tmp_path, n_crops):
+    root = tmp_path / "Images"
+    (root / "Alice").mkdir(parents=True)
+    Image.new("RGB", (8, 8)).save(root / "Alice" / "a1.jpg")
+    crops = []
+    for i in range(n_crops):
+        crops.append(tmp_path / f"crop{i}.jpg")
+        Image.new("RGB", (8, 8)).save(crops[-1])
+    return root, crops
+
+
+def test_match_crops_inline_chunks_and_single_writer(tmp_path, monkeypatch):
+    root, crops = _setup(tmp_path, 5)
+    monkeypatch.setattr(face_search, "_compute_embedding", lambda p: np.ones(4))
+    face_search.invalidate_gallery_cache()
+    chunks = []
+    real = face_search.search_labeled_gallery_for_images
+
+    def spy(paths, *args, **kwargs):
+        chunks.append(len(paths))
+        return real(paths, *args, **kwargs)
+
+    monkeypatch.setattr(face_search, "search_labeled_gallery_for_images", spy)
+    results = face_parallel.match_crops(crops, root, threshold=0.5, workers=1, chunk_size=2)
+    db = str(tmp_path / "case.db")
+    counts = face_parallel.persist_results(results, db, aggregate=True)
+    assert chunks == [2, 2, 1]
+    assert counts == {"results": 5, "persisted": 5, "failed": 0}
+    init_db(db)
+    assert get_session().query(FaceMatch).filter_by(subject="Alice").count() == 5
+
+
+def test_match_crops_process_pool_returns_every_crop(tmp_path):
+    root, crops = _setup(tmp_path, 7)
+    results = list(face_parallel.match_crops(crops, root, workers=2, chunk_size=3))
+    assert sorted(r["source"] for r in results) == sorted(str(c) for c in crops)
@@ -0,0 +1,85 @@
+import numpy as np
+
+from case_agent.db.init_db import get_session, init_db
+from case_agent.db.models import EvidenceFile, FaceEmbedding
+from case_agent.pipelines import face_probes
+
+
+def test_save_and_load_face_embeddings(tmp_path):
+    db = str(tmp_path / "t.db")
+    init_db(db)
+    session = get_session()
+    session.add(EvidenceFile(path="case/doc.pdf", sha256="aa"))
+    session.add(EvidenceFile(path="case/empty.jpg", sha256="bb"))
+    session.commit()
+
+    faces = [
+        {"bbox": {"x": 1, "y": 2, "w": 3, "h": 4}, "embedding": np.arange(1, 9), "crop": "c1.jpg", "page": 2},
+        {"bbox": {"x": 5, "y": 6, "w": 7, "h": 8}, "embedding": np.ones(8), "crop": "c2.jpg", "page": 1},
+        {"bbox": None, "embedding": None},
+    ]
+    assert face_probes.save_faces("case/doc.pdf", faces, "dlib", db_path=db) == 2
+    # Saving again replaces rather than duplicates
+    face_probes.save_faces("case/doc.pdf", faces, "dlib", db_path=db)
+
+    loaded = face_probes.load_faces("case/doc.pdf", "dlib", db_path=db)
+    assert [f["page"] for f in loaded] == [1, 2]
+    assert loaded[1]["crop"] == "c1.jpg"
+    assert loaded[1]["embedding"].dtype == np.float32
+    assert np.allclose(loaded[1]["embedding"], np.arange(1, 9) / np.linalg.norm(np.arange(1, 9)))
+    row = get_session().query(FaceEmbedding).filter_by(page=2).one()
+    assert (row.model, row.dim, row.file_id is not None) == ("dlib", 8, True)
+
+    # Unscanned vs scanned-without-faces vs other embedding model
+    assert face_probes.load_faces("case/empty.jpg", "dlib", db_path=db) is None
+    face_probes.save_faces("case/empty.jpg", [], "dlib", db_path=db)
+    assert face_probes.load_faces("case/empty.jpg", "dlib", db_path=db) == []
+    assert face_probes.load_faces("case/doc.pdf", "facenet-vggface2", db_path=db) is None
+
+
+def test_faces_to_frames_groups_by_timestamp():
+    faces = [
+        {"bbox": {"top": 0}, "embedding": np.ones(2), "timestamp": 5.0},
+        {"bbox": {"top": 1}, "embedding": np.ones(2), "timestamp": 0.0},
+        {"bbox": {"top": 2}, "embedding": np.ones(2), "timestamp": 5.0},
+    ]
+    frames = face_probes.faces_to_frames(faces)
+    assert [(f["timestamp"], len(f["detections"])) for f in frames] == [(0.0, 1), (5.0, 2)]
+
+
+def test_changed_file_content_is_scanned_again(tmp_path, monkeypatch):
+    import os
+
+    from case_agent.pipelines import face_search, hash_inventory
+    from scripts import run_full_scan
+
+    ev = tmp_path / "evidence"
+    ev.mkdir()
+    img = ev / "photo.jpg"
+    img.write_bytes(b"first content")
+    db = str(tmp_path / "scan.db")
+    hash_inventory.walk_and_hash(ev, db_path=db)
+
+    detected = []
+    monkeypatch.setattr(face_search, "_embedding_model_tag", lambda: "dlib")
+    monkeypatch.setattr(
+        face_search,
+        "detect_and_embed",
+        lambda p, crops_dir=None: detected.append(p.read_bytes())
+        or [{"bbox": None, "embedding": np.ones(8), "crop": "c.jpg"}],
+    )
+    monkeypatch.setattr(face_search, "match_labeled_embedding", lambda *a, **k: {})
+    monkeypatch.setattr(face_search, "_persist_results", lambda *a, **k: None)
+
+    run_full_scan.process_image_file(img, tmp_path / "faces", tmp_path / "gallery", db)
+    run_full_scan.process_image_file(img, tmp_path / "faces", tmp_path / "gallery", db)
+    assert detected == [b"first content"]
+
+    # changed in place: the inventory keeps the row and updates its sha256
+    img.write_bytes(b"second content")
+    st = img.stat()
+    os.utime(img, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+    hash_inventory.walk_and_hash(ev, db_path=db)
+    run_full_scan.process_image_file(img, tmp_path / "faces", tmp_path / "gallery", db)
+    assert detected == [b"first content", b"second content"]
+    assert len(face_probes.load_faces(img, "dlib", db_path=db)) == 1
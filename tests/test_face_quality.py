@@ -0,0 +1,56 @@
+import types
+
+import numpy as np
+
+from case_agent import config
+from case_agent.pipelines import face_quality, face_search
+
+
+def _textured(h, w, seed=0):
+    return np.random.default_rng(seed).integers(40, 200, (h, w, 3), dtype=np.uint8)
+
+
+def test_quality_filter_rejects_small_blurry_dark_and_profile_faces():
+    qf = face_quality.QualityFilter(min_size=40, min_sharpness=15.0, max_yaw=0.5)
+    image = _textured(200, 400)
+    image[:, 100:200] = 128  # flat (blurry) region
+    image[:, 200:300] = image[:, 200:300] // 20  # dark region
+    frontal = {"left_eye": [(10, 10)], "right_eye": [(30, 10)], "nose_tip": [(20, 25)]}
+    profile = {"left_eye": [(10, 10)], "right_eye": [(30, 10)], "nose_tip": [(35, 25)]}
+
+    assert qf.check(image, (0, 80, 80, 0), frontal)
+    assert not qf.check(image, (0, 30, 30, 0))  # 30x30 false positive
+    assert not qf.check(image, (0, 180, 80, 100))
+    assert not qf.check(image, (0, 280, 80, 200))
+    assert not qf.check(image, (0, 380, 80, 300), profile)
+    assert qf.stats() == {
+        "checked": 5,
+        "passed": 1,
+        "rejected_size": 1,
+        "rejected_blur": 1,
+        "rejected_exposure": 1,
+        "rejected_pose": 1,
+        "embeddings_saved": 4,
+    }
+
+
+def test_detect_and_embed_skips_rejected_faces(monkeypatch):
+    embedded = []
+
+    def face_encodings(img, locations):
+        embedded.extend(locations)
+        return [np.ones(8) for _ in locations]
+
+    fake = types.SimpleNamespace(
+        face_locations=lambda img: [(0, 80, 80, 0), (100, 130, 130, 100)],
+        face_encodings=face_encodings,
+        face_landmarks=lambda img, boxes, model="large": [{} for _ in boxes],
+    )
+    monkeypatch.setattr(face_search, "face_recognition", fake)
+    monkeypatch.setattr(config, "FACE_QUALITY_FILTER", True)
+    monkeypatch.setattr(face_quality, "_shared_filter", None)
+
+    faces = face_search.detect_and_embed(_textured(200, 200))
+    assert [f["bbox"]["top"] for f in faces] == [0]
+    assert embedded == [(0, 80, 80, 0)]
+    assert face_quality.shared_filter().stats()["embeddings_saved"] == 1
@@ -0,0 +1,94 @@
+import numpy as np
+from PIL import Image
+
+from case_agent.db.init_db import get_session, init_db
+from case_agent.db.models import FaceMatch
+from case_agent.pipelines import face_probes, face_rematch, face_search
+
+VECS = {"Alice": np.eye(8)[0], "Bob": np.eye(8)[1], "Carol": np.eye(8)[2]}
+
+
+def _add_subject(root, name):
+    (root / name).mkdir(parents=True)
+    Image.new("RGB", (8, 8)).save(root / name / f"{name}1.jpg")
+
+
+def test_rematch_scores_only_changed_subjects(tmp_path, monkeypatch):
+    monkeypatch.setattr(
+        face_search, "_compute_embedding", lambda p: VECS[__import__("pathlib").Path(p).parent.name]
+    )
+    monkeypatch.setattr(face_search, "_embedding_model_tag", lambda: "dlib")
+    root = tmp_path / "Images"
+    _add_subject(root, "Alice")
+    db = str(tmp_path / "case.db")
+    probes = [{"bbox": None, "embedding": VECS[n], "crop": f"crops/{n}.jpg"} for n in ("Alice", "Carol")]
+    face_probes.save_faces("case/img.jpg", probes, "dlib", db_path=db)
+
+    first = face_rematch.rematch(db, root, threshold=0.3)
+    assert (first["subjects_rescored"], first["inserted"]) == (1, 1)
+
+    # Nothing changed: nothing re-scored or written
+    again = face_rematch.rematch(db, root, threshold=0.3)
+    assert (again["subjects_rescored"], again["inserted"], again["unchanged"]) == (0, 0, 0)
+
+    _add_subject(root, "Bob")
+    _add_subject(root, "Carol")
+    delta = face_rematch.rematch(db, root, threshold=0.3)
+    assert delta["subjects_rescored"] == 2
+    assert (delta["inserted"], delta["deleted"]) == (1, 0)
+
+    init_db(db)
+    rows = {(fm.source, fm.subject) for fm in get_session().query(FaceMatch)}
+    assert rows == {("crops/Alice.jpg", "Alice"), ("crops/Carol.jpg", "Carol")}
+
+
+def test_best_subject_matches_blocks():
+    index = face_search.GalleryIndex(
+        np.stack([VECS["Alice"], VECS["Alice"] + 0.1, VECS["Bob"]]),
+        ["a1", "a2", "b1"],
+        subjects=["Alice", "Alice", "Bob"],
+    )
+    probes = np.stack([VECS["Bob"], VECS["Alice"] + 0.1, VECS["Carol"]]).astype(np.float32)
+    hits = face_rematch.best_subject_matches(probes, index, ["Alice", "Bob"], 0.2, block_size=2)
+    assert sorted((k, v[1]) for k, v in hits.items()) == [((0, "Bob"), "b1"), ((1, "Alice"), "a2")]
+
+
+def test_removed_subject_keeps_non_probe_rows_and_is_cleaned_on_full(tmp_path, monkeypatch):
+    import shutil
+
+    monkeypatch.setattr(
+        face_search, "_compute_embedding", lambda p: VECS[__import__("pathlib").Path(p).parent.name]
+    )
+    monkeypatch.setattr(face_search, "_embedding_model_tag", lambda: "dlib")
+    root = tmp_path / "Images"
+    _add_subject(root, "Alice")
+    _add_subject(root, "Bob")
+    db = str(tmp_path / "case.db")
+    probes = [{"bbox": None, "embedding": VECS["Alice"], "crop": "crops/Alice.jpg"}]
+    face_probes.save_faces("case/img.jpg", probes, "dlib", db_path=db)
+    assert face_rematch.rematch(db, root, threshold=0.3)["inserted"] == 1
+
+    # written by another matcher (e.g. a whole-image fallback), not a stored probe
+    init_db(db)
+    session = get_session()
+    session.add(FaceMatch(source="case/other.jpg", subject="Alice", gallery_path="x", distance=0.1))
+    session.commit()
+    session.close()
+
+    shutil.rmtree(root / "Alice")
+    counts = face_rematch.rematch(db, root, threshold=0.3, full=True)
+    assert (counts["subjects_removed"], counts["deleted"]) == (1, 1)
+    init_db(db)
+    rows = {(fm.source, fm.subject) for fm in get_session().query(FaceMatch)}
+    assert rows == {("case/other.jpg", "Alice")}
+
+
+def test_untagged_gallery_without_backend_is_rejected(tmp_path, monkeypatch):
+    import pytest
+
+    monkeypatch.setattr(face_search, "_compute_embedding", lambda p: VECS["Alice"])
+    monkeypatch.setattr(face_search, "_embedding_model_tag", lambda: None)
+    root = tmp_path / "Images"
+    _add_subject(root, "Alice")
+    with pytest.raises(face_search.EmbeddingSpaceError, match="no model tag"):
+        face_rematch.rematch(str(tmp_path / "case.db"), root)
@@ -0,0 +1,61 @@
+import sqlite3
+
+import numpy as np
+
+from case_agent.pipelines import face_search
+from case_agent.pipelines.face_tracking import track_faces
+
+
+def _det(left, emb):
+    return {"bbox": {"top": 10, "right": left + 40, "bottom": 50, "left": left}, "embedding": emb}
+
+
+def test_tracks_link_by_iou_and_embedding():
+    a = np.eye(8)[0]
+    b = np.eye(8)[1]
+    frames = [
+        {"timestamp": 0.0, "detections": [_det(0, a), _det(200, b)]},
+        {"timestamp": 5.0, "detections": [_det(5, a + 0.05), _det(205, b)]},
+        # 'a' moved across the frame: linked by embedding alone
+        {"timestamp": 10.0, "detections": [_det(400, a)]},
+        # long gap closes the track; the same face starts a new one
+        {"timestamp": 60.0, "detections": [_det(0, a)]},
+    ]
+    tracks = track_faces(frames, max_gap=10.0)
+    assert [(t.start, t.end, len(t.timestamps)) for t in tracks] == [
+        (0.0, 10.0, 3), (0.0, 5.0, 2), (60.0, 60.0, 1)
+    ]
+    assert np.allclose(np.linalg.norm(tracks[0].prototype()), 1.0)
+
+
+def test_video_tracks_matched_once_and_persisted(tmp_path, monkeypatch):
+    emb = np.ones(8)
+    frames = [{"timestamp": float(t), "detections": [_det(0, emb)]} for t in range(0, 30, 5)]
+    monkeypatch.setattr(face_search, "find_faces_in_video", lambda *a, **k: frames)
+    monkeypatch.setattr(face_search, "_load_gallery_embeddings", lambda d: {"g1.jpg": np.ones(8)})
+    face_search.invalidate_gallery_cache()
+
+    res = face_search.search_video_tracks("clip.mp4", tmp_path, threshold=0.5)
+    assert res["sampling"]["tracks"] == 1
+    track = res["tracks"][0]
+    assert (track["start"], track["end"], track["num_detections"]) == (0.0, 25.0, 6)
+    assert track["matches"][0]["gallery_path"] == "g1.jpg"
+
+    db = tmp_path / "t.db"
+    face_search._persist_results(str(db), res, aggregate=True)
+    conn = sqlite3.connect(str(db))
+    rows = conn.execute("SELECT gallery_path, track_start, track_end, num_detections FROM face_matches").fetchall()
+    conn.close()
+    assert rows == [("g1.jpg", 0.0, 25.0, 6)]
+
+
+def test_init_db_checks_columns_once_per_database(tmp_path, monkeypatch):
+    from case_agent.db import init_db as db
+
+    calls = []
+    real = db._add_missing_columns
+    monkeypatch.setattr(db, "_add_missing_columns", lambda engine: calls.append(engine.url) or real(engine))
+    for _ in range(3):
+        db.init_db(tmp_path / "one.db")
+    db.init_db(tmp_path / "two.db")
+    assert len(calls) == 2
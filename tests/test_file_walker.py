@@ -0,0 +1,101 @@
+import io
+import os
+from pathlib import Path
+
+from case_agent.pipelines import file_walker, hash_inventory
+
+
+def _tree(root):
+    for rel in ("a.txt", "d1/b.txt", "d1/d2/c.txt", "d3/e.txt"):
+        p = root / rel
+        p.parent.mkdir(parents=True, exist_ok=True)
+        p.write_text(rel)
+
+
+def test_scan_tree_matches_os_walk_with_cached_stats(tmp_path):
+    _tree(tmp_path)
+    (tmp_path / "empty").mkdir()
+    found = file_walker.scan_tree(tmp_path, workers=3)
+    expected = sorted(str(Path(r) / f) for r, _d, fs in os.walk(tmp_path) for f in fs)
+    assert [p for p, _ in found] == expected
+    assert all(st.st_size == os.path.getsize(p) for p, st in found)
+
+
+def test_manifest_inventory_and_persisted_file_list(tmp_path, monkeypatch):
+    ev = tmp_path / "ev"
+    _tree(ev)
+    db = tmp_path / "walk.db"
+    hash_inventory.walk_and_hash(ev, db_path=db)
+
+    manifest = f"# exported list\na.txt\t5\n{{\"path\": \"{(ev / 'd3' / 'e.txt').as_posix()}\", \"size\": 8}}\n"
+    monkeypatch.setattr("sys.stdin", io.StringIO(manifest))
+    files = file_walker.manifest_files("-", root=ev)
+    assert [Path(p).name for p, _ in files] == ["a.txt", "e.txt"]
+
+    # a partial manifest does not mark the unlisted files deleted
+    inv = hash_inventory.walk_and_hash(ev, db_path=db, files=files)
+    assert inv.summary["skipped"] == 2 and inv.summary["deleted"] == 0
+    listed = hash_inventory.inventoried_files(ev, db_path=db)
+    assert [p.relative_to(ev).as_posix() for p in listed] == ["a.txt", "d1/b.txt", "d1/d2/c.txt", "d3/e.txt"]
+
+
+def _no_inode(st):
+    # what DirEntry.stat() returns on Windows
+    fields = list(st)
+    fields[1] = 0
+    extra = {k: getattr(st, k) for k in dir(st) if k.startswith("st_") and k.endswith(("time", "time_ns"))}
+    return os.stat_result(fields, extra)
+
+
+def test_scan_tree_replaces_zero_inodes_from_listing(tmp_path, monkeypatch):
+    _tree(tmp_path)
+    real_scandir = os.scandir
+
+    class NoInodeEntry:
+        def __init__(self, entry):
+            self._entry = entry
+            self.path = entry.path
+
+        def is_dir(self, follow_symlinks=True):
+            return self._entry.is_dir(follow_symlinks=follow_symlinks)
+
+        def is_file(self):
+            return self._entry.is_file()
+
+        def stat(self):
+            return _no_inode(self._entry.stat())
+
+    class Listing:
+        def __init__(self, path):
+            self._it = real_scandir(path)
+
+        def __enter__(self):
+            return (NoInodeEntry(e) for e in self._it)
+
+        def __exit__(self, *exc):
+            self._it.close()
+
+    monkeypatch.setattr(file_walker.os, "scandir", Listing)
+    found = dict(file_walker.scan_tree(tmp_path))
+    assert len(found) == 4
+    assert all(st.st_ino == os.stat(p).st_ino != 0 for p, st in found.items())
+
+
+def test_zero_inode_is_never_taken_as_a_move(tmp_path):
+    import hashlib
+
+    ev = tmp_path / "ev"
+    ev.mkdir()
+    old, new = ev / "old.bin", ev / "new.bin"
+    old.write_bytes(b"aaaa")
+    db = tmp_path / "walk.db"
+    hash_inventory.walk_and_hash(ev, db_path=db, files=[(str(old), _no_inode(old.stat()))])
+
+    # a different file with the same size and mtime appears as the old one vanishes
+    st = old.stat()
+    old.unlink()
+    new.write_bytes(b"bbbb")
+    os.utime(new, ns=(st.st_atime_ns, st.st_mtime_ns))
+    inv = hash_inventory.walk_and_hash(ev, db_path=db, files=[(str(new), _no_inode(new.stat()))])
+    assert inv.summary["moved"] == 0 and inv.summary["hashed"] == 1
+    assert inv[0]["sha256"] == hashlib.sha256(b"bbbb").hexdigest()
@@ -0,0 +1,32 @@
+import numpy as np
+
+from case_agent.pipelines import frame_ring
+
+
+def _frame_sum(image, desc):
+    return int(image[..., 0].sum()), image.shape
+
+
+def test_process_frames_hands_off_through_shared_memory():
+    frames = (
+        (np.full((20 + i, 30, 3), i, dtype=np.uint8), {"source": "clip.mp4", "timestamp": i * 5.0})
+        for i in range(6)
+    )
+    out = sorted(
+        (desc.timestamp, desc.slot, res)
+        for desc, res in frame_ring.process_frames(frames, _frame_sum, workers=2, slots=2)
+    )
+    assert [ts for ts, _slot, _res in out] == [0.0, 5.0, 10.0, 15.0, 20.0, 25.0]
+    assert {slot for _ts, slot, _res in out} <= {0, 1}
+    assert [res for _ts, _slot, res in out] == [
+        (i * (20 + i) * 30, (20 + i, 30, 3)) for i in range(6)
+    ]
+
+
+def test_ring_grows_slots_and_blocks_when_full():
+    with frame_ring.FrameRing(1, slot_bytes=16) as ring:
+        desc = ring.put(np.arange(64, dtype=np.uint8).reshape(8, 8), "page.pdf", page=3)
+        assert ring.put(np.zeros(4, dtype=np.uint8), "page.pdf") is None
+        assert np.array_equal(frame_ring.attach(desc), np.arange(64).reshape(8, 8))
+        ring.release(desc)
+        assert ring.free_slots == 1
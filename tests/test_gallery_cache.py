@@ -0,0 +1,57 @@
+import numpy as np
+from PIL import Image
+
+from case_agent.pipelines import face_search
+
+
+def test_labeled_search_reuses_cached_gallery(tmp_path, monkeypatch):
+    root = tmp_path / "Images"
+    (root / "Alice").mkdir(parents=True)
+    Image.new("RGB", (8, 8)).save(root / "Alice" / "a1.jpg")
+    probe = tmp_path / "probe.jpg"
+    Image.new("RGB", (8, 8)).save(probe)
+    monkeypatch.setattr(face_search, "_compute_embedding", lambda p: np.ones(16))
+
+    loads = []
+    real_open = face_search._open_labeled_store
+
+    def counting_open(d):
+        loads.append(d)
+        return real_open(d)
+
+    monkeypatch.setattr(face_search, "_open_labeled_store", counting_open)
+    face_search.invalidate_gallery_cache()
+
+    for _ in range(3):
+        res = face_search.search_labeled_gallery_for_image(probe, root, threshold=0.5)
+        assert res["subject_matches"][0]["subject"] == "Alice"
+    assert len(loads) == 1
+
+    cached = face_search.load_gallery(root, labeled=True)
+    assert cached.prototypes.subjects == ["Alice"]
+    assert cached.members["Alice"].shape == (1, 16)
+
+    # New gallery images are picked up after an explicit invalidate()
+    Image.new("RGB", (8, 8)).save(root / "Alice" / "a2.jpg")
+    face_search.invalidate_gallery_cache(root)
+    face_search.search_labeled_gallery_for_image(probe, root)
+    assert len(loads) == 2
+    assert face_search.load_gallery(root, labeled=True).members["Alice"].shape == (2, 16)
+    assert len(loads) == 2
+
+
+def test_ann_index_is_built_for_unlabeled_galleries_only(tmp_path, monkeypatch):
+    from case_agent import config
+
+    root = tmp_path / "Images"
+    (root / "Alice").mkdir(parents=True)
+    for i in range(3):
+        Image.new("RGB", (8, 8)).save(root / "Alice" / f"a{i}.jpg")
+    monkeypatch.setattr(face_search, "_compute_embedding", lambda p: np.random.default_rng(int(str(p)[-5])).normal(size=16))
+    monkeypatch.setattr(config, "FACE_ANN_MIN_GALLERY", 1)
+    monkeypatch.setattr(config, "FACE_ANN_BACKEND", "ivf")
+    face_search.invalidate_gallery_cache()
+
+    assert face_search.load_gallery(root, labeled=True).index.ann is None
+    assert face_search.load_gallery(root / "Alice").index.ann is not None
+    assert not list(root.glob(".*.ann.json"))
@@ -0,0 +1,45 @@
+import os
+
+import numpy as np
+from PIL import Image
+
+from case_agent.pipelines import face_search
+
+
+def test_labeled_gallery_refresh_embeds_only_changes(tmp_path, monkeypatch):
+    calls = []
+
+    def fake_compute_embedding(path):
+        calls.append(os.path.basename(str(path)))
+        return np.ones(8) if "Alice" in str(path) else -np.ones(8)
+
+    monkeypatch.setattr(face_search, "_compute_embedding", fake_compute_embedding)
+    root = tmp_path / "Images"
+    (root / "Alice").mkdir(parents=True)
+    Image.new("RGB", (8, 8), "red").save(root / "Alice" / "a1.jpg")
+    Image.new("RGB", (8, 8), "blue").save(root / "Alice" / "a2.jpg")
+
+    face_search._load_labeled_gallery(root)
+    assert sorted(calls) == ["a1.jpg", "a2.jpg"]
+
+    # Unchanged directory: nothing is re-embedded
+    calls.clear()
+    face_search._load_labeled_gallery(root)
+    assert calls == []
+
+    # New subject folder is picked up; a touched file with same content is not re-embedded
+    (root / "Bob").mkdir()
+    Image.new("RGB", (8, 8), "green").save(root / "Bob" / "b1.jpg")
+    st = os.stat(root / "Alice" / "a1.jpg")
+    os.utime(root / "Alice" / "a1.jpg", ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+    (root / "Alice" / "a2.jpg").unlink()
+    labeled = face_search._load_labeled_gallery(root)
+    assert calls == ["b1.jpg"]
+    assert [it["path"] for it in labeled["Alice"]] == [str(root / "Alice" / "a1.jpg")]
+    assert list(labeled) == ["Alice", "Bob"]
+
+    # Changed content is re-embedded
+    calls.clear()
+    Image.new("RGB", (16, 16), "white").save(root / "Bob" / "b1.jpg")
+    face_search._load_labeled_gallery(root)
+    assert calls == ["b1.jpg"]
@@ -0,0 +1,98 @@
+import os
+
+from case_agent.db.init_db import get_session
+from case_agent.db.models import EvidenceFile
+from case_agent.pipelines import hash_engine, hash_inventory
+
+
+def test_incremental_inventory_skips_unchanged_and_tracks_moves(tmp_path, monkeypatch):
+    ev = tmp_path / "evidence"
+    (ev / "sub").mkdir(parents=True)
+    for name in ("a.txt", "b.txt", "c.txt"):
+        (ev / name).write_text(name * 10)
+    db = tmp_path / "inv.db"
+
+    hashed = []
+    real = hash_engine.hash_file
+    monkeypatch.setattr(hash_engine, "hash_file", lambda p, *a, **k: hashed.append(p.name) or real(p, *a, **k))
+
+    first = hash_inventory.walk_and_hash(ev, db_path=db)
+    assert first.summary["added"] == 3 and len(hashed) == 3
+
+    hashed.clear()
+    (ev / "a.txt").write_text("changed content")
+    st = (ev / "a.txt").stat()
+    os.utime(ev / "a.txt", ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+    (ev / "b.txt").rename(ev / "sub" / "b.txt")
+    (ev / "c.txt").unlink()
+    second = hash_inventory.walk_and_hash(ev, db_path=db)
+    assert hashed == ["a.txt"]
+    assert {k: second.summary[k] for k in ("skipped", "hashed", "changed", "moved", "deleted")} == {
+        "skipped": 0, "hashed": 1, "changed": 1, "moved": 1, "deleted": 1
+    }
+    session = get_session()
+    rows = {r.path: r for r in session.query(EvidenceFile)}
+    assert str(ev / "sub" / "b.txt") in rows
+    assert rows[str(ev / "c.txt")].file_metadata["deleted_at"]
+    session.close()
+
+    hashed.clear()
+    third = hash_inventory.walk_and_hash(ev, db_path=db)
+    assert hashed == [] and third.summary["skipped"] == 2 and third.summary["deleted"] == 0
+    verified = hash_inventory.walk_and_hash(ev, db_path=db, verify=True)
+    assert sorted(hashed) == ["a.txt", "b.txt"] and verified.summary["mismatched"] == 0
+
+    # the deleted file comes back: its content row is revived and counted
+    (ev / "c.txt").write_text("c.txt" * 10)
+    restored = hash_inventory.walk_and_hash(ev, db_path=db)
+    assert restored.summary["restored"] == 1 and restored.summary["added"] == 0
+    session = get_session()
+    row = session.query(EvidenceFile).filter_by(path=str(ev / "c.txt")).one()
+    assert not row.file_metadata.get("deleted_at")
+    session.close()
+
+
+def test_hash_engine_multi_digest_matches_hashlib(tmp_path):
+    import hashlib
+
+    data = os.urandom(300_000)
+    (tmp_path / "big.bin").write_bytes(data)
+    (tmp_path / "empty.bin").write_bytes(b"")
+    expected = {"sha256": hashlib.sha256(data).hexdigest(), "md5": hashlib.md5(data).hexdigest()}
+    for mmap_threshold in (0, 1):
+        engine = hash_engine.HashEngine(workers=3, block_size=65536, algorithms=("md5",), mmap_threshold=mmap_threshold)
+        out = dict(engine.map([tmp_path / "big.bin", tmp_path / "empty.bin", tmp_path / "missing.bin"]))
+        assert out[tmp_path / "big.bin"] == expected
+        assert out[tmp_path / "empty.bin"]["sha256"] == hashlib.sha256(b"").hexdigest()
+        assert out[tmp_path / "missing.bin"] is None
+    assert hash_inventory.sha256_file(tmp_path / "big.bin") == expected["sha256"]
+
+
+def test_inventory_records_every_location_of_duplicate_content(tmp_path):
+    from case_agent.db.models import FileLocation
+
+    ev = tmp_path / "evidence"
+    ev.mkdir()
+    for name in ("a.pdf", "copy_of_a.pdf"):
+        (ev / name).write_bytes(b"%PDF same bytes")
+    (ev / "b.pdf").write_bytes(b"%PDF other")
+    db = tmp_path / "dup.db"
+
+    inv = hash_inventory.walk_and_hash(ev, db_path=db)
+    assert inv.summary["added"] == 2 and inv.summary["duplicates"] == 1
+    assert sorted(os.path.basename(f["path"]) for f in inv.unique()) == ["a.pdf", "b.pdf"]
+    assert inv.duplicate_paths() == {str(ev / "copy_of_a.pdf")}
+
+    session = get_session()
+    locs = {os.path.basename(loc.path): loc.file.path for loc in session.query(FileLocation)}
+    assert locs["copy_of_a.pdf"] == locs["a.pdf"] == str(ev / "a.pdf")
+    session.close()
+
+    # the canonical copy disappears: the content survives at the other path
+    (ev / "a.pdf").unlink()
+    again = hash_inventory.walk_and_hash(ev, db_path=db)
+    assert again.summary["deleted"] == 1 and again.duplicate_paths() == set()
+    session = get_session()
+    row = session.query(EvidenceFile).filter_by(path=str(ev / "copy_of_a.pdf")).one()
+    assert not row.file_metadata.get("deleted_at")
+    session.close()
@@ -0,0 +1,56 @@
+import numpy as np
+from PIL import Image
+
+from case_agent.pipelines import face_search
+from case_agent.utils.image_buffer import BGR, RGB, ImageBuffer
+
+
+def test_views_are_zero_copy_and_conversions_cached():
+    arr = np.zeros((4, 6, 3), dtype=np.uint8)
+    arr[..., 0] = 200  # strong first channel: the old heuristic flipped this
+    buf = ImageBuffer(arr, RGB)
+    assert buf.rgb() is arr
+    assert np.shares_memory(buf.bgr(), arr)
+    assert buf.bgr(contiguous=True) is buf.bgr(contiguous=True)
+    assert buf.pil() is buf.pil()
+    assert buf.pil().getpixel((0, 0)) == (200, 0, 0)
+    assert face_search._np_to_pil(arr).getpixel((0, 0)) == (200, 0, 0)
+    assert face_search._np_to_pil(arr, order=BGR).getpixel((0, 0)) == (0, 0, 200)
+
+    crop = ImageBuffer(arr, BGR).crop(1, 4, 3, 2)
+    assert crop.shape == (2, 2, 3) and np.shares_memory(crop.array, arr)
+    assert crop.rgb()[0, 0].tolist() == [0, 0, 200]
+    assert ImageBuffer(arr, BGR).gray()[0, 0] == round(0.114 * 200)
+
+
+def test_wrap_accepts_pil_paths_and_rgba(tmp_path):
+    img = Image.new("RGB", (3, 2), (10, 20, 30))
+    buf = ImageBuffer.wrap(img)
+    assert buf.pil() is img and buf.shape == (2, 3, 3)
+    img.save(tmp_path / "x.png")
+    assert ImageBuffer.wrap(tmp_path / "x.png").rgb()[0, 0].tolist() == [10, 20, 30]
+    rgba = np.zeros((2, 2, 4), dtype=np.uint8)
+    assert ImageBuffer.wrap(rgba).shape == (2, 2, 3)
+    assert face_search._load_rgb(np.dstack([np.full((2, 2), v, np.uint8) for v in (1, 2, 3)]), bgr=True)[0, 0].tolist() == [3, 2, 1]
+
+
+def test_from_pixmap_views_samples_memory():
+    class Pixmap:
+        # stands in for fitz.Pixmap: 2 x 3 RGBA samples
+        n, width, height = 4, 3, 2
+
+        def __init__(self):
+            self.memory = bytearray(range(24))
+            self.samples_mv = memoryview(self.memory)
+
+    pix = Pixmap()
+    buf = ImageBuffer.from_pixmap(pix)
+    assert buf.shape == (2, 3, 3) and buf.rgb()[0, 1].tolist() == [4, 5, 6]
+    pix.memory[4] = 99
+    assert buf.rgb()[0, 1, 0] == 99
+
+    class OldPixmap:
+        n, width, height = 1, 2, 2
+        samples = bytes([1, 2, 3, 4])
+
+    assert ImageBuffer.from_pixmap(OldPixmap()).gray().tolist() == [[1, 2], [3, 4]]
@@ -0,0 +1,61 @@
+import os
+
+import pytest
+
+from case_agent.pipelines import merkle
+
+
+def _tree(ev):
+    (ev / "a" / "deep").mkdir(parents=True)
+    (ev / "b").mkdir()
+    (ev / "a" / "deep" / "x.bin").write_bytes(b"x" * 100)
+    (ev / "a" / "y.txt").write_text("y")
+    (ev / "b" / "z.txt").write_text("z")
+    (ev / "top.txt").write_text("top")
+
+
+def test_verify_localizes_changes_and_skips_unchanged_subtrees(tmp_path):
+    ev = tmp_path / "evidence"
+    _tree(ev)
+    db = tmp_path / "m.db"
+    record = merkle.build_manifest(ev, db_path=db)
+    assert record["files"] == 4 and record["total_size"] == 105
+
+    clean = merkle.verify_manifest(ev, db_path=db)
+    assert clean["intact"] and clean["files_hashed"] == 0 and clean["root_hash"] == record["root_hash"]
+
+    (ev / "b" / "z.txt").write_text("tampered")
+    (ev / "b" / "new.txt").write_text("new")
+    (ev / "top.txt").unlink()
+    report = merkle.verify_manifest(ev, db_path=db)
+    assert not report["intact"]
+    assert report["modified"] == ["b/z.txt"] and report["added"] == ["b/new.txt"] and report["removed"] == ["top.txt"]
+    # the unchanged subtree 'a' was not read
+    assert report["files_hashed"] == 2 and "a" not in report["changed_dirs"]
+
+    out = tmp_path / "root.json"
+    rebuilt = merkle.build_manifest(ev, db_path=db)
+    exported = merkle.export_root(ev, out, db_path=db, signed_off_by="Examiner")
+    assert exported["root_hash"] == rebuilt["root_hash"] != record["root_hash"]
+    assert exported["signed_off_by"] == "Examiner" and out.exists()
+    assert merkle.verify_manifest(ev, db_path=db)["intact"]
+
+
+def test_spot_check_finds_content_change_behind_unchanged_metadata(tmp_path):
+    ev = tmp_path / "evidence"
+    _tree(ev)
+    db = tmp_path / "m.db"
+    merkle.build_manifest(ev, db_path=db)
+
+    target = ev / "a" / "deep" / "x.bin"
+    st = target.stat()
+    target.write_bytes(b"y" * 100)
+    os.utime(target, ns=(st.st_atime_ns, st.st_mtime_ns))
+
+    assert merkle.verify_manifest(ev, db_path=db)["intact"]
+    report = merkle.verify_manifest(ev, db_path=db, sample=1.0)
+    assert report["mismatched"] == ["a/deep/x.bin"] and not report["intact"]
+    assert merkle.verify_manifest(ev, db_path=db, full=True)["mismatched"] == ["a/deep/x.bin"]
+
+    with pytest.raises(ValueError):
+        merkle.verify_manifest(tmp_path / "elsewhere", db_path=db)
@@ -0,0 +1,114 @@
+import types
+
+import numpy as np
+
+from case_agent.pipelines import face_search, video_frames
+
+
+class FakeCapture:
+    """Minimal cv2.VideoCapture over 100 numbered BGR frames at 10 fps."""
+
+    def __init__(self, path):
+        self.pos = -1
+        self.grabs = 0
+        self.retrieves = 0
+        self.seeks = 0
+        FakeCapture.last = self
+
+    def isOpened(self):
+        return True
+
+    def get(self, prop):
+        return 10.0
+
+    def set(self, prop, value):
+        self.seeks += 1
+
+    def grab(self):
+        if self.pos + 1 >= 100:
+            return False
+        self.pos += 1
+        self.grabs += 1
+        return True
+
+    def retrieve(self):
+        self.retrieves += 1
+        frame = np.zeros((40, 80, 3), dtype=np.uint8)
+        frame[:, :, 0] = self.pos  # blue channel carries the frame number
+        return True, frame
+
+    def release(self):
+        pass
+
+
+def _fake_cv2():
+    return types.SimpleNamespace(
+        VideoCapture=FakeCapture,
+        CAP_PROP_FPS=5,
+        COLOR_BGR2RGB=4,
+        cvtColor=lambda img, code: img[:, :, ::-1],
+    )
+
+
+def test_cv2_sampler_decodes_sequentially(monkeypatch):
+    monkeypatch.setattr(video_frames, "cv2", _fake_cv2())
+    frames = list(video_frames.iter_frames("clip.mp4", interval_seconds=2.0, backend="cv2", max_side=40))
+    cap = FakeCapture.last
+    assert [f.timestamp for f in frames] == [0.0, 2.0, 4.0, 6.0, 8.0]
+    assert [int(f.image[0, 0, 2]) for f in frames] == [0, 20, 40, 60, 80]
+    assert frames[0].image.shape == (20, 40, 3)
+    # Every frame is grabbed once; only sampled frames are decoded; no seeking
+    assert (cap.grabs, cap.retrieves, cap.seeks) == (100, 5, 0)
+
+
+def test_find_faces_in_video_runs_without_face_recognition(monkeypatch):
+    monkeypatch.setattr(video_frames, "cv2", _fake_cv2())
+    monkeypatch.setattr(face_search, "face_recognition", None)
+    seen = []
+
+    def fake_detect(image, **kwargs):
+        seen.append(int(image[0, 0, 2]))
+        return [{"bbox": {"top": 0, "right": 1, "bottom": 1, "left": 0},
+                 "embedding": np.ones(4, dtype=np.float32), "crop": None}]
+
+    monkeypatch.setattr(face_search, "detect_and_embed", fake_detect)
+    res = face_search.find_faces_in_video("clip.mp4", interval_seconds=5.0)
+    assert seen == [0, 50]
+    assert [r["timestamp"] for r in res] == [0.0, 5.0]
+
+
+def test_scene_sampler_detects_on_changes_and_heartbeat():
+    rng = np.random.default_rng(0)
+    scene_a = rng.integers(0, 255, (32, 32, 3), dtype=np.uint8)
+    scene_b = rng.integers(0, 255, (32, 32, 3), dtype=np.uint8)
+    sampler = video_frames.SceneSampler(threshold=10, dense_interval=1.0,
+                                        dense_duration=2.0, max_interval=5.0)
+    detected = [
+        ts for ts in np.arange(0.0, 20.0, 0.5)
+        if sampler.should_detect(float(ts), scene_a if ts < 12 else scene_b)
+    ]
+    # start + dense burst, 5 s heartbeats, cut at 12 s + dense burst, heartbeat
+    assert detected == [0.0, 1.0, 2.0, 7.0, 12.0, 13.0, 14.0, 19.0]
+    assert sampler.stats() == {"frames_examined": 40, "frames_detected": 8, "scene_changes": 1}
+
+
+def test_ffmpeg_failure_is_logged_with_its_stderr(tmp_path, monkeypatch, caplog):
+    import sys
+
+    fake = tmp_path / "ffmpeg"
+    fake.write_text(
+        f"#!{sys.executable}\n"
+        "import sys\n"
+        f"open({str(tmp_path / 'argv')!r}, 'w').write(' '.join(sys.argv[1:]))\n"
+        "sys.stderr.write(\"Unrecognized option 'some_option'.\\n\")\n"
+        "sys.exit(1)\n"
+    )
+    fake.chmod(0o755)
+    monkeypatch.setattr(video_frames, "_ffmpeg_tool", lambda name: str(fake))
+    monkeypatch.setattr(video_frames, "_probe", lambda path, ffprobe: {"width": 4, "height": 2})
+
+    with caplog.at_level("ERROR", logger="case_agent.video_frames"):
+        frames = list(video_frames.iter_frames_ffmpeg(tmp_path / "clip.mp4", keyframes_only=True))
+    assert frames == []
+    assert "-vsync vfr" in (tmp_path / "argv").read_text()
+    assert "exit 1" in caplog.text and "Unrecognized option" in caplog.text